@@ -1,7 +1,11 @@
 from dataclasses import asdict, dataclass
-from typing import TypeVar, cast
+from typing import TYPE_CHECKING, TypeVar, cast
 
-from langchain_core.language_models.base import BaseLanguageModel
+if TYPE_CHECKING:
+    # Only needed for type hints, so that importing the LLM configuration doesn't
+    # import LangChain
+    from langchain_core.language_models.base import BaseLanguageModel
+    from langchain_core.runnables import Runnable
 
 T = TypeVar('T', bound='Unionable')
 
@@ -49,10 +53,26 @@ class LLMConfig(Unionable):
         return LLMConfig(**no_function_calling, supports_function_calling=True)
 
 
+@dataclass
+class ModelPrice:
+    """In dollars per million tokens."""
+
+    prompt: float
+    completion: float
+
+
 class BaseLLM:
-    def __init__(self, llm_config: LLMConfig, llm: BaseLanguageModel):
+    def __init__(self, llm_config: LLMConfig, llm: "BaseLanguageModel"):
         self.llm_config = llm_config
         self.llm = llm
 
     def supports_function_calling(self) -> bool:
         return self.llm_config.supports_function_calling
+
+    def model_id(self) -> str | None:
+        """Identifies what answers the calls, or None if it can't be identified."""
+        return f"{self.llm_config.llm_name}/{self.llm_config.model}"
+
+    def json_mode(self) -> "Runnable | None":
+        """The model constrained to answer with a JSON object, if the provider can."""
+        return None
@@ -0,0 +1,244 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, replace
+from typing import Any, Iterator
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.messages import BaseMessage, SystemMessage, ToolMessage
+
+from agents_behave.base_llm import BaseLLM, ModelPrice
+from agents_behave.chat_model_wrapper import ChatModelWrapper, invoke_model
+from agents_behave.token_usage import message_usage
+
+
+@dataclass
+class Budget:
+    """Ceilings on the spend of a conversation or of a whole suite, None is no limit."""
+
+    max_tokens: int | None = None
+    max_cost: float | None = None
+    max_seconds: float | None = None
+
+
+@dataclass
+class Spend:
+    name: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost: float = 0.0
+    calls: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+    seconds: float = 0.0
+    status: str = "ok"
+    """ok, degraded (a cheaper model or a shorter history was used) or aborted."""
+
+    @property
+    def tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def used(self, budget: Budget) -> float:
+        """The largest fraction of the budget used, across tokens, cost and time."""
+        fractions = [
+            spent / limit
+            for spent, limit in (
+                (self.tokens, budget.max_tokens),
+                (self.cost, budget.max_cost),
+                (self.elapsed(), budget.max_seconds),
+            )
+            if limit
+        ]
+        return max(fractions, default=0.0)
+
+
+class BudgetExceeded(Exception):
+    def __init__(self, scope: str, spend: Spend):
+        super().__init__(
+            f"The {scope} budget is exhausted after {spend.tokens} tokens, "
+            f"${spend.cost:.4f} and {spend.elapsed():.0f}s"
+        )
+        self.scope = scope
+        self.spend = spend
+
+
+_current_conversation: ContextVar[Spend | None] = ContextVar(
+    "current_conversation", default=None
+)
+
+
+class BudgetGovernor:
+    """Enforces the token, cost and time budgets of a suite and of its conversations.
+
+    All the BudgetedLLMs of a run share the governor, and their calls are counted
+    against the conversation that is running in their context. Once a budget is
+    `degrade_at` used, the models degrade: they switch to a cheaper model and only
+    send the most recent messages. Once it is used up, calls raise BudgetExceeded.
+    """
+
+    def __init__(
+        self,
+        suite_budget: Budget | None = None,
+        conversation_budget: Budget | None = None,
+        prices: dict[str, ModelPrice] | None = None,
+        degrade_at: float = 0.8,
+    ):
+        self.suite_budget = suite_budget or Budget()
+        self.conversation_budget = conversation_budget or Budget()
+        self.prices = prices or {}
+        self.degrade_at = degrade_at
+        self.suite = Spend("suite")
+        self.conversations: list[Spend] = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def conversation(self, name: str) -> Iterator[Spend]:
+        spend = Spend(name)
+        token = _current_conversation.set(spend)
+        try:
+            yield spend
+        finally:
+            _current_conversation.reset(token)
+            spend.seconds = spend.elapsed()
+            with self.lock:
+                self.conversations.append(spend)
+
+    def check(self):
+        conversation = _current_conversation.get()
+        with self.lock:
+            if self.suite.used(self.suite_budget) >= 1:
+                raise BudgetExceeded("suite", replace(self.suite))
+            if conversation and conversation.used(self.conversation_budget) >= 1:
+                raise BudgetExceeded("conversation", replace(conversation))
+
+    def should_degrade(self) -> bool:
+        conversation = _current_conversation.get()
+        with self.lock:
+            used = self.suite.used(self.suite_budget)
+            if conversation:
+                used = max(used, conversation.used(self.conversation_budget))
+        degrade = used >= self.degrade_at
+        if degrade and conversation:
+            conversation.status = "degraded"
+        return degrade
+
+    def record(self, model: str | None, prompt_tokens: int, completion_tokens: int):
+        price = self.prices.get(model or "")
+        cost = (
+            (prompt_tokens * price.prompt + completion_tokens * price.completion) / 1e6
+            if price
+            else 0.0
+        )
+        conversation = _current_conversation.get()
+        with self.lock:
+            for spend in (self.suite, conversation):
+                if spend is None:
+                    continue
+                spend.prompt_tokens += prompt_tokens
+                spend.completion_tokens += completion_tokens
+                spend.cost += cost
+                spend.calls += 1
+
+    def report(self) -> list[dict[str, Any]]:
+        with self.lock:
+            spends = [*self.conversations, self.suite]
+            self.suite.seconds = self.suite.elapsed()
+        return [
+            {
+                "name": spend.name,
+                "status": spend.status,
+                "tokens": spend.tokens,
+                "cost": round(spend.cost, 6),
+                "calls": spend.calls,
+                "seconds": round(spend.seconds, 1),
+            }
+            for spend in spends
+        ]
+
+
+def trim_history(messages: list[BaseMessage], keep: int) -> list[BaseMessage]:
+    """Keeps the system messages and the last `keep` other messages."""
+    system = [m for m in messages if isinstance(m, SystemMessage)]
+    others = [m for m in messages if not isinstance(m, SystemMessage)]
+    if len(others) <= keep:
+        return messages
+    recent = others[-keep:]
+    # A tool result can't be sent without the tool call it answers
+    while recent and isinstance(recent[0], ToolMessage):
+        recent = recent[1:]
+    return system + recent
+
+
+class BudgetedChatModel(ChatModelWrapper):
+    model: Any
+    cheaper_model: Any = None
+    model_name: str | None = None
+    cheaper_model_name: str | None = None
+    governor: Any
+    """The BudgetGovernor shared by all the models of the run."""
+    degraded_history: int = 6
+    """The number of messages sent, besides the system prompt, once degraded."""
+
+    def call(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None,
+        run_manager: CallbackManagerForLLMRun | None,
+        **kwargs: Any,
+    ) -> BaseMessage:
+        self.governor.check()
+        model, model_name = self.model, self.model_name
+        if self.governor.should_degrade():
+            if self.cheaper_model is not None:
+                model, model_name = self.cheaper_model, self.cheaper_model_name
+            messages = trim_history(messages, self.degraded_history)
+        message = invoke_model(model, messages, stop, run_manager, **kwargs)
+        self.governor.record(model_name, *message_usage(message))
+        return message
+
+
+class BudgetedLLM(BaseLLM):
+    def __init__(
+        self,
+        llm: BaseLLM,
+        governor: BudgetGovernor,
+        cheaper_llm: BaseLLM | None = None,
+        degraded_history: int = 6,
+    ):
+        self.governor = governor
+        self.budgeted_llm = llm
+        self.cheaper_llm = cheaper_llm
+        self.degraded_history = degraded_history
+        budgeted = self.budget(llm.llm, cheaper_llm.llm if cheaper_llm else None)
+        # The cheaper model can be used at any time, so it must support the same
+        llm_config = replace(
+            llm.llm_config,
+            supports_function_calling=llm.supports_function_calling()
+            and (cheaper_llm is None or cheaper_llm.supports_function_calling()),
+        )
+        super().__init__(llm_config, budgeted)
+
+    def budget(self, model: Any, cheaper_model: Any) -> BudgetedChatModel:
+        return BudgetedChatModel(
+            model=model,
+            cheaper_model=cheaper_model,
+            model_name=self.budgeted_llm.llm_config.model,
+            cheaper_model_name=self.cheaper_llm.llm_config.model if self.cheaper_llm else None,
+            governor=self.governor,
+            degraded_history=self.degraded_history,
+        )
+
+    def json_mode(self):
+        # The cheaper model's JSON mode answers once degraded, so it must have one
+        json_mode_llm = self.budgeted_llm.json_mode()
+        cheaper_json_mode_llm = self.cheaper_llm.json_mode() if self.cheaper_llm else None
+        if json_mode_llm is None or (self.cheaper_llm and cheaper_json_mode_llm is None):
+            return None
+        return self.budget(json_mode_llm, cheaper_json_mode_llm)
+
+    def model_id(self) -> str | None:
+        # The cheaper model answers once the budget runs low
+        return None if self.cheaper_llm else self.budgeted_llm.model_id()
@@ -0,0 +1,146 @@
+import threading
+from collections import Counter
+from dataclasses import replace
+from typing import Any, Callable
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.messages import BaseMessage
+
+from agents_behave.base_llm import BaseLLM
+from agents_behave.chat_model_wrapper import (
+    ChatModelWrapper,
+    ainvoke_model,
+    invoke_model,
+)
+from agents_behave.conversation_analyser import parse_verdict
+
+AcceptResponse = Callable[[BaseMessage], bool]
+
+
+class AnsweredBy(Counter[int]):
+    """The number of answers given by each model of a cascade.
+
+    Updated by concurrent calls, e.g. parallel branches or hedges, so it's locked.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+
+    def record(self, index: int):
+        with self.lock:
+            self[index] += 1
+
+    def escalation_rate(self) -> float:
+        with self.lock:
+            total = sum(self.values())
+            return 1 - self[0] / total if total else 0.0
+
+
+class CascadeChatModel(ChatModelWrapper):
+    models: list[Any]
+    """The models to try, from the cheapest to the most capable."""
+    accept: Any
+    """An AcceptResponse that decides if a cheaper model's answer is good enough."""
+    answered_by: Any
+    """The AnsweredBy of the cascade."""
+
+    def call(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None,
+        run_manager: CallbackManagerForLLMRun | None,
+        **kwargs: Any,
+    ) -> BaseMessage:
+        *cheaper_models, last_model = self.models
+        for index, model in enumerate(cheaper_models):
+            message = invoke_model(model, messages, stop, run_manager, **kwargs)
+            if self.accept(message):
+                self.answered_by.record(index)
+                return message
+        self.answered_by.record(len(cheaper_models))
+        return invoke_model(last_model, messages, stop, run_manager, **kwargs)
+
+    async def acall(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None,
+        run_manager: AsyncCallbackManagerForLLMRun | None,
+        **kwargs: Any,
+    ) -> BaseMessage:
+        # Natively async, so that a cancelled cascade (e.g. a hedge that lost) stops
+        # instead of escalating to the next model in a thread
+        *cheaper_models, last_model = self.models
+        for index, model in enumerate(cheaper_models):
+            message = await ainvoke_model(model, messages, stop, run_manager, **kwargs)
+            if self.accept(message):
+                self.answered_by.record(index)
+                return message
+        self.answered_by.record(len(cheaper_models))
+        return await ainvoke_model(last_model, messages, stop, run_manager, **kwargs)
+
+
+class CascadeLLM(BaseLLM):
+    def __init__(
+        self,
+        llms: list[BaseLLM],
+        accept: AcceptResponse,
+        answered_by: AnsweredBy | None = None,
+    ):
+        self.llms = llms
+        self.accept = accept
+        self.answered_by = answered_by if answered_by is not None else AnsweredBy()
+        llm_config = replace(
+            llms[-1].llm_config,
+            supports_function_calling=all(llm.supports_function_calling() for llm in llms),
+        )
+        llm = CascadeChatModel(
+            models=[llm.llm for llm in llms],
+            accept=accept,
+            answered_by=self.answered_by,
+        )
+        super().__init__(llm_config, llm)
+
+    def json_mode(self):
+        json_mode_llms = [llm.json_mode() for llm in self.llms]
+        if any(json_mode_llm is None for json_mode_llm in json_mode_llms):
+            return None
+        return CascadeChatModel(
+            models=json_mode_llms, accept=self.accept, answered_by=self.answered_by
+        )
+
+    def with_accept(self, accept: AcceptResponse) -> "CascadeLLM":
+        # Counted with this cascade's answers, so its escalation rate covers both
+        return CascadeLLM(self.llms, accept, self.answered_by)
+
+    def model_id(self) -> str | None:
+        # Which model answers depends on the accept check, the analyser caches the
+        # verdicts of each model instead
+        return None
+
+    def escalation_rate(self) -> float:
+        return self.answered_by.escalation_rate()
+
+
+def non_empty_response(message: BaseMessage) -> bool:
+    return bool(str(message.content).strip())
+
+
+def valid_verdict(message: BaseMessage) -> bool:
+    return parse_verdict(message) is not None
+
+
+def confident_verdict(minimum_acceptable_score: int, margin: int = 1) -> AcceptResponse:
+    # A score close to the threshold could flip the test, so it's worth a second
+    # opinion from a better model
+    def accept(message: BaseMessage) -> bool:
+        verdict = parse_verdict(message)
+        return (
+            verdict is not None
+            and abs(int(verdict["score"]) - minimum_acceptable_score) > margin
+        )
+
+    return accept
@@ -0,0 +1,113 @@
+from abc import abstractmethod
+from typing import Any, Sequence
+
+from langchain_core.callbacks import (
+    AsyncCallbackManager,
+    AsyncCallbackManagerForLLMRun,
+    BaseCallbackManager,
+    CallbackManager,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables.config import run_in_executor
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+
+class ChatModelWrapper(BaseChatModel):
+    """A chat model that answers by calling other chat models.
+
+    Arguments bound to the wrapper (stop words, tools, ...) are passed on to the
+    wrapped models, so a wrapper can be used wherever the wrapped model was.
+    """
+
+    @property
+    def _llm_type(self) -> str:
+        return type(self).__name__
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    @abstractmethod
+    def call(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None,
+        run_manager: CallbackManagerForLLMRun | None,
+        **kwargs: Any,
+    ) -> BaseMessage:
+        pass
+
+    async def acall(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None,
+        run_manager: AsyncCallbackManagerForLLMRun | None,
+        **kwargs: Any,
+    ) -> BaseMessage:
+        # The wrapped models report to the same callbacks, as children of this run
+        sync_run_manager = run_manager.get_sync() if run_manager else None
+        return await run_in_executor(
+            None, self.call, messages, stop, sync_run_manager, **kwargs
+        )
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        message = self.call(messages, stop, run_manager, **kwargs)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        message = await self.acall(messages, stop, run_manager, **kwargs)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def child_callbacks(
+    run_manager: CallbackManagerForLLMRun | AsyncCallbackManagerForLLMRun | None,
+) -> BaseCallbackManager | None:
+    # LLM runs have no get_child(), so this does the same for the wrapped model's run
+    if run_manager is None:
+        return None
+    manager: BaseCallbackManager
+    if isinstance(run_manager, AsyncCallbackManagerForLLMRun):
+        manager = AsyncCallbackManager(handlers=[], parent_run_id=run_manager.run_id)
+    else:
+        manager = CallbackManager(handlers=[], parent_run_id=run_manager.run_id)
+    manager.set_handlers(run_manager.inheritable_handlers)
+    manager.add_tags(run_manager.inheritable_tags)
+    manager.add_metadata(run_manager.inheritable_metadata)
+    return manager
+
+
+def invoke_model(
+    llm: BaseLanguageModel,
+    messages: list[BaseMessage],
+    stop: list[str] | None,
+    run_manager: CallbackManagerForLLMRun | None,
+    **kwargs: Any,
+) -> BaseMessage:
+    config = {"callbacks": child_callbacks(run_manager)}
+    return llm.invoke(messages, config, stop=stop, **kwargs)  # type: ignore
+
+
+async def ainvoke_model(
+    llm: BaseLanguageModel,
+    messages: list[BaseMessage],
+    stop: list[str] | None,
+    run_manager: AsyncCallbackManagerForLLMRun | None,
+    **kwargs: Any,
+) -> BaseMessage:
+    config = {"callbacks": child_callbacks(run_manager)}
+    return await llm.ainvoke(messages, config, stop=stop, **kwargs)  # type: ignore
@@ -0,0 +1,141 @@
+import json
+import os
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any
+from unittest.mock import Mock
+
+from agents_behave.transcript import Speaker, Transcript
+
+
+def encode(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    return str(value)
+
+
+def decode(value: dict[str, Any]) -> Any:
+    if "__datetime__" in value:
+        return datetime.fromisoformat(value["__datetime__"])
+    if "__date__" in value:
+        return date.fromisoformat(value["__date__"])
+    return value
+
+
+@dataclass
+class Checkpoint:
+    entries: list[tuple[Speaker, str]] = field(default_factory=list)
+    mock_calls: dict[str, list[tuple[list, dict]]] = field(default_factory=dict)
+    iterations_count: int = 0
+    finished: bool = False
+    turn_steps: list[list[dict[str, Any]]] = field(default_factory=list)
+    turn_timings: list[dict[str, Any]] = field(default_factory=list)
+
+
+class CheckpointLog:
+    """An append-only log of the turns of a conversation.
+
+    Each line only has what changed in a turn: the new messages of the transcript,
+    the new calls to the mocks and the steps and timings of the new turns, so that
+    a conversation that was interrupted can be restored without calling the LLMs
+    again.
+    """
+
+    def __init__(self, path: str, mocks: dict[str, Mock] | None = None):
+        self.path = path
+        self.mocks = mocks or {}
+        self.saved_entries = 0
+        self.saved_calls = {name: 0 for name in self.mocks}
+        self.saved_turns = 0
+        self.saved_finished = False
+
+    def load(self) -> Checkpoint | None:
+        if not os.path.exists(self.path):
+            return None
+        checkpoint = Checkpoint()
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    turn = json.loads(line, object_hook=decode)
+                except json.JSONDecodeError:
+                    # The last line can be truncated if the run was killed mid-write
+                    break
+                checkpoint.entries.extend(
+                    (speaker, content) for speaker, content in turn["messages"]
+                )
+                for name, calls in turn["mock_calls"].items():
+                    checkpoint.mock_calls.setdefault(name, []).extend(calls)
+                checkpoint.turn_steps.extend(turn.get("turn_steps", []))
+                checkpoint.turn_timings.extend(turn.get("turn_timings", []))
+                checkpoint.iterations_count = turn["iterations_count"]
+                checkpoint.finished = turn["finished"]
+        return checkpoint
+
+    def restore(self, transcript: Transcript) -> Checkpoint | None:
+        checkpoint = self.load()
+        if checkpoint is None:
+            return None
+        for speaker, content in checkpoint.entries:
+            transcript.append(speaker, content)
+        for name, calls in checkpoint.mock_calls.items():
+            # Replaying the calls is the simplest way to get the same call records
+            for args, kwargs in calls:
+                self.mocks[name](*args, **kwargs)
+        self.saved_entries = len(transcript)
+        self.saved_calls = {
+            name: len(mock.call_args_list) for name, mock in self.mocks.items()
+        }
+        self.saved_turns = len(checkpoint.turn_steps)
+        self.saved_finished = checkpoint.finished
+        return checkpoint
+
+    def save(
+        self,
+        transcript: Transcript,
+        iterations_count: int,
+        finished: bool,
+        turn_steps: list[list[dict[str, Any]]] | None = None,
+        turn_timings: list[dict[str, Any]] | None = None,
+    ):
+        messages = [
+            [speaker, content]
+            for speaker, content in zip(
+                transcript.speakers[self.saved_entries:],
+                transcript.contents[self.saved_entries:],
+            )
+        ]
+        mock_calls = {
+            name: [
+                [list(c.args), dict(c.kwargs)]
+                for c in mock.call_args_list[self.saved_calls[name]:]
+            ]
+            for name, mock in self.mocks.items()
+        }
+        new_steps = (turn_steps or [])[self.saved_turns:]
+        new_timings = (turn_timings or [])[self.saved_turns:]
+        unchanged = not messages and not any(mock_calls.values()) and not new_steps
+        if unchanged and finished == self.saved_finished:
+            return
+        turn = {
+            "messages": messages,
+            "mock_calls": mock_calls,
+            "iterations_count": iterations_count,
+            "finished": finished,
+            "turn_steps": new_steps,
+            "turn_timings": new_timings,
+        }
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(turn, default=encode) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.saved_entries = len(transcript)
+        self.saved_calls = {
+            name: len(mock.call_args_list) for name, mock in self.mocks.items()
+        }
+        self.saved_turns += len(new_steps)
+        self.saved_finished = finished
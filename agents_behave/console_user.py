@@ -1,6 +1,7 @@
 # This class was generated by a code assistant.
 
 from agents_behave.test_user import User
+from agents_behave.transcript import Transcript
 
 
 class ConsoleUser(User):
@@ -10,3 +11,7 @@ class ConsoleUser(User):
     def chat(self, llm_response: str) -> str:
         print(f"Assistant: {llm_response}")
         return input("You: ")
+
+    def fork(self, transcript: Transcript | None = None) -> "ConsoleUser":
+        # The person at the console carries on every branch, and keeps no state here
+        return ConsoleUser()
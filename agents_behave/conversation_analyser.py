@@ -1,39 +1,203 @@
-from langchain.prompts import PromptTemplate
-from langchain_community.chat_message_histories import ChatMessageHistory
-from langchain_core.messages import BaseMessage
-from langchain_core.output_parsers import JsonOutputParser
+import json
+from collections import Counter
+from typing import TYPE_CHECKING, Any, Sequence
+
+from langchain.pydantic_v1 import BaseModel, Field, ValidationError
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.exceptions import OutputParserException
+from langchain_core.messages import AIMessage, BaseMessage, get_buffer_string
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableConfig
 
 from agents_behave.base_llm import BaseLLM
+from agents_behave.json_extraction import JsonObjectExtractor, extract_json_objects
+from agents_behave.profiling import phase
+from agents_behave.verdict_cache import VerdictCache, verdict_key
+
+if TYPE_CHECKING:
+    from agents_behave.cascade_llm import CascadeLLM
+
+
+class Verdict(BaseModel):
+    """The analysis of a conversation."""
+
+    score: int = Field(description="From 0 to 9, how well the criteria were met.")
+    feedback: str = Field(description="Your feedback about the conversation.")
+
+
+class VerdictParseError(OutputParserException):
+    pass
+
+
+def validate_verdict(value: Any) -> dict[str, Any] | None:
+    try:
+        return Verdict.parse_obj(value).dict()
+    except ValidationError:
+        return None
+
+
+def parse_verdict(message: BaseMessage) -> dict[str, Any] | None:
+    tool_calls = getattr(message, "tool_calls", None) or []
+    candidates = [call["args"] for call in tool_calls]
+    candidates += extract_json_objects(str(message.content))
+    for candidate in candidates:
+        verdict = validate_verdict(candidate)
+        if verdict is not None:
+            return verdict
+    return None
+
+
+def verdict_output(message: BaseMessage) -> str:
+    """Everything a model answered as its verdict, to be repaired.
+
+    With function calling, the verdict is in the arguments of the tool calls, and
+    the content is usually empty.
+    """
+    outputs = [str(message.content)] if message.content else []
+    for call in getattr(message, "tool_calls", None) or []:
+        outputs.append(json.dumps(call["args"]))
+    for call in getattr(message, "invalid_tool_calls", None) or []:
+        if call.get("args"):
+            outputs.append(call["args"])
+    return "\n".join(outputs)
 
 
 class ConversationAnalyser:
-    def __init__(self, llm: BaseLLM):
+    """Scores a conversation against a list of criteria.
+
+    Models with function calling answer by calling the Verdict tool. Other models
+    answer in JSON, which is extracted from whatever else they say, and the stream
+    is closed as soon as a verdict is complete. When the answer has no valid
+    verdict, only that answer (not the conversation) is sent back to the model to
+    be fixed, at most `max_repairs` times.
+
+    With a `cache`, a conversation that was already analysed with the same
+    criteria, model and prompt gets the same verdict without calling the model.
+    The models of a cascade are cached one by one, and its accept check is applied
+    to their cached verdicts, so that changing the check (e.g. its threshold)
+    doesn't analyse the conversation again. The verdicts of an LLM without a model
+    id, e.g. a hedge between two models, are not cached, since the key can't tell
+    which model gave them.
+    """
+
+    def __init__(
+        self,
+        llm: BaseLLM,
+        callbacks: list[BaseCallbackHandler] | None = None,
+        max_repairs: int = 1,
+        cache: VerdictCache | None = None,
+    ):
+        self.llm = llm
+        self.callbacks = callbacks or []
+        self.max_repairs = max_repairs
+        self.cache = cache
+        self.parse_stats: Counter[str] = Counter()
+        self.model_analysers: dict[int, ConversationAnalyser] = {}
+        self.prompt = (
+            PROMPT + FUNCTION_CALLING_FORMAT + CONVERSATION
+            if llm.supports_function_calling()
+            else PROMPT + JSON_FORMAT + CONVERSATION
+        )
         self.chain = self.build_chain(llm)
+        self.repair_chain = ChatPromptTemplate.from_messages(
+            [("system", REPAIR_PROMPT)]
+        ) | llm.llm
 
     def analyse(
-        self, chat_history: list[BaseMessage], criteria: list[str] | None = None
-    ):
-        conversation = ChatMessageHistory()
-        for c in chat_history:
-            conversation.add_message(c)
+        self, chat_history: Sequence[BaseMessage], criteria: list[str] | None = None
+    ) -> dict[str, Any]:
+        # Not at the top, since the cascades use parse_verdict
+        from agents_behave.cascade_llm import CascadeLLM
+
+        if self.cache is not None and isinstance(self.llm, CascadeLLM):
+            return self.analyse_with_cascade(self.llm, chat_history, criteria)
+        conversation = get_buffer_string(chat_history)
+        key = None
+        model = self.llm.model_id()
+        if self.cache is not None and model is not None:
+            key = verdict_key(conversation, criteria or [], model, self.prompt)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
         criteria_str = "\n".join([f"- {c}" for c in criteria or []])
-        response = self.chain.invoke(
-            {"conversation": conversation, "criteria": criteria_str}
+        inputs = {"conversation": conversation, "criteria": criteria_str}
+        config: RunnableConfig = {"callbacks": self.callbacks}
+        with phase("analyser"):
+            if self.llm.supports_function_calling():
+                message = self.chain.invoke(inputs, config)
+            else:
+                message = self.stream_until_verdict(inputs, config)
+            verdict = parse_verdict(message)
+            repairs = 0
+            while verdict is None and repairs < self.max_repairs:
+                repairs += 1
+                message = self.repair_chain.invoke(
+                    {"output": verdict_output(message)}, config
+                )
+                verdict = parse_verdict(message)
+        if verdict is None:
+            self.parse_stats["failed"] += 1
+            raise VerdictParseError(
+                "The analyser didn't answer with a valid verdict",
+                llm_output=verdict_output(message),
+            )
+        self.parse_stats["repaired" if repairs else "parsed"] += 1
+        if self.cache is not None and key is not None:
+            self.cache.put(key, verdict)
+        return verdict
+
+    def analyse_with_cascade(
+        self,
+        cascade: "CascadeLLM",
+        chat_history: Sequence[BaseMessage],
+        criteria: list[str] | None,
+    ) -> dict[str, Any]:
+        *cheaper_llms, last_llm = cascade.llms
+        for index, llm in enumerate(cheaper_llms):
+            try:
+                verdict = self.model_analyser(index, llm).analyse(chat_history, criteria)
+            except VerdictParseError:
+                continue
+            if cascade.accept(AIMessage(content=json.dumps(verdict))):
+                cascade.answered_by.record(index)
+                return verdict
+        cascade.answered_by.record(len(cheaper_llms))
+        return self.model_analyser(len(cheaper_llms), last_llm).analyse(
+            chat_history, criteria
         )
-        return response
+
+    def model_analyser(self, index: int, llm: BaseLLM) -> "ConversationAnalyser":
+        if index not in self.model_analysers:
+            analyser = ConversationAnalyser(llm, self.callbacks, self.max_repairs, self.cache)
+            analyser.parse_stats = self.parse_stats
+            self.model_analysers[index] = analyser
+        return self.model_analysers[index]
+
+    def stream_until_verdict(
+        self, inputs: dict[str, Any], config: RunnableConfig
+    ) -> BaseMessage:
+        extractor = JsonObjectExtractor()
+        chunks = self.chain.stream(inputs, config)
+        try:
+            for chunk in chunks:
+                if any(
+                    validate_verdict(value)
+                    for value in extractor.feed(str(chunk.content))
+                ):
+                    break
+        finally:
+            # Stops the generation of anything after the verdict
+            chunks.close()
+        return AIMessage(content=extractor.text)
 
     def build_chain(self, llm: BaseLLM):
-        prompt = PromptTemplate(
-            template=PROMPT, input_variables=["criteria", "conversation"]
-        )
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                ("system", PROMPT),
-            ]
-        )
-        chain = prompt | llm.llm | JsonOutputParser()
-        return chain
+        prompt = ChatPromptTemplate.from_messages([("system", self.prompt)])
+        if llm.supports_function_calling():
+            return prompt | llm.llm.bind_tools(
+                [Verdict],
+                tool_choice={"type": "function", "function": {"name": "Verdict"}},
+            )
+        return prompt | llm.llm
 
 
 PROMPT = """
@@ -45,15 +209,31 @@ Criteria:
 {criteria}
 
 Remember, you task is to analyse the conversation, not to continue it.
+"""  # noqa E501
 
+JSON_FORMAT = """
 Your response MUST be in JSON format using the following structure:
 {{
-    "score": <0..9>
+    "score": <0..9>,
     "feedback": "Your feedback here"
 }}
+"""
 
+FUNCTION_CALLING_FORMAT = """
+Your response MUST be a call to the Verdict tool, with a score from 0 to 9 and your feedback.
+"""  # noqa E501
+
+CONVERSATION = """
 Conversation:
 {conversation}
 
 ANALYSIS:
 """
+
+REPAIR_PROMPT = """
+The following text should be a JSON object with a "score" (an integer from 0 to 9) and a "feedback" (a string), but it isn't valid.
+Answer only with the fixed JSON object, without changing the score or the feedback.
+
+Text:
+{output}
+"""  # noqa E501
@@ -1,11 +1,22 @@
-from typing import Callable
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Callable
 
 from colorama import Fore
 from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
 
+from agents_behave.checkpoint import CheckpointLog
+from agents_behave.profiling import phase
+from agents_behave.replay import serialize_steps
 from agents_behave.test_user import User
+from agents_behave.tracing import Tracer
+from agents_behave.transcript import Transcript, TranscriptView
 
-Assistant = Callable[[str], str]
+# An assistant can also return the result of an agent, with its `output` and the
+# `intermediate_steps` it took, which are kept for every turn.
+Assistant = Callable[[str], str | dict[str, Any]]
 
 
 def stop_on_max_iterations(max_iterations: int):
@@ -15,13 +26,35 @@ def stop_on_max_iterations(max_iterations: int):
     return stop_on_max_iterations_fn
 
 
+@dataclass
+class TurnTiming:
+    iteration: int
+    assistant_seconds: float
+    user_seconds: float
+
+
 class ConversationRunnerState:
-    def __init__(self):
-        self.chat_history: list[BaseMessage] = []
+    def __init__(self, transcript: Transcript | None = None):
+        self.transcript = transcript if transcript is not None else Transcript()
         self.iterations_count = 0
+        self.turn_timings: list[TurnTiming] = []
+        self.turn_steps: list[list[dict[str, Any]]] = []
+
+    @property
+    def chat_history(self) -> TranscriptView:
+        return self.transcript.view("assistant")
 
     def add_message(self, message: BaseMessage):
-        self.chat_history.append(message)
+        self.transcript.append_message(message)
+
+    def fork(self, transcript: Transcript | None = None) -> "ConversationRunnerState":
+        if transcript is None:
+            transcript = self.transcript.fork()
+        state = ConversationRunnerState(transcript)
+        state.iterations_count = self.iterations_count
+        state.turn_timings = list(self.turn_timings)
+        state.turn_steps = list(self.turn_steps)
+        return state
 
     def increment_iterations(self):
         self.iterations_count += 1
@@ -56,26 +89,133 @@ class ConversationRunner:
         stop_condition: Callable[
             [ConversationRunnerState], bool
         ] = stop_on_max_iterations(10),
+        transcript: Transcript | None = None,
+        checkpoint: CheckpointLog | None = None,
+        tracer: Tracer | None = None,
     ):
+        # When a transcript is given, the user and the assistant are expected to
+        # read the conversation from it, and the runner is the only one adding
+        # messages to it.
+        if checkpoint and transcript is None:
+            raise ValueError("Checkpoints need a transcript shared with the runner")
         self.user = user
         self.assistant = assistant
         self.stop_condition = stop_condition
-
-        self.state = ConversationRunnerState()
-
-    def start(self) -> ConversationRunnerState:
-        user_message = self.user.start()
-        self.state = ConversationRunnerState()
+        self.shared_transcript = transcript
+        self.checkpoint = checkpoint
+        # Each turn is a trace, the turns of a conversation share a session id
+        self.tracer = tracer if tracer is not None else Tracer()
+        self.session_id = uuid.uuid4().hex
+
+        self.state = ConversationRunnerState(transcript)
+
+    def start(self, max_iterations: int | None = None) -> ConversationRunnerState:
+        if self.shared_transcript is not None and len(self.shared_transcript):
+            raise ValueError("A conversation with a shared transcript can't restart")
+        self.state = ConversationRunnerState(self.shared_transcript)
+        if self.restore_checkpoint():
+            return self.resume(max_iterations)
+        with self.tracer.trace("start", session_id=self.session_id):
+            with self.tracer.span("user"), phase("user"):
+                user_message = self.user.start()
         self.state.add_message(HumanMessage(content=user_message))
-        user_response = user_message
+        self.save_checkpoint()
+        return self.resume(max_iterations)
+
+    def resume(self, max_iterations: int | None = None) -> ConversationRunnerState:
         while not self.stop_condition(self.state):
-            print(f"{Fore.YELLOW}Iteration {self.state.iterations_count}{Fore.RESET}")
-            llm_response = self.assistant(user_response)
+            if (
+                max_iterations is not None
+                and self.state.iterations_count >= max_iterations
+            ):
+                return self.state
+            self.step()
+
+        self.save_checkpoint(finished=True)
+        return self.state
+
+    def restore_checkpoint(self) -> bool:
+        if not self.checkpoint:
+            return False
+        checkpoint = self.checkpoint.restore(self.state.transcript)
+        if not checkpoint or not checkpoint.entries:
+            return False
+        self.state.iterations_count = checkpoint.iterations_count
+        self.state.turn_steps = list(checkpoint.turn_steps)
+        self.state.turn_timings = [TurnTiming(**t) for t in checkpoint.turn_timings]
+        print(
+            f"{Fore.YELLOW}Resuming from iteration {checkpoint.iterations_count}"
+            f"{' (finished)' if checkpoint.finished else ''}{Fore.RESET}"
+        )
+        return True
+
+    def save_checkpoint(self, finished: bool = False):
+        if self.checkpoint:
+            self.checkpoint.save(
+                self.state.transcript,
+                self.state.iterations_count,
+                finished,
+                self.state.turn_steps,
+                [asdict(timing) for timing in self.state.turn_timings],
+            )
+
+    def step(self):
+        iteration = self.state.iterations_count
+        print(f"{Fore.YELLOW}Iteration {iteration}{Fore.RESET}")
+        with self.tracer.trace("turn", session_id=self.session_id, iteration=iteration):
+            self.run_turn()
+
+        self.state.increment_iterations()
+        self.save_checkpoint()
+
+    def run_turn(self):
+        started = time.perf_counter()
+        with self.tracer.span("assistant"), phase("assistant"):
+            response = self.assistant(str(self.state.last_message().content))
+        assistant_finished = time.perf_counter()
+        if isinstance(response, dict):
+            llm_response = response["output"]
+            steps = serialize_steps(response.get("intermediate_steps", []))
+        else:
+            llm_response, steps = response, []
+        self.state.turn_steps.append(steps)
+        self.state.add_message(AIMessage(content=llm_response))
+        with self.tracer.span("user"), phase("user"):
             user_response = self.user.chat(llm_response)
+        self.state.add_message(HumanMessage(content=user_response))
+        self.state.turn_timings.append(
+            TurnTiming(
+                iteration=self.state.iterations_count,
+                assistant_seconds=assistant_finished - started,
+                user_seconds=time.perf_counter() - assistant_finished,
+            )
+        )
 
-            self.state.add_message(AIMessage(content=llm_response))
-            self.state.add_message(HumanMessage(content=user_response))
+    def fork(
+        self,
+        assistant: Assistant,
+        user: User | None = None,
+        stop_condition: Callable[[ConversationRunnerState], bool] | None = None,
+        transcript: Transcript | None = None,
+    ) -> "ConversationRunner":
+        # The assistant is an opaque callable, so the caller has to provide one
+        # that already holds the conversation so far. With a shared transcript,
+        # that's one reading from `transcript`, a fork of this runner's transcript.
+        if self.shared_transcript is not None and transcript is None:
+            transcript = self.state.transcript.fork()
+        runner = ConversationRunner(
+            user=user or self.user.fork(transcript=transcript),
+            assistant=assistant,
+            stop_condition=stop_condition or self.stop_condition,
+            transcript=transcript,
+            tracer=self.tracer,
+        )
+        runner.state = self.state.fork(transcript)
+        return runner
 
-            self.state.increment_iterations()
 
-        return self.state
+def run_branches(
+    branches: list[ConversationRunner], max_workers: int | None = None
+) -> list[ConversationRunnerState]:
+    with ThreadPoolExecutor(max_workers=max_workers or max(len(branches), 1)) as executor:
+        return list(executor.map(lambda branch: branch.resume(), branches))
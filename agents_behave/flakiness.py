@@ -0,0 +1,124 @@
+import math
+from dataclasses import dataclass
+from typing import Callable, Literal
+
+from colorama import Fore
+
+from agents_behave.conversation_analyser import ConversationAnalyser
+from agents_behave.conversation_runner import ConversationRunner
+
+Verdict = Literal["pass", "fail", "inconclusive"]
+
+
+def log_mixture_ratio(passes: int, runs: int, p: float) -> float:
+    """The log likelihood ratio of a uniform prior on the pass rate against `p`.
+
+    It's a martingale when `p` is the true pass rate, so by Ville's inequality it
+    ever reaches 1 / alpha with probability at most alpha, however many runs.
+    """
+    log_beta = (
+        math.lgamma(passes + 1)
+        + math.lgamma(runs - passes + 1)
+        - math.lgamma(runs + 2)
+    )
+    return log_beta - passes * math.log(p) - (runs - passes) * math.log(1 - p)
+
+
+def confidence_sequence(
+    passes: int, runs: int, confidence: float
+) -> tuple[float, float]:
+    """Bounds on the pass rate that hold at every run at once, not only at a fixed one.
+
+    Unlike a fixed-sample interval, they can be checked after every run and the
+    test stopped as soon as they clear the threshold.
+    """
+    if runs == 0:
+        return 0.0, 1.0
+    log_limit = -math.log(1 - confidence)
+    estimate = passes / runs
+
+    def bound(inside: float, outside: float, observed: bool) -> float:
+        # A pass rate of 0 (or 1) can't be ruled out until a run passes (or fails)
+        if not observed:
+            return outside
+        # The ratio is convex in p and below the limit at the estimate
+        for _ in range(50):
+            middle = (inside + outside) / 2
+            if log_mixture_ratio(passes, runs, middle) < log_limit:
+                inside = middle
+            else:
+                outside = middle
+        return inside
+
+    return bound(estimate, 0.0, passes > 0), bound(estimate, 1.0, passes < runs)
+
+
+@dataclass
+class FlakinessReport:
+    runs: int
+    passes: int
+    lower: float
+    upper: float
+    verdict: Verdict
+
+    @property
+    def pass_rate(self) -> float:
+        return self.passes / self.runs if self.runs else 0.0
+
+
+class SequentialPassRateTest:
+    """Runs a scenario until its pass rate is known to be above or below a threshold.
+
+    The pass rate's bounds are a confidence sequence, so stopping at the first
+    decisive run keeps the chance of a wrong verdict below 1 - `confidence`.
+    """
+
+    def __init__(
+        self,
+        required_pass_rate: float = 0.8,
+        confidence: float = 0.95,
+        min_runs: int = 3,
+        max_runs: int = 30,
+    ):
+        self.required_pass_rate = required_pass_rate
+        self.confidence = confidence
+        self.min_runs = min_runs
+        self.max_runs = max_runs
+
+    def report(self, passes: int, runs: int) -> FlakinessReport:
+        lower, upper = confidence_sequence(passes, runs, self.confidence)
+        verdict: Verdict = "inconclusive"
+        if runs >= self.min_runs:
+            if lower > self.required_pass_rate:
+                verdict = "pass"
+            elif upper < self.required_pass_rate:
+                verdict = "fail"
+        return FlakinessReport(runs, passes, lower, upper, verdict)
+
+    def run(self, run_once: Callable[[], bool]) -> FlakinessReport:
+        passes = 0
+        report = self.report(0, 0)
+        for runs in range(1, self.max_runs + 1):
+            passes += 1 if run_once() else 0
+            report = self.report(passes, runs)
+            print(
+                f"{Fore.CYAN}Run {runs}: {passes}/{runs} passed, "
+                f"pass rate in [{report.lower:.2f}, {report.upper:.2f}]{Fore.RESET}"
+            )
+            if report.verdict != "inconclusive":
+                break
+        return report
+
+
+def conversation_passes(
+    create_runner: Callable[[], ConversationRunner],
+    analyser: ConversationAnalyser,
+    criteria: list[str],
+    minimum_acceptable_score: int,
+) -> Callable[[], bool]:
+    def run_once() -> bool:
+        state = create_runner().start()
+        response = analyser.analyse(chat_history=state.chat_history, criteria=criteria)
+        return int(response["score"]) > minimum_acceptable_score
+
+    return run_once
@@ -0,0 +1,186 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from dataclasses import replace
+from typing import Any
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.messages import BaseMessage
+
+from agents_behave.base_llm import BaseLLM
+from agents_behave.cascade_llm import AcceptResponse, CascadeLLM
+from agents_behave.chat_model_wrapper import ChatModelWrapper, ainvoke_model
+
+
+class LatencyHistogram:
+    def __init__(self, max_samples: int = 500):
+        self.samples: deque[float] = deque(maxlen=max_samples)
+        self.lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def percentile(self, percentile: float, min_samples: int = 1) -> float | None:
+        with self.lock:
+            samples = sorted(self.samples)
+        if len(samples) < max(min_samples, 1):
+            return None
+        index = min(int(len(samples) * percentile / 100), len(samples) - 1)
+        return samples[index]
+
+
+_latencies: dict[str, LatencyHistogram] = {}
+_latencies_lock = threading.Lock()
+
+
+def latency_histogram(name: str) -> LatencyHistogram:
+    """The latencies of a provider/model, shared by all the roles that use it."""
+    with _latencies_lock:
+        return _latencies.setdefault(name, LatencyHistogram())
+
+
+class HedgedChatModel(ChatModelWrapper):
+    primary: Any
+    backup: Any
+    primary_name: str
+    backup_name: str
+    percentile: float = 95
+    """Send the backup request once the primary is slower than this percentile."""
+    min_samples: int = 20
+    default_delay: float = 10.0
+    """Seconds to wait for the primary until there are enough latency samples."""
+
+    def hedge_delay(self) -> float:
+        delay = latency_histogram(self.primary_name).percentile(
+            self.percentile, self.min_samples
+        )
+        return self.default_delay if delay is None else delay
+
+    def call(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None,
+        run_manager: CallbackManagerForLLMRun | None,
+        **kwargs: Any,
+    ) -> BaseMessage:
+        # Cancelling the slower request needs asyncio, so sync calls run in their own
+        # event loop
+        return asyncio.run(self.hedge(messages, stop, run_manager, **kwargs))
+
+    async def acall(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None,
+        run_manager: AsyncCallbackManagerForLLMRun | None,
+        **kwargs: Any,
+    ) -> BaseMessage:
+        return await self.hedge(messages, stop, run_manager, **kwargs)
+
+    async def hedge(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None,
+        run_manager: CallbackManagerForLLMRun | AsyncCallbackManagerForLLMRun | None,
+        **kwargs: Any,
+    ) -> BaseMessage:
+        async def timed(model, name: str) -> BaseMessage:
+            start = time.perf_counter()
+            try:
+                message = await ainvoke_model(
+                    model, messages, stop, run_manager, **kwargs  # type: ignore
+                )
+            except asyncio.CancelledError:
+                # It lost the race, so it would have taken at least this long. Without
+                # it, only the fast answers are kept and the hedge delay keeps shrinking
+                latency_histogram(name).record(time.perf_counter() - start)
+                raise
+            latency_histogram(name).record(time.perf_counter() - start)
+            return message
+
+        primary = asyncio.create_task(timed(self.primary, self.primary_name))
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay())
+        if primary in done and primary.exception() is None:
+            return primary.result()
+
+        # The primary is slow, or it failed: the first good answer wins
+        backup = asyncio.create_task(timed(self.backup, self.backup_name))
+        pending = {backup} if primary in done else {primary, backup}
+        error = primary.exception() if primary in done else None
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    return task.result()
+                error = task.exception()
+        assert error is not None
+        raise error
+
+
+class HedgedLLM(BaseLLM):
+    def __init__(
+        self,
+        primary: BaseLLM,
+        backup: BaseLLM,
+        percentile: float = 95,
+        default_delay: float = 10.0,
+    ):
+        self.primary = primary
+        self.backup = backup
+        self.percentile = percentile
+        self.default_delay = default_delay
+        llm = self.hedge(primary.llm, backup.llm)
+        llm_config = replace(
+            primary.llm_config,
+            supports_function_calling=primary.supports_function_calling()
+            and backup.supports_function_calling(),
+        )
+        super().__init__(llm_config, llm)
+
+    def hedge(self, primary: Any, backup: Any) -> HedgedChatModel:
+        return HedgedChatModel(
+            primary=primary,
+            backup=backup,
+            primary_name=provider_name(self.primary),
+            backup_name=provider_name(self.backup),
+            percentile=self.percentile,
+            default_delay=self.default_delay,
+        )
+
+    def json_mode(self):
+        # Only if both models have one, since either of them can answer a call
+        primary = self.primary.json_mode()
+        backup = self.backup.json_mode()
+        if primary is None or backup is None:
+            return None
+        return self.hedge(primary, backup)
+
+    def with_accept(self, accept: AcceptResponse) -> "HedgedLLM":
+        """The same hedge, with another accept check for a cascaded primary."""
+        if not isinstance(self.primary, CascadeLLM):
+            return self
+        return HedgedLLM(
+            self.primary.with_accept(accept),
+            self.backup,
+            self.percentile,
+            self.default_delay,
+        )
+
+    def model_id(self) -> str | None:
+        # Either model can answer, depending on how fast they are
+        return None
+
+
+def provider_name(llm: BaseLLM) -> str:
+    # A cascade's latencies are its own, not those of its last model
+    if isinstance(llm, CascadeLLM):
+        return "cascade:" + ",".join(provider_name(model) for model in llm.llms)
+    return llm.llm_config.llm_name or llm.llm_config.model or type(llm).__name__
@@ -0,0 +1,72 @@
+import json
+import re
+from typing import Any, Iterable, Iterator
+
+# Models often copy the JSON examples of their prompts with a missing comma
+# between two lines, or leave a comma before the closing bracket.
+_MISSING_COMMA = re.compile(r'([}\]"\d]|true|false|null)(\s*\n\s*")')
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+
+
+def loads_tolerant(text: str) -> Any:
+    """json.loads, that also accepts the most common mistakes made by LLMs."""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        repaired = _TRAILING_COMMA.sub(r"\1", _MISSING_COMMA.sub(r"\1,\2", text))
+        return json.loads(repaired)
+
+
+class JsonObjectExtractor:
+    """Finds the JSON objects in text that arrives in chunks, e.g. a streamed answer.
+
+    Anything around the objects (prose, markdown fences, ...) is ignored, so an
+    object can be used as soon as its closing brace arrives.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.position = 0
+        self.depth = 0
+        self.start = 0
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, chunk: str) -> list[dict[str, Any]]:
+        self.text += chunk
+        objects = []
+        while self.position < len(self.text):
+            char = self.text[self.position]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"' and self.depth:
+                self.in_string = True
+            elif char == "{":
+                if not self.depth:
+                    self.start = self.position
+                self.depth += 1
+            elif char == "}" and self.depth:
+                self.depth -= 1
+                if not self.depth:
+                    candidate = self.text[self.start:self.position + 1]
+                    try:
+                        value = loads_tolerant(candidate)
+                    except json.JSONDecodeError:
+                        value = None
+                    if isinstance(value, dict):
+                        objects.append(value)
+            self.position += 1
+        return objects
+
+    def extract(self, chunks: Iterable[str]) -> Iterator[dict[str, Any]]:
+        for chunk in chunks:
+            yield from self.feed(chunk)
+
+
+def extract_json_objects(text: str) -> list[dict[str, Any]]:
+    return JsonObjectExtractor().feed(text)
@@ -0,0 +1,198 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from dataclasses import asdict, dataclass
+from types import FrameType
+from typing import Iterator
+
+
+@dataclass
+class PhaseStats:
+    calls: int = 0
+    wall: float = 0.0
+    cpu: float = 0.0
+    samples: int = 0
+
+    @property
+    def wait(self) -> float:
+        """Time spent not running, mostly waiting for LLM responses."""
+        return max(self.wall - self.cpu, 0.0)
+
+
+@dataclass
+class OpenPhase:
+    name: str
+    wall_start: float
+    cpu_start: float
+
+
+_current_profiler: ContextVar["Profiler | None"] = ContextVar(
+    "current_profiler", default=None
+)
+
+
+class Profiler:
+    """A sampling profiler that attributes time to the phases of a conversation.
+
+    A phase (assistant, user, analyser, tool, ...) is entered with `phase()`. Its
+    wall and CPU time are measured exclusive of the nested phases, so a tool call
+    is not counted in the assistant's time. Every `interval` seconds the stacks
+    of the threads that are in a phase are sampled, and written as folded stacks
+    that flamegraph.pl or speedscope can render, with the phase as the root frame.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.phases: dict[str, PhaseStats] = {}
+        self.stacks: Counter[str] = Counter()
+        self.open_phases: dict[int, list[OpenPhase]] = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread: threading.Thread | None = None
+        self.token: Token | None = None
+
+    def start(self):
+        """Profiles this thread, and the code it calls that runs in a phase()."""
+        self.stopped.clear()
+        self.token = _current_profiler.set(self)
+        self.enter("other")
+        self.thread = threading.Thread(target=self.sample_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        self.exit()
+        if self.token:
+            _current_profiler.reset(self.token)
+            self.token = None
+
+    @contextmanager
+    def profile(self) -> Iterator["Profiler"]:
+        self.start()
+        try:
+            yield self
+        finally:
+            self.stop()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        token = _current_profiler.set(self)
+        self.enter(name)
+        try:
+            yield
+        finally:
+            self.exit()
+            _current_profiler.reset(token)
+
+    def enter(self, name: str):
+        now, cpu_now = time.perf_counter(), time.thread_time()
+        with self.lock:
+            stack = self.open_phases.setdefault(threading.get_ident(), [])
+            if stack:
+                self.charge(stack[-1], now, cpu_now)
+            stack.append(OpenPhase(name, now, cpu_now))
+            self.phases.setdefault(name, PhaseStats()).calls += 1
+
+    def exit(self):
+        now, cpu_now = time.perf_counter(), time.thread_time()
+        with self.lock:
+            stack = self.open_phases[threading.get_ident()]
+            self.charge(stack.pop(), now, cpu_now)
+            if stack:
+                # The outer phase resumes
+                stack[-1].wall_start, stack[-1].cpu_start = now, cpu_now
+            else:
+                del self.open_phases[threading.get_ident()]
+
+    def charge(self, phase: OpenPhase, now: float, cpu_now: float):
+        stats = self.phases[phase.name]
+        stats.wall += now - phase.wall_start
+        stats.cpu += cpu_now - phase.cpu_start
+
+    def sample_loop(self):
+        while not self.stopped.wait(self.interval):
+            frames = sys._current_frames()
+            with self.lock:
+                phases = {
+                    ident: stack[-1].name
+                    for ident, stack in self.open_phases.items()
+                    if stack
+                }
+                for ident, phase in phases.items():
+                    frame = frames.get(ident)
+                    if frame is None:
+                        continue
+                    self.stacks[";".join([phase, *folded_frames(frame)])] += 1
+                    self.phases[phase].samples += 1
+
+    def folded(self) -> list[str]:
+        return [f"{stack} {count}" for stack, count in self.stacks.most_common()]
+
+    def summary(self) -> str:
+        return "\n".join(
+            f"{name}: {stats.calls} calls, wall {stats.wall:.2f}s, "
+            f"cpu {stats.cpu:.2f}s, wait {stats.wait:.2f}s"
+            for name, stats in sorted(
+                self.phases.items(), key=lambda item: -item[1].wall
+            )
+        )
+
+    def write(self, directory: str, name: str) -> str:
+        """Writes <name>.folded and <name>.phases.json, and returns the prefix."""
+        os.makedirs(directory, exist_ok=True)
+        prefix = os.path.join(directory, re.sub(r"[^\w.-]+", "_", name).strip("_"))
+        with open(f"{prefix}.folded", "w") as f:
+            f.writelines(line + "\n" for line in self.folded())
+        with open(f"{prefix}.phases.json", "w") as f:
+            phases = {
+                name: {**asdict(stats), "wait": stats.wait}
+                for name, stats in self.phases.items()
+            }
+            json.dump(phases, f, indent=2)
+        return prefix
+
+
+def folded_frames(frame: FrameType | None) -> list[str]:
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        path = os.path.join(*code.co_filename.split(os.sep)[-2:])
+        frames.append(f"{code.co_name} ({path}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return frames[::-1]
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Attributes the time spent in the block to `name`, when profiling."""
+    profiler = _current_profiler.get()
+    if profiler is None:
+        yield
+        return
+    with profiler.phase(name):
+        yield
+
+
+@contextmanager
+def profile_from_env(name: str) -> Iterator[Profiler | None]:
+    """Profiles the block when PROFILE_DIR is set, and writes the profile there."""
+    directory = os.getenv("PROFILE_DIR")
+    if not directory:
+        yield None
+        return
+    profiler = Profiler()
+    try:
+        with profiler.profile():
+            yield profiler
+    finally:
+        prefix = profiler.write(directory, name)
+        print(f"Profile written to {prefix}.folded\n{profiler.summary()}")
@@ -0,0 +1,252 @@
+import json
+import os
+import threading
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Any, Sequence
+from unittest.mock import Mock
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler, CallbackManagerForLLMRun
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    message_to_dict,
+    messages_from_dict,
+)
+from langchain_core.outputs import LLMResult
+
+from agents_behave.base_llm import BaseLLM, LLMConfig
+from agents_behave.chat_model_wrapper import ChatModelWrapper
+from agents_behave.checkpoint import decode, encode
+from agents_behave.test_user import User
+from agents_behave.transcript import Transcript
+
+
+class ReplayDivergedError(Exception):
+    """The code being replayed didn't do what the recorded conversation did."""
+
+
+class LLMRecorder(BaseCallbackHandler):
+    """Records the answers of the LLM calls of a role, to replay them later.
+
+    Calls made by wrapped models (e.g. the models of a CascadeLLM) are not
+    recorded, only the answer of the outermost model. A stream that was closed
+    early is recorded with the tokens received so far.
+    """
+
+    def __init__(self):
+        self.outputs: list[dict[str, Any]] = []
+        self.runs: dict[UUID, list[str]] = {}
+        self.nested: set[UUID] = set()
+        self.lock = threading.Lock()
+
+    def start(self, run_id: UUID, parent_run_id: UUID | None):
+        with self.lock:
+            if parent_run_id in self.runs or parent_run_id in self.nested:
+                self.nested.add(run_id)
+            else:
+                self.runs[run_id] = []
+
+    def on_chat_model_start(
+        self,
+        serialized: dict[str, Any],
+        messages: list,
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        **kwargs: Any,
+    ):
+        self.start(run_id, parent_run_id)
+
+    def on_llm_start(
+        self,
+        serialized: dict[str, Any],
+        prompts: list[str],
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        **kwargs: Any,
+    ):
+        self.start(run_id, parent_run_id)
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any):
+        with self.lock:
+            if run_id in self.runs:
+                self.runs[run_id].append(token)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        with self.lock:
+            self.nested.discard(run_id)
+            if self.runs.pop(run_id, None) is None:
+                return
+            generation = response.generations[0][0]
+            message = getattr(generation, "message", None)
+            if message is None:
+                message = AIMessage(content=generation.text)
+            self.outputs.append(message_to_dict(message))
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        with self.lock:
+            self.nested.discard(run_id)
+            tokens = self.runs.pop(run_id, None)
+            if tokens:
+                self.outputs.append(message_to_dict(AIMessage(content="".join(tokens))))
+
+
+def serialize_steps(intermediate_steps: Sequence[tuple[Any, Any]]) -> list[dict]:
+    return [
+        {
+            "tool": action.tool,
+            "tool_input": action.tool_input,
+            "log": action.log,
+            "observation": str(observation),
+        }
+        for action, observation in intermediate_steps
+    ]
+
+
+@dataclass
+class Recording:
+    """Everything needed to replay a conversation without calling the LLMs."""
+
+    settings: dict[str, Any] = field(default_factory=dict)
+    user_messages: list[str] = field(default_factory=list)
+    llm_outputs: dict[str, list[dict[str, Any]]] = field(default_factory=dict)
+    intermediate_steps: list[list[dict[str, Any]]] = field(default_factory=list)
+    mock_calls: dict[str, list[list]] = field(default_factory=dict)
+    iterations_count: int = 0
+
+    def save(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(asdict(self), f, default=encode)
+
+    @staticmethod
+    def load(path: str) -> "Recording":
+        with open(path) as f:
+            return Recording(**json.load(f, object_hook=decode))
+
+    def replay_llm(self, role: str, supports_function_calling: bool) -> "ReplayLLM":
+        return ReplayLLM(self.llm_outputs.get(role, []), supports_function_calling)
+
+    def replay_user(self) -> "ReplayUser":
+        return ReplayUser(self.user_messages)
+
+
+def recorded_mock_calls(mocks: dict[str, Mock]) -> dict[str, list[list]]:
+    # Through JSON, so that they compare equal to the ones of a loaded recording
+    calls = {
+        name: [[list(c.args), dict(c.kwargs)] for c in mock.call_args_list]
+        for name, mock in mocks.items()
+    }
+    return json.loads(json.dumps(calls, default=encode), object_hook=decode)
+
+
+def check_replay(
+    recording: Recording,
+    mocks: dict[str, Mock],
+    intermediate_steps: list[list[dict[str, Any]]],
+    iterations_count: int,
+    llms: dict[str, "ReplayLLM"],
+    user: "ReplayUser",
+):
+    """Raises ReplayDivergedError if the replay didn't do what the recording did.
+
+    The replay must make the recorded calls, in as many turns and iterations,
+    and use all the recorded answers of the `llms` and messages of the `user`.
+    """
+    mock_calls = recorded_mock_calls(mocks)
+    for name, calls in recording.mock_calls.items():
+        if mock_calls.get(name, []) != calls:
+            raise ReplayDivergedError(
+                f"{name} was called with {mock_calls.get(name, [])}, "
+                f"but the recording has {calls}"
+            )
+    if iterations_count != recording.iterations_count:
+        raise ReplayDivergedError(
+            f"The conversation took {iterations_count} iterations, "
+            f"but the recording has {recording.iterations_count}"
+        )
+    if len(intermediate_steps) != len(recording.intermediate_steps):
+        raise ReplayDivergedError(
+            f"The assistant answered {len(intermediate_steps)} turns, "
+            f"but the recording has {len(recording.intermediate_steps)}"
+        )
+    for turn, (recorded, replayed) in enumerate(
+        zip(recording.intermediate_steps, intermediate_steps)
+    ):
+        recorded_tools = [step["tool"] for step in recorded]
+        replayed_tools = [step["tool"] for step in replayed]
+        if recorded_tools != replayed_tools:
+            raise ReplayDivergedError(
+                f"Turn {turn} used the tools {replayed_tools}, "
+                f"but the recording has {recorded_tools}"
+            )
+    for role, llm in llms.items():
+        if llm.outputs:
+            raise ReplayDivergedError(
+                f"{len(llm.outputs)} recorded answers of the {role} were not used"
+            )
+    if user.messages:
+        raise ReplayDivergedError(
+            f"{len(user.messages)} recorded user messages were not used"
+        )
+
+
+class ReplayChatModel(ChatModelWrapper):
+    outputs: Any
+    """A deque with the recorded answers, in order."""
+
+    def call(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None,
+        run_manager: CallbackManagerForLLMRun | None,
+        **kwargs: Any,
+    ) -> BaseMessage:
+        try:
+            return self.outputs.popleft()
+        except IndexError:
+            raise ReplayDivergedError("More LLM calls than in the recording")
+
+
+class ReplayLLM(BaseLLM):
+    def __init__(
+        self, outputs: list[dict[str, Any]], supports_function_calling: bool = False
+    ):
+        self.outputs: deque[BaseMessage] = deque(messages_from_dict(outputs))
+        llm = ReplayChatModel(outputs=self.outputs)
+        super().__init__(
+            LLMConfig(
+                llm_name="replay", supports_function_calling=supports_function_calling
+            ),
+            llm,
+        )
+
+    def json_mode(self):
+        # Recorded answers are already JSON if they were constrained
+        return self.llm
+
+
+class ReplayUser(User):
+    def __init__(self, messages: list[str]):
+        self.messages = deque(messages)
+
+    def start(self) -> str:
+        return self.next_message()
+
+    def chat(self, llm_response: str) -> str:
+        return self.next_message()
+
+    def fork(self, transcript: Transcript | None = None) -> "ReplayUser":
+        # The branch replays the rest of the messages on its own
+        return ReplayUser(list(self.messages))
+
+    def next_message(self) -> str:
+        try:
+            return self.messages.popleft()
+        except IndexError:
+            raise ReplayDivergedError("The conversation is longer than the recording")
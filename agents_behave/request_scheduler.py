@@ -0,0 +1,209 @@
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator, TypeVar
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk
+
+from agents_behave.base_llm import BaseLLM
+from agents_behave.chat_model_wrapper import (
+    ChatModelWrapper,
+    child_callbacks,
+    invoke_model,
+)
+
+T = TypeVar("T")
+
+
+@dataclass
+class SchedulerStats:
+    requests: int = 0
+    queue_wait: float = 0.0
+    max_queue_wait: float = 0.0
+    generation: float = 0.0
+    keep_alive_pings: int = 0
+
+    def record(self, queue_wait: float, generation: float):
+        self.requests += 1
+        self.queue_wait += queue_wait
+        self.max_queue_wait = max(self.max_queue_wait, queue_wait)
+        self.generation += generation
+
+    def __str__(self):
+        if not self.requests:
+            return "No requests"
+        return (
+            f"{self.requests} requests, "
+            f"queue wait avg {self.queue_wait / self.requests:.2f}s "
+            f"(max {self.max_queue_wait:.2f}s), "
+            f"generation avg {self.generation / self.requests:.2f}s, "
+            f"{self.keep_alive_pings} keep-alive pings"
+        )
+
+
+@dataclass(order=True)
+class Ticket:
+    deadline: float
+    sequence: int
+    role: str = field(compare=False)
+
+
+class RequestScheduler:
+    """Runs requests to a server with at most `slots` in flight, by role priority.
+
+    A local server like Ollama only generates `slots` answers in parallel and
+    queues or thrashes on the rest, so the queueing happens here instead, where
+    it can be measured. When `keep_alive` is given it's called whenever the server
+    has been idle for `keep_alive_interval` seconds, so the model stays loaded.
+
+    Each role has a priority in `priorities` (0 by default, lower goes first), so
+    that the turns of running conversations are not stuck behind the analyser.
+    A request waiting for `aging` seconds goes one priority up, so that no role
+    starves: requests are served by arrival time plus `priority * aging`, and in
+    arrival order when all the roles have the same priority.
+    """
+
+    def __init__(
+        self,
+        slots: int = 1,
+        keep_alive: Callable[[], Any] | None = None,
+        keep_alive_interval: float = 240.0,
+        priorities: dict[str, int] | None = None,
+        aging: float = 30.0,
+    ):
+        self.slots = slots
+        self.keep_alive = keep_alive
+        self.keep_alive_interval = keep_alive_interval
+        self.priorities = priorities or {}
+        self.aging = aging
+        self.stats = SchedulerStats()
+        self.role_stats: dict[str, SchedulerStats] = {}
+        self.condition = threading.Condition()
+        self.waiting: list[Ticket] = []
+        self.sequence = itertools.count()
+        self.in_flight = 0
+        self.last_request = time.monotonic()
+        self.closed = threading.Event()
+        if keep_alive:
+            threading.Thread(target=self.keep_alive_loop, daemon=True).start()
+
+    def run(self, request: Callable[[], T], role: str = "default") -> T:
+        with self.slot(role):
+            return request()
+
+    @contextmanager
+    def slot(self, role: str = "default") -> Iterator[None]:
+        queued = time.perf_counter()
+        self.acquire(role)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            finished = time.perf_counter()
+            self.release()
+            with self.condition:
+                self.stats.record(started - queued, finished - started)
+                role_stats = self.role_stats.setdefault(role, SchedulerStats())
+                role_stats.record(started - queued, finished - started)
+
+    def acquire(self, role: str = "default"):
+        deadline = time.monotonic() + self.priorities.get(role, 0) * self.aging
+        ticket = Ticket(deadline, next(self.sequence), role)
+        with self.condition:
+            heapq.heappush(self.waiting, ticket)
+            self.condition.wait_for(
+                lambda: self.waiting[0] is ticket and self.in_flight < self.slots
+            )
+            heapq.heappop(self.waiting)
+            self.in_flight += 1
+            self.condition.notify_all()
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.last_request = time.monotonic()
+            self.condition.notify_all()
+
+    def keep_alive_loop(self):
+        assert self.keep_alive
+        while not self.closed.wait(self.keep_alive_interval / 4):
+            with self.condition:
+                idle = self.in_flight == 0 and not self.waiting
+                idle_for = time.monotonic() - self.last_request
+            if idle and idle_for >= self.keep_alive_interval:
+                self.acquire()
+                try:
+                    self.keep_alive()
+                except Exception:
+                    # The next real request will report the server being down
+                    pass
+                finally:
+                    self.release()
+                with self.condition:
+                    self.stats.keep_alive_pings += 1
+
+    def close(self):
+        self.closed.set()
+
+
+class ScheduledChatModel(ChatModelWrapper):
+    model: Any
+    scheduler: Any
+    role: str = "default"
+    """The role whose priority the requests get."""
+
+    def call(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None,
+        run_manager: CallbackManagerForLLMRun | None,
+        **kwargs: Any,
+    ) -> BaseMessage:
+        return self.scheduler.run(
+            lambda: invoke_model(self.model, messages, stop, run_manager, **kwargs),
+            self.role,
+        )
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        # The slot is held until the stream is consumed or closed
+        with self.scheduler.slot(self.role):
+            config = {"callbacks": child_callbacks(run_manager)}
+            for chunk in self.model.stream(messages, config, stop=stop, **kwargs):
+                if run_manager:
+                    run_manager.on_llm_new_token(str(chunk.content))
+                yield ChatGenerationChunk(message=chunk)
+
+
+class ScheduledLLM(BaseLLM):
+    def __init__(
+        self, llm: BaseLLM, scheduler: RequestScheduler, role: str = "default"
+    ):
+        self.scheduler = scheduler
+        self.inner = llm
+        self.role = role
+        super().__init__(
+            llm.llm_config,
+            ScheduledChatModel(model=llm.llm, scheduler=scheduler, role=role),
+        )
+
+    def json_mode(self):
+        json_mode_llm = self.inner.json_mode()
+        if json_mode_llm is None:
+            return None
+        return ScheduledChatModel(
+            model=json_mode_llm, scheduler=self.scheduler, role=self.role
+        )
+
+    def model_id(self) -> str | None:
+        return self.inner.model_id()
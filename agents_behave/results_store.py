@@ -0,0 +1,158 @@
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import date, datetime
+from typing import TYPE_CHECKING, Any, Sequence
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def parquet_engine_available() -> bool:
+    for engine in ("pyarrow", "fastparquet"):
+        try:
+            __import__(engine)
+            return True
+        except ImportError:
+            pass
+    return False
+
+
+def to_column_value(value: Any) -> Any:
+    # Nested values are stored as JSON, so every file of a table has the same schema
+    if isinstance(value, (dict, list, tuple)):
+        return json.dumps(value, default=str)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+class ResultsWriter:
+    """Appends rows to a Parquet dataset, partitioned by table and run date.
+
+    Rows are buffered and written in batches by a background thread, so writing a
+    row never waits for the disk. Each batch is a new file:
+    `<root>/<table>/run_date=<YYYY-MM-DD>/part-<uuid>.parquet`.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        batch_size: int = 500,
+        flush_interval: float = 5.0,
+        run_id: str | None = None,
+    ):
+        if not parquet_engine_available():
+            raise ImportError(
+                "Writing results needs pyarrow or fastparquet: pip install pyarrow"
+            )
+        self.root = root
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.run_date = date.today().isoformat()
+        self.rows: queue.Queue[tuple[str, dict[str, Any]] | None] = queue.Queue()
+        self.error: Exception | None = None
+        self.thread = threading.Thread(target=self.write_loop, daemon=True)
+        self.thread.start()
+
+    def __enter__(self) -> "ResultsWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, table: str, row: dict[str, Any]):
+        if self.error:
+            raise self.error
+        self.rows.put((table, {"run_id": self.run_id, **row}))
+
+    def close(self):
+        self.rows.put(None)
+        self.thread.join()
+        if self.error:
+            raise self.error
+
+    def write_loop(self):
+        batches: dict[str, list[dict[str, Any]]] = {}
+        last_flush = time.monotonic()
+        closed = False
+        while not closed:
+            timeout = max(self.flush_interval - (time.monotonic() - last_flush), 0)
+            try:
+                item = self.rows.get(timeout=timeout)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                closed = True
+            elif item:
+                table, row = item
+                batches.setdefault(table, []).append(row)
+            due = time.monotonic() - last_flush >= self.flush_interval
+            for table, rows in batches.items():
+                if rows and (closed or due or len(rows) >= self.batch_size):
+                    self.flush(table, rows)
+                    batches[table] = []
+            if due:
+                last_flush = time.monotonic()
+
+    def flush(self, table: str, rows: list[dict[str, Any]]):
+        import pandas as pd
+
+        try:
+            directory = os.path.join(self.root, table, f"run_date={self.run_date}")
+            os.makedirs(directory, exist_ok=True)
+            frame = pd.DataFrame(
+                [{k: to_column_value(v) for k, v in row.items()} for row in rows]
+            )
+            name = f"part-{uuid.uuid4().hex}.parquet"
+            # Readers skip hidden files, so they never see a partially written one
+            hidden = os.path.join(directory, f".{name}")
+            frame.to_parquet(hidden, index=False)
+            os.replace(hidden, os.path.join(directory, name))
+        except Exception as e:
+            self.error = e
+
+
+class ResultsStore:
+    """Reads back what a ResultsWriter wrote, across all runs."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def read(self, table: str, columns: list[str] | None = None) -> "pd.DataFrame":
+        import pandas as pd
+
+        path = os.path.join(self.root, table)
+        if not os.path.isdir(path):
+            return pd.DataFrame(columns=columns)
+        frame = pd.read_parquet(path, columns=columns)
+        if "run_date" in frame.columns:
+            frame["run_date"] = frame["run_date"].astype(str)
+        return frame
+
+    def pass_rates(
+        self, by: Sequence[str] = ("llm_name",), table: str = "conversations"
+    ) -> "pd.DataFrame":
+        frame = self.read(table, columns=[*by, "passed"])
+        return (
+            frame.groupby(list(by))["passed"]
+            .agg(runs="count", passes="sum", pass_rate="mean")
+            .reset_index()
+        )
+
+    def latency_percentiles(
+        self,
+        column: str = "assistant_seconds",
+        by: Sequence[str] = ("llm_name",),
+        percentiles: Sequence[float] = (0.5, 0.95),
+        table: str = "turns",
+    ) -> "pd.DataFrame":
+        frame = self.read(table, columns=[*by, column])
+        grouped = frame.groupby(list(by))[column]
+        quantiles = grouped.quantile(list(percentiles)).unstack()
+        quantiles.columns = [f"p{round(p * 100)}" for p in quantiles.columns]
+        return quantiles.reset_index()
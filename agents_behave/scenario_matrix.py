@@ -0,0 +1,106 @@
+import hashlib
+import itertools
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Iterable
+
+if TYPE_CHECKING:
+    from agents_behave.scenario_scheduler import ScenarioScheduler
+
+
+@dataclass
+class Scenario:
+    id: str
+    persona: str
+    parameters: dict[str, Any] = field(default_factory=dict)
+
+
+def scenario_id(parameters: dict[str, Any]) -> str:
+    key = json.dumps(parameters, sort_keys=True, default=str)
+    return hashlib.sha1(key.encode()).hexdigest()[:12]
+
+
+def expand_matrix(
+    persona_template: str, dimensions: dict[str, Iterable[Any]]
+) -> list[Scenario]:
+    names = list(dimensions)
+    scenarios = []
+    for values in itertools.product(*(list(dimensions[name]) for name in names)):
+        parameters = dict(zip(names, values))
+        scenarios.append(
+            Scenario(
+                id=scenario_id(parameters),
+                persona=persona_template.format(**parameters),
+                parameters=parameters,
+            )
+        )
+    return scenarios
+
+
+def shard_of(scenario: Scenario, shard_count: int) -> int:
+    # hash() is salted per process, so use a digest that is stable across machines
+    return int(hashlib.sha256(scenario.id.encode()).hexdigest(), 16) % shard_count
+
+
+def shard(
+    scenarios: list[Scenario], shard_index: int, shard_count: int
+) -> list[Scenario]:
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f"Invalid shard {shard_index}/{shard_count}")
+    return [s for s in scenarios if shard_of(s, shard_count) == shard_index]
+
+
+class ScenarioResults:
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> dict[str, dict[str, Any]]:
+        results: dict[str, dict[str, Any]] = {}
+        if not os.path.exists(self.path):
+            return results
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    # A line can be truncated if the previous run was killed mid-write
+                    continue
+                results[result["scenario_id"]] = result
+        return results
+
+    def append(self, scenario: Scenario, result: dict[str, Any]):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        line = json.dumps({"scenario_id": scenario.id, **result}, default=str)
+        with open(self.path, "a") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def run_scenarios(
+    scenarios: list[Scenario],
+    run: Callable[[Scenario], dict[str, Any]],
+    results: ScenarioResults,
+    scheduler: "ScenarioScheduler | None" = None,
+) -> dict[str, dict[str, Any]]:
+    completed = results.load()
+    lock = threading.Lock()
+
+    def run_and_save(scenario: Scenario) -> dict[str, Any]:
+        result = run(scenario)
+        with lock:
+            results.append(scenario, result)
+            completed[scenario.id] = {"scenario_id": scenario.id, **result}
+        return result
+
+    pending = [s for s in scenarios if s.id not in completed]
+    if scheduler is None:
+        for scenario in pending:
+            run_and_save(scenario)
+    else:
+        scheduler.run(pending, run_and_save)
+    return {s.id: completed[s.id] for s in scenarios}
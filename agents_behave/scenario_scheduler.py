@@ -0,0 +1,163 @@
+import json
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable
+
+from agents_behave.scenario_matrix import Scenario
+
+
+@dataclass
+class ScenarioHistory:
+    seconds: float
+    tokens: float
+    runs: int = 1
+
+
+class DurationHistory:
+    """The durations and token usage of past runs of each scenario.
+
+    Both are exponentially weighted moving averages, so that a scenario's
+    estimate follows changes to the prompts or the models. Scenarios that never
+    ran are expected to take the average duration of the others.
+    """
+
+    def __init__(self, path: str | None = None, alpha: float = 0.3):
+        self.path = path
+        self.alpha = alpha
+        self.entries: dict[str, ScenarioHistory] = {}
+        self.lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.entries = {
+                    scenario_id: ScenarioHistory(**entry)
+                    for scenario_id, entry in json.load(f).items()
+                }
+
+    def record(self, scenario_id: str, seconds: float, tokens: float = 0):
+        with self.lock:
+            entry = self.entries.get(scenario_id)
+            if entry is None:
+                self.entries[scenario_id] = ScenarioHistory(seconds, tokens)
+                return
+            entry.seconds += self.alpha * (seconds - entry.seconds)
+            entry.tokens += self.alpha * (tokens - entry.tokens)
+            entry.runs += 1
+
+    def expected_seconds(self, scenario_id: str) -> float:
+        with self.lock:
+            entry = self.entries.get(scenario_id)
+            if entry is not None:
+                return entry.seconds
+            if not self.entries:
+                # Without any history, every scenario is expected to take as long
+                return 1.0
+            return statistics.fmean(e.seconds for e in self.entries.values())
+
+    def save(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.lock:
+            entries = {
+                scenario_id: asdict(entry) for scenario_id, entry in self.entries.items()
+            }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entries, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+@dataclass
+class SchedulerStats:
+    steals: int = 0
+    makespan: float = 0.0
+    predicted_makespan: float = 0.0
+    busy_seconds: list[float] = field(default_factory=list)
+
+
+class ScenarioScheduler:
+    """Runs scenarios on several workers, to finish the whole suite as soon as possible.
+
+    The scenarios are spread across the workers longest expected first, each one
+    going to the worker with the least expected work. Estimates are never exact,
+    so a worker that runs out of scenarios steals the last one queued by the
+    worker with the most expected work left.
+    """
+
+    def __init__(self, history: DurationHistory, workers: int = 4):
+        self.history = history
+        self.workers = workers
+        self.queues: list[deque[Scenario]] = []
+        self.stats = SchedulerStats()
+        self.lock = threading.Lock()
+
+    def plan(self, scenarios: list[Scenario]) -> list[deque[Scenario]]:
+        queues: list[deque[Scenario]] = [deque() for _ in range(self.workers)]
+        loads = [0.0] * self.workers
+        expected = {s.id: self.history.expected_seconds(s.id) for s in scenarios}
+        for scenario in sorted(scenarios, key=lambda s: expected[s.id], reverse=True):
+            worker = loads.index(min(loads))
+            queues[worker].append(scenario)
+            loads[worker] += expected[scenario.id]
+        self.stats.predicted_makespan = max(loads, default=0.0)
+        return queues
+
+    def run(
+        self, scenarios: list[Scenario], run: Callable[[Scenario], dict[str, Any]]
+    ) -> dict[str, dict[str, Any]]:
+        self.queues = self.plan(scenarios)
+        self.stats.busy_seconds = [0.0] * self.workers
+        results: dict[str, dict[str, Any]] = {}
+        failed = threading.Event()
+
+        def work(worker: int):
+            while not failed.is_set():
+                scenario = self.next_scenario(worker)
+                if scenario is None:
+                    return
+                started = time.perf_counter()
+                try:
+                    result = run(scenario)
+                except BaseException:
+                    # The other workers stop after their current scenario
+                    failed.set()
+                    raise
+                seconds = time.perf_counter() - started
+                self.stats.busy_seconds[worker] += seconds
+                self.history.record(scenario.id, seconds, result.get("tokens") or 0)
+                with self.lock:
+                    results[scenario.id] = result
+
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = [executor.submit(work, worker) for worker in range(self.workers)]
+                for future in futures:
+                    future.result()
+        finally:
+            self.stats.makespan = time.perf_counter() - started
+            self.history.save()
+        return results
+
+    def next_scenario(self, worker: int) -> Scenario | None:
+        with self.lock:
+            if self.queues[worker]:
+                return self.queues[worker].popleft()
+            victim = max(
+                (queue for queue in self.queues if queue),
+                key=lambda queue: sum(
+                    self.history.expected_seconds(s.id) for s in queue
+                ),
+                default=None,
+            )
+            if victim is None:
+                return None
+            self.stats.steals += 1
+            return victim.pop()
@@ -1,13 +1,14 @@
-from abc import abstractmethod
+from abc import ABC, abstractmethod
 
-from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 
 from agents_behave.base_llm import BaseLLM
+from agents_behave.transcript import Transcript, TranscriptView
 
 
-class User:
+class User(ABC):
     @abstractmethod
     def start(self) -> str:
         pass
@@ -16,12 +17,31 @@ class User:
     def chat(self, llm_response: str) -> str:
         pass
 
+    @abstractmethod
+    def fork(self, transcript: Transcript | None = None) -> "User":
+        """A copy of the user, to branch the conversation from where it is."""
+
 
 class TestUser(User):
-    def __init__(self, llm: BaseLLM, persona: str):
-        self.chat_history = []
+    def __init__(
+        self,
+        llm: BaseLLM,
+        persona: str,
+        transcript: Transcript | None = None,
+        callbacks: list[BaseCallbackHandler] | None = None,
+    ):
+        # With a shared transcript, the conversation runner adds the messages
+        self.llm = llm
+        self.persona = persona
+        self.callbacks = callbacks or []
+        self.owns_transcript = transcript is None
+        self.transcript = transcript if transcript is not None else Transcript()
         self.agent = self.build_agent(llm, persona)
 
+    @property
+    def chat_history(self) -> TranscriptView:
+        return self.transcript.view("user")
+
     def build_agent(self, llm: BaseLLM, persona: str):
         user_prompt = USER_PROMPT.format(persona=persona)
         prompt = ChatPromptTemplate.from_messages(
@@ -35,18 +55,35 @@ class TestUser(User):
 
     def start(self):
         response = self.get_response()
-        self.chat_history.append(AIMessage(content=response))
+        if self.owns_transcript:
+            self.transcript.append("user", response)
         return response
 
     def chat(self, query: str):
-        self.chat_history.append(HumanMessage(content=query))
+        if self.owns_transcript:
+            self.transcript.append("assistant", query)
         response = self.get_response()
-        self.chat_history.append(AIMessage(content=response))
+        if self.owns_transcript:
+            self.transcript.append("user", response)
         return response
 
+    def fork(
+        self, persona: str | None = None, transcript: Transcript | None = None
+    ) -> "TestUser":
+        user = TestUser(
+            llm=self.llm,
+            persona=persona or self.persona,
+            transcript=transcript,
+            callbacks=self.callbacks,
+        )
+        if transcript is None:
+            user.transcript = self.transcript.fork()
+        return user
+
     def get_response(self):
         response = self.agent.invoke(
-            {"chat_history": self.chat_history},
+            {"chat_history": self.transcript.messages("user")},
+            {"callbacks": self.callbacks},
         )
         return response
 
@@ -0,0 +1,238 @@
+import functools
+import json
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Iterator
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk
+
+from agents_behave.base_llm import BaseLLM, LLMConfig
+from agents_behave.budget import trim_history
+from agents_behave.chat_model_wrapper import (
+    ChatModelWrapper,
+    child_callbacks,
+    invoke_model,
+)
+from agents_behave.token_usage import message_usage
+
+logger = logging.getLogger(__name__)
+
+# In tokens, for the prompt and the completion together
+CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4-turbo-preview": 128000,
+    "gpt-4o": 128000,
+    "llama3-70b-8192": 8192,
+    "llama3-8b-8192": 8192,
+    "llama3": 8192,
+    "mistralai/mixtral-8x7b-instruct": 32768,
+    "microsoft/wizardlm-2-8x22b": 65536,
+    "accounts/fireworks/models/firefunction-v1": 32768,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# The tokens every message adds for its role and separators
+MESSAGE_OVERHEAD = 4
+
+
+@functools.lru_cache
+def tiktoken_encoding(model: str) -> Any:
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # The encodings are downloaded the first time, which fails offline
+        logger.warning("No tiktoken encoding for %s, counting characters", model)
+        return None
+
+
+class TokenEstimator:
+    """Counts the tokens of a prompt locally, before sending it.
+
+    OpenAI models are counted exactly with tiktoken, when it's installed. Other
+    models are estimated from the number of characters, erring on the high side.
+    """
+
+    def __init__(self, model: str | None = None, chars_per_token: float = 3.5):
+        self.model = model or ""
+        self.chars_per_token = chars_per_token
+        self.encoding = (
+            tiktoken_encoding(self.model) if self.model.startswith("gpt-") else None
+        )
+
+    def count_text(self, text: str) -> int:
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        return int(len(text) / self.chars_per_token) + 1
+
+    def count_messages(self, messages: list[BaseMessage]) -> int:
+        tokens = 0
+        for message in messages:
+            tokens += MESSAGE_OVERHEAD + self.count_text(str(message.content))
+            tool_calls = getattr(message, "tool_calls", None)
+            if tool_calls:
+                tokens += self.count_text(json.dumps(tool_calls, default=str))
+        return tokens
+
+
+def estimator_for(llm_config: LLMConfig) -> TokenEstimator:
+    model = llm_config.model or ""
+    # Llama 3's vocabulary is about as large as OpenAI's
+    chars_per_token = 4.0 if "llama3" in model else 3.5
+    return TokenEstimator(model, chars_per_token)
+
+
+def context_window(model: str | None) -> int:
+    return CONTEXT_WINDOWS.get(model or "", DEFAULT_CONTEXT_WINDOW)
+
+
+@dataclass
+class EstimateStats:
+    calls: int = 0
+    estimated_tokens: int = 0
+    measured_calls: int = 0
+    measured_estimate: int = 0
+    actual_tokens: int = 0
+    warnings: int = 0
+    trimmed: int = 0
+
+    def record(self, estimate: int, actual: int):
+        if actual:
+            self.measured_calls += 1
+            self.measured_estimate += estimate
+            self.actual_tokens += actual
+
+    def ratio(self) -> float | None:
+        """Actual prompt tokens per estimated token, for the calls that reported them."""
+        if not self.measured_estimate:
+            return None
+        return self.actual_tokens / self.measured_estimate
+
+
+_estimate_stats: dict[str, EstimateStats] = {}
+_estimate_stats_lock = threading.Lock()
+
+
+def estimate_stats(model: str) -> EstimateStats:
+    with _estimate_stats_lock:
+        return _estimate_stats.setdefault(model, EstimateStats())
+
+
+def all_estimate_stats() -> dict[str, EstimateStats]:
+    with _estimate_stats_lock:
+        return dict(_estimate_stats)
+
+
+class PromptGuardChatModel(ChatModelWrapper):
+    model: Any
+    estimator: Any
+    """The TokenEstimator of the model."""
+    model_name: str
+    context_window: int
+    completion_tokens: int = 1024
+    """Room left in the context window for the answer."""
+    warn_at: float = 0.8
+    trim: bool = False
+    """Drop the oldest messages, instead of only warning, when the prompt is too long."""
+
+    def fit(self, messages: list[BaseMessage]) -> tuple[list[BaseMessage], int]:
+        stats = estimate_stats(self.model_name)
+        estimate = self.estimator.count_messages(messages)
+        limit = self.context_window - self.completion_tokens
+        with _estimate_stats_lock:
+            stats.calls += 1
+            stats.estimated_tokens += estimate
+            if estimate >= self.warn_at * limit:
+                stats.warnings += 1
+        if estimate >= self.warn_at * limit:
+            logger.warning(
+                "The prompt for %s is about %d tokens, its limit is %d",
+                self.model_name,
+                estimate,
+                limit,
+            )
+        if not self.trim or estimate <= limit:
+            return messages, estimate
+
+        keep = len(messages)
+        trimmed = messages
+        while estimate > limit and keep > 1:
+            keep -= 1
+            trimmed = trim_history(messages, keep)
+            estimate = self.estimator.count_messages(trimmed)
+        with _estimate_stats_lock:
+            stats.trimmed += 1
+        return trimmed, estimate
+
+    def record_usage(self, estimate: int, message: BaseMessage):
+        prompt_tokens, _ = message_usage(message)
+        stats = estimate_stats(self.model_name)
+        with _estimate_stats_lock:
+            stats.record(estimate, prompt_tokens)
+
+    def call(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None,
+        run_manager: CallbackManagerForLLMRun | None,
+        **kwargs: Any,
+    ) -> BaseMessage:
+        messages, estimate = self.fit(messages)
+        message = invoke_model(self.model, messages, stop, run_manager, **kwargs)
+        self.record_usage(estimate, message)
+        return message
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        messages, estimate = self.fit(messages)
+        config = {"callbacks": child_callbacks(run_manager)}
+        chunk = None
+        for chunk in self.model.stream(messages, config, stop=stop, **kwargs):
+            if run_manager:
+                run_manager.on_llm_new_token(str(chunk.content))
+            yield ChatGenerationChunk(message=chunk)
+        if chunk is not None:
+            # Only some providers report the usage in the last chunk
+            self.record_usage(estimate, chunk)
+
+
+class GuardedLLM(BaseLLM):
+    """Estimates the size of every prompt, and warns or trims it before it's sent."""
+
+    def __init__(self, llm: BaseLLM, trim: bool = False, warn_at: float = 0.8):
+        self.inner = llm
+        self.trim = trim
+        self.warn_at = warn_at
+        super().__init__(llm.llm_config, llm.llm)
+        self.llm = self.guard(llm.llm)
+
+    def guard(self, model: Any) -> PromptGuardChatModel:
+        return PromptGuardChatModel(
+            model=model,
+            estimator=estimator_for(self.llm_config),
+            model_name=self.llm_config.model or self.llm_config.llm_name or "",
+            context_window=context_window(self.llm_config.model),
+            warn_at=self.warn_at,
+            trim=self.trim,
+        )
+
+    def json_mode(self):
+        json_mode_llm = self.inner.json_mode()
+        return self.guard(json_mode_llm) if json_mode_llm is not None else None
+
+    def model_id(self) -> str | None:
+        return self.inner.model_id()
@@ -0,0 +1,74 @@
+import threading
+from dataclasses import dataclass
+from typing import Any
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+
+
+@dataclass
+class TokenUsage:
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    calls: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, prompt_tokens: int, completion_tokens: int):
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.calls += 1
+
+
+def usage_of(response: LLMResult) -> tuple[int, int]:
+    # OpenAI compatible APIs (OpenAI, Groq, OpenRouter, ...)
+    token_usage = (response.llm_output or {}).get("token_usage")
+    if token_usage:
+        return (
+            token_usage.get("prompt_tokens", 0),
+            token_usage.get("completion_tokens", 0),
+        )
+
+    prompt_tokens = completion_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            prompt, completion = message_usage(
+                getattr(generation, "message", None), generation.generation_info
+            )
+            prompt_tokens += prompt
+            completion_tokens += completion
+    return prompt_tokens, completion_tokens
+
+
+def message_usage(
+    message: BaseMessage | None, generation_info: dict[str, Any] | None = None
+) -> tuple[int, int]:
+    metadata = getattr(message, "response_metadata", None) or {}
+    token_usage = metadata.get("token_usage")
+    if token_usage:
+        return (
+            token_usage.get("prompt_tokens", 0),
+            token_usage.get("completion_tokens", 0),
+        )
+    # Ollama
+    info = generation_info or metadata
+    return info.get("prompt_eval_count") or 0, info.get("eval_count") or 0
+
+
+class TokenUsageHandler(BaseCallbackHandler):
+    """Adds up the tokens used by the LLM calls it's passed to."""
+
+    def __init__(self):
+        self.usage = TokenUsage()
+        self.lock = threading.Lock()
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any):
+        prompt_tokens, completion_tokens = usage_of(response)
+        if not prompt_tokens and not completion_tokens:
+            # Wrappers like CascadeLLM report nothing, the models they call do
+            return
+        with self.lock:
+            self.usage.add(prompt_tokens, completion_tokens)
@@ -0,0 +1,403 @@
+import json
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Iterator, Protocol
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+@dataclass
+class Span:
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    name: str
+    start_time: datetime
+    end_time: datetime | None = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: str | None = None
+
+    @property
+    def duration(self) -> float:
+        end_time = self.end_time or datetime.now(timezone.utc)
+        return (end_time - self.start_time).total_seconds()
+
+
+class SpanSink(Protocol):
+    def export(self, spans: list[Span]): ...
+
+    def close(self): ...
+
+
+class FileSink:
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, "a")
+
+    def export(self, spans: list[Span]):
+        for span in spans:
+            self.file.write(json.dumps(asdict(span), default=str) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class LangfuseSink:
+    """Sends each trace to Langfuse, with the spans as nested observations.
+
+    The Langfuse client reads its keys and host from the LANGFUSE_* env vars.
+    """
+
+    def __init__(self, client: Any = None):
+        if client is None:
+            from langfuse import Langfuse
+
+            client = Langfuse()
+        self.client = client
+
+    def export(self, spans: list[Span]):
+        for span in spans:
+            if span.parent_id is None:
+                self.client.trace(
+                    id=span.trace_id,
+                    name=span.name,
+                    session_id=span.attributes.get("session_id"),
+                    metadata=span.attributes,
+                    timestamp=span.start_time,
+                )
+            self.client.span(
+                id=span.span_id,
+                trace_id=span.trace_id,
+                parent_observation_id=span.parent_id,
+                name=span.name,
+                start_time=span.start_time,
+                end_time=span.end_time,
+                metadata=span.attributes,
+                level="ERROR" if span.error else None,
+                status_message=span.error,
+            )
+
+    def close(self):
+        # The client sends the events in its own background thread
+        self.client.shutdown()
+
+
+@dataclass
+class TracerStats:
+    traces: int = 0
+    exported_spans: int = 0
+    sampled_out_traces: int = 0
+    dropped_spans: int = 0
+    """Spans lost because the export queue was full or the trace already ended."""
+
+
+@dataclass
+class OpenTrace:
+    sampled: bool
+    spans: list[Span] = field(default_factory=list)
+
+
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """Records spans and exports them to a sink from a background thread.
+
+    Traces are head sampled with `sample_rate` when they start. The spans of a
+    trace are kept in memory until it ends, so the traces that were not sampled
+    are still exported if they failed or took longer than `slow_threshold`
+    seconds (tail sampling). Finished traces go to a bounded queue that is
+    exported in batches; when the queue is full, spans are dropped instead of
+    slowing down the conversation.
+
+    A tracer without a sink is disabled and doesn't record anything.
+    """
+
+    def __init__(
+        self,
+        sink: SpanSink | None = None,
+        sample_rate: float = 1.0,
+        slow_threshold: float | None = None,
+        max_queue_size: int = 10_000,
+        batch_size: int = 100,
+        flush_interval: float = 2.0,
+    ):
+        self.sink = sink
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.stats = TracerStats()
+        self.lock = threading.Lock()
+        self.open_traces: dict[str, OpenTrace] = {}
+        self.spans: queue.Queue[Span | None] = queue.Queue(maxsize=max_queue_size)
+        self.thread: threading.Thread | None = None
+        if sink is not None:
+            self.thread = threading.Thread(target=self.export_loop, daemon=True)
+            self.thread.start()
+
+    @property
+    def enabled(self) -> bool:
+        return self.sink is not None
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span | None]:
+        """A span that is a child of the current one, or a new trace."""
+        if not self.enabled:
+            yield None
+            return
+        span = self.start_span(name, _current_span.get(), **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            self.end_span(span, error=repr(e))
+            raise
+        else:
+            self.end_span(span)
+        finally:
+            _current_span.reset(token)
+
+    @contextmanager
+    def trace(self, name: str, **attributes: Any) -> Iterator[Span | None]:
+        """A new trace, even if there's a current span."""
+        token = _current_span.set(None)
+        try:
+            with self.span(name, **attributes) as span:
+                yield span
+        finally:
+            _current_span.reset(token)
+
+    def current_span(self) -> Span | None:
+        return _current_span.get()
+
+    def start_span(self, name: str, parent: Span | None, **attributes: Any) -> Span:
+        span = Span(
+            trace_id=parent.trace_id if parent else uuid.uuid4().hex,
+            span_id=uuid.uuid4().hex,
+            parent_id=parent.span_id if parent else None,
+            name=name,
+            start_time=datetime.now(timezone.utc),
+            attributes=attributes,
+        )
+        if parent is None:
+            with self.lock:
+                self.stats.traces += 1
+                self.open_traces[span.trace_id] = OpenTrace(
+                    sampled=random.random() < self.sample_rate
+                )
+        return span
+
+    def end_span(self, span: Span, error: str | None = None):
+        span.end_time = datetime.now(timezone.utc)
+        span.error = error
+        with self.lock:
+            trace = self.open_traces.get(span.trace_id)
+            if trace is None:
+                self.stats.dropped_spans += 1
+                return
+            trace.spans.append(span)
+            if span.parent_id is not None:
+                return
+            del self.open_traces[span.trace_id]
+        if self.keep(trace, span):
+            self.enqueue(trace.spans)
+        else:
+            with self.lock:
+                self.stats.sampled_out_traces += 1
+
+    def keep(self, trace: OpenTrace, root: Span) -> bool:
+        if trace.sampled or any(span.error for span in trace.spans):
+            return True
+        return self.slow_threshold is not None and root.duration >= self.slow_threshold
+
+    def enqueue(self, spans: list[Span]):
+        for index, span in enumerate(spans):
+            try:
+                self.spans.put_nowait(span)
+            except queue.Full:
+                with self.lock:
+                    self.stats.dropped_spans += len(spans) - index
+                return
+
+    def export_loop(self):
+        assert self.sink is not None
+        batch: list[Span] = []
+        last_flush = time.monotonic()
+        closed = False
+        while not closed:
+            timeout = max(self.flush_interval - (time.monotonic() - last_flush), 0)
+            try:
+                span = self.spans.get(timeout=timeout)
+                if span is None:
+                    closed = True
+                else:
+                    batch.append(span)
+            except queue.Empty:
+                pass
+            due = time.monotonic() - last_flush >= self.flush_interval
+            if batch and (closed or due or len(batch) >= self.batch_size):
+                try:
+                    self.sink.export(batch)
+                    with self.lock:
+                        self.stats.exported_spans += len(batch)
+                except Exception:
+                    # Tracing must never break a test run
+                    with self.lock:
+                        self.stats.dropped_spans += len(batch)
+                batch = []
+            if due:
+                last_flush = time.monotonic()
+
+    def close(self):
+        if self.thread is None or self.sink is None:
+            return
+        # Blocks if the queue is full, so the spans already queued are not lost
+        self.spans.put(None)
+        self.thread.join()
+        self.thread = None
+        self.sink.close()
+
+
+def tracer_from_env() -> Tracer:
+    """TRACE_SINK=langfuse or a .jsonl path, TRACE_SAMPLE_RATE, TRACE_SLOW_SECONDS"""
+    sink_name = os.getenv("TRACE_SINK")
+    if not sink_name:
+        return Tracer()
+    sink: SpanSink = LangfuseSink() if sink_name == "langfuse" else FileSink(sink_name)
+    slow_seconds = os.getenv("TRACE_SLOW_SECONDS")
+    return Tracer(
+        sink,
+        sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "1.0")),
+        slow_threshold=float(slow_seconds) if slow_seconds else None,
+    )
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Records the steps of an agent, its LLM calls and its tool calls as spans.
+
+    Only the top-level chain (e.g. the AgentExecutor) and its direct children (the
+    agent steps) become chain spans, the inner runnables of each step are skipped.
+    The spans are children of the tracer's current span when the run started.
+    """
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+        self.spans: dict[UUID, Span] = {}
+        # The nearest recorded ancestor of each run, and its depth in the run tree
+        self.parents: dict[UUID, tuple[Span | None, int]] = {}
+        self.lock = threading.Lock()
+
+    def start(
+        self,
+        run_id: UUID,
+        parent_run_id: UUID | None,
+        name: str,
+        record: bool,
+        **attributes: Any,
+    ):
+        if not self.tracer.enabled:
+            return
+        with self.lock:
+            if parent_run_id is None:
+                parent, depth = self.tracer.current_span(), 0
+            else:
+                parent, depth = self.parents.get(parent_run_id, (None, 0))
+                depth += 1
+            if record and parent is not None:
+                span = self.tracer.start_span(name, parent, **attributes)
+                self.spans[run_id] = span
+                parent = span
+            self.parents[run_id] = (parent, depth)
+
+    def end(self, run_id: UUID, error: BaseException | None = None):
+        with self.lock:
+            self.parents.pop(run_id, None)
+            span = self.spans.pop(run_id, None)
+        if span is not None:
+            self.tracer.end_span(span, error=repr(error) if error else None)
+
+    def depth(self, parent_run_id: UUID | None) -> int:
+        if parent_run_id is None:
+            return 0
+        with self.lock:
+            return self.parents.get(parent_run_id, (None, 0))[1] + 1
+
+    def on_chain_start(
+        self,
+        serialized: dict[str, Any],
+        inputs: dict[str, Any],
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        **kwargs: Any,
+    ):
+        name = kwargs.get("name") or (serialized or {}).get("name") or "chain"
+        record = self.depth(parent_run_id) <= 1
+        self.start(run_id, parent_run_id, name, record, kind="chain")
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any):
+        self.end(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self.end(run_id, error)
+
+    def on_chat_model_start(
+        self,
+        serialized: dict[str, Any],
+        messages: list,
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        **kwargs: Any,
+    ):
+        name = (serialized or {}).get("name") or "llm"
+        self.start(run_id, parent_run_id, name, True, kind="llm")
+
+    def on_llm_start(
+        self,
+        serialized: dict[str, Any],
+        prompts: list[str],
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        **kwargs: Any,
+    ):
+        name = (serialized or {}).get("name") or "llm"
+        self.start(run_id, parent_run_id, name, True, kind="llm")
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any):
+        self.end(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self.end(run_id, error)
+
+    def on_tool_start(
+        self,
+        serialized: dict[str, Any],
+        input_str: str,
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        **kwargs: Any,
+    ):
+        name = kwargs.get("name") or (serialized or {}).get("name") or "tool"
+        self.start(run_id, parent_run_id, name, True, kind="tool", input=input_str)
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any):
+        self.end(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self.end(run_id, error)
@@ -0,0 +1,78 @@
+from typing import Literal, Sequence, overload
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+Speaker = Literal["user", "assistant"]
+
+
+class Transcript:
+    """The messages of a conversation between a user and an assistant.
+
+    The transcript is append-only and is meant to be shared by everyone taking part
+    in the conversation. Each of them reads it through a view from their own
+    perspective: their messages are AI messages, the other side's are human ones.
+    """
+
+    def __init__(self):
+        self.speakers: list[Speaker] = []
+        self.contents: list[str] = []
+        # Messages are built the first time they are read and then reused
+        self._messages: dict[Speaker, list[BaseMessage]] = {
+            "user": [],
+            "assistant": [],
+        }
+
+    def __len__(self) -> int:
+        return len(self.contents)
+
+    def append(self, speaker: Speaker, content: str):
+        self.speakers.append(speaker)
+        self.contents.append(content)
+
+    def append_message(self, message: BaseMessage):
+        # From the assistant's perspective, like ConversationRunnerState.chat_history
+        speaker: Speaker = "assistant" if isinstance(message, AIMessage) else "user"
+        self.append(speaker, str(message.content))
+
+    def messages(self, perspective: Speaker) -> list[BaseMessage]:
+        """The messages as seen by `perspective`. The list must not be modified."""
+        messages = self._messages[perspective]
+        for speaker, content in zip(
+            self.speakers[len(messages):], self.contents[len(messages):]
+        ):
+            message_type = AIMessage if speaker == perspective else HumanMessage
+            messages.append(message_type(content=content))
+        return messages
+
+    def view(self, perspective: Speaker) -> "TranscriptView":
+        return TranscriptView(self, perspective)
+
+    def fork(self) -> "Transcript":
+        transcript = Transcript()
+        transcript.speakers = list(self.speakers)
+        transcript.contents = list(self.contents)
+        return transcript
+
+
+class TranscriptView(Sequence[BaseMessage]):
+    def __init__(self, transcript: Transcript, perspective: Speaker):
+        self.transcript = transcript
+        self.perspective = perspective
+
+    def __len__(self) -> int:
+        return len(self.transcript)
+
+    @overload
+    def __getitem__(self, index: int) -> BaseMessage: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[BaseMessage]: ...
+
+    def __getitem__(self, index):
+        return self.transcript.messages(self.perspective)[index]
+
+    def __iter__(self):
+        return iter(self.transcript.messages(self.perspective))
+
+    def to_list(self) -> list[BaseMessage]:
+        return list(self.transcript.messages(self.perspective))
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable
+
+
+def normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def verdict_key(
+    conversation: str, criteria: list[str], model: str, prompt: str
+) -> str:
+    """The hash of everything a verdict depends on.
+
+    Whitespace is normalized, so that reformatting a transcript or the criteria of
+    a feature file doesn't invalidate its verdicts.
+    """
+    parts = {
+        "conversation": normalize(conversation),
+        "criteria": [normalize(c) for c in criteria],
+        "model": model,
+        "prompt": hashlib.sha256(prompt.encode()).hexdigest(),
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+@dataclass
+class VerdictCacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class VerdictCache:
+    """A persistent cache of the analyser's verdicts, in a SQLite database.
+
+    When there are more than `max_entries` verdicts, the least recently used ones
+    are evicted. The database can be shared by several processes.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 10000,
+        clock: Callable[[], float] = time.time,
+    ):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.clock = clock
+        self.stats = VerdictCacheStats()
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS verdicts "
+                "(key TEXT PRIMARY KEY, verdict TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS verdicts_last_used ON verdicts (last_used)"
+            )
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT verdict FROM verdicts WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.stats.misses += 1
+                return None
+            self.connection.execute(
+                "UPDATE verdicts SET last_used = ? WHERE key = ?", (self.clock(), key)
+            )
+            self.stats.hits += 1
+            return json.loads(row[0])
+
+    def put(self, key: str, verdict: dict[str, Any]):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO verdicts (key, verdict, last_used) "
+                "VALUES (?, ?, ?)",
+                (key, json.dumps(verdict), self.clock()),
+            )
+            evicted = self.connection.execute(
+                "DELETE FROM verdicts WHERE key IN (SELECT key FROM verdicts "
+                "ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+            self.stats.evictions += evicted
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def verdict_cache_from_env() -> VerdictCache | None:
+    path = os.getenv("VERDICT_CACHE")
+    return VerdictCache(path) if path else None
@@ -0,0 +1,282 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable, Protocol
+
+
+@dataclass
+class Job:
+    id: str
+    payload: dict[str, Any]
+    attempts: int
+    lease_id: str
+    worker_id: str
+
+
+@dataclass
+class FailedJob:
+    id: str
+    payload: dict[str, Any]
+    attempts: int
+    error: str | None
+
+
+@dataclass
+class QueueStatus:
+    queued: int = 0
+    leased: int = 0
+    done: int = 0
+    failed: int = 0
+
+    @property
+    def finished(self) -> bool:
+        return self.queued == 0 and self.leased == 0
+
+
+class Broker(Protocol):
+    """Hands out jobs to workers, at least once.
+
+    A leased job is invisible to the other workers until its lease expires. A
+    worker that dies loses its lease and the job is handed to another worker, so
+    a job can run more than once; only the first result of a job is kept. A job
+    that failed, or whose lease expired, `max_attempts` times is not retried.
+    """
+
+    def enqueue(self, job_id: str, payload: dict[str, Any]) -> bool: ...
+
+    def lease(self, worker_id: str, visibility_timeout: float) -> Job | None: ...
+
+    def extend(self, job: Job, visibility_timeout: float) -> bool: ...
+
+    def complete(self, job: Job, result: dict[str, Any]) -> bool: ...
+
+    def fail(self, job: Job, error: str) -> None: ...
+
+    def results(self) -> dict[str, dict[str, Any]]: ...
+
+    def failures(self) -> list[FailedJob]: ...
+
+    def status(self) -> QueueStatus: ...
+
+
+class SQLiteBroker:
+    """A broker in a SQLite database, for workers that can lock the database file.
+
+    SQLite relies on file locks, so the database must be on a local disk, or on a
+    filesystem whose locks work across machines, not on a network disk that gets
+    them wrong (as NFS and SMB often do), where two workers can lease the same job
+    or corrupt the database.
+    """
+
+    def __init__(self, path: str, max_attempts: int = 3):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        # Autocommit, the transactions are explicit
+        self.connection = sqlite3.connect(
+            path, check_same_thread=False, timeout=60, isolation_level=None
+        )
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_id TEXT,
+                leased_by TEXT,
+                lease_expires REAL,
+                error TEXT
+            );
+            CREATE TABLE IF NOT EXISTS results (
+                job_id TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                worker TEXT,
+                completed_at REAL NOT NULL
+            );
+            """
+        )
+
+    def enqueue(self, job_id: str, payload: dict[str, Any]) -> bool:
+        with self.lock:
+            cursor = self.connection.execute(
+                "INSERT OR IGNORE INTO jobs (id, payload) VALUES (?, ?)",
+                (job_id, json.dumps(payload, default=str)),
+            )
+            return cursor.rowcount == 1
+
+    def lease(self, worker_id: str, visibility_timeout: float) -> Job | None:
+        now = time.time()
+        with self.lock:
+            # IMMEDIATE takes the write lock, so two workers can't lease the same job
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                # The worker of the last attempt stopped responding
+                self.connection.execute(
+                    "UPDATE jobs SET status = 'failed', lease_id = NULL, "
+                    "error = 'The lease expired' "
+                    "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                    (now, self.max_attempts),
+                )
+                row = self.connection.execute(
+                    "SELECT id, payload, attempts FROM jobs "
+                    "WHERE status = 'queued' "
+                    "OR (status = 'leased' AND lease_expires < ?) "
+                    "ORDER BY rowid LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is None:
+                    self.connection.execute("COMMIT")
+                    return None
+                job_id, payload, attempts = row
+                lease_id = uuid.uuid4().hex
+                self.connection.execute(
+                    "UPDATE jobs SET status = 'leased', attempts = attempts + 1, "
+                    "lease_id = ?, leased_by = ?, lease_expires = ? WHERE id = ?",
+                    (lease_id, worker_id, now + visibility_timeout, job_id),
+                )
+                self.connection.execute("COMMIT")
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+        return Job(job_id, json.loads(payload), attempts + 1, lease_id, worker_id)
+
+    def extend(self, job: Job, visibility_timeout: float) -> bool:
+        with self.lock:
+            cursor = self.connection.execute(
+                "UPDATE jobs SET lease_expires = ? "
+                "WHERE id = ? AND lease_id = ? AND status = 'leased'",
+                (time.time() + visibility_timeout, job.id, job.lease_id),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job: Job, result: dict[str, Any]) -> bool:
+        """Returns False if the job already had a result, which is kept."""
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self.connection.execute(
+                    "INSERT OR IGNORE INTO results (job_id, result, worker, completed_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (job.id, json.dumps(result, default=str), job.worker_id, time.time()),
+                )
+                self.connection.execute(
+                    "UPDATE jobs SET status = 'done', lease_id = NULL WHERE id = ?",
+                    (job.id,),
+                )
+                self.connection.execute("COMMIT")
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            return cursor.rowcount == 1
+
+    def fail(self, job: Job, error: str):
+        with self.lock:
+            # Only the current lease can fail the job, not a worker whose lease expired
+            self.connection.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' "
+                "ELSE 'queued' END, lease_id = NULL, error = ? "
+                "WHERE id = ? AND lease_id = ?",
+                (self.max_attempts, error, job.id, job.lease_id),
+            )
+
+    def results(self) -> dict[str, dict[str, Any]]:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT job_id, result FROM results ORDER BY completed_at"
+            ).fetchall()
+        return {job_id: json.loads(result) for job_id, result in rows}
+
+    def failures(self) -> list[FailedJob]:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT id, payload, attempts, error FROM jobs "
+                "WHERE status = 'failed' ORDER BY rowid"
+            ).fetchall()
+        return [
+            FailedJob(job_id, json.loads(payload), attempts, error)
+            for job_id, payload, attempts, error in rows
+        ]
+
+    def status(self) -> QueueStatus:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            ).fetchall()
+        return QueueStatus(**dict(rows))
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class Worker:
+    """Runs the jobs of a broker until there are none left, or forever.
+
+    The lease of the running job is extended in the background, so a job can take
+    longer than `visibility_timeout`, as long as the worker is alive.
+    """
+
+    def __init__(
+        self,
+        broker: Broker,
+        handler: Callable[[dict[str, Any]], dict[str, Any]],
+        worker_id: str | None = None,
+        visibility_timeout: float = 300.0,
+        poll_interval: float = 5.0,
+    ):
+        self.broker = broker
+        self.handler = handler
+        self.worker_id = worker_id or default_worker_id()
+        self.visibility_timeout = visibility_timeout
+        self.poll_interval = poll_interval
+        self.completed = 0
+        self.duplicates = 0
+        self.failed = 0
+
+    def run(self, until_empty: bool = True):
+        while True:
+            job = self.broker.lease(self.worker_id, self.visibility_timeout)
+            if job is None:
+                if until_empty and self.broker.status().finished:
+                    return
+                # Other workers still hold leases that could expire
+                time.sleep(self.poll_interval)
+                continue
+            self.run_job(job)
+
+    def run_job(self, job: Job):
+        stop_heartbeat = threading.Event()
+
+        def heartbeat():
+            while not stop_heartbeat.wait(self.visibility_timeout / 3):
+                self.broker.extend(job, self.visibility_timeout)
+
+        thread = threading.Thread(target=heartbeat, daemon=True)
+        thread.start()
+        try:
+            result = self.handler(job.payload)
+        except Exception:
+            self.failed += 1
+            self.broker.fail(job, traceback.format_exc())
+            return
+        finally:
+            stop_heartbeat.set()
+            thread.join()
+        if self.broker.complete(job, result):
+            self.completed += 1
+        else:
+            self.duplicates += 1
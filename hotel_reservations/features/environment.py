@@ -1,9 +1,18 @@
+import os
 from datetime import date
+from typing import cast
 
+from behave import fixture, use_fixture
 from dotenv import load_dotenv
 
 from agents_behave.base_llm import LLMConfig
-from hotel_reservations.llms import LLM_NAMES, BaseLLM, LLMManager
+from agents_behave.cascade_llm import CascadeLLM, non_empty_response, valid_verdict
+from agents_behave.hedged_llm import HedgedLLM
+from agents_behave.profiling import profile_from_env
+from agents_behave.request_scheduler import RequestScheduler, ScheduledLLM
+from agents_behave.tracing import tracer_from_env
+from agents_behave.verdict_cache import verdict_cache_from_env
+from hotel_reservations.llms import LLM_NAMES, ROLE_PRIORITIES, BaseLLM, LLMManager
 
 load_dotenv(override=True)
 
@@ -18,10 +27,72 @@ def create_llm(name: str, llm_name: LLM_NAMES) -> BaseLLM:
     )
 
 
+def hedged(role: str, llm: BaseLLM) -> BaseLLM:
+    # Opt-in per role, e.g. HEDGE_LLM=openrouter-wizardlm2 HEDGED_ROLES=user,analyser
+    backup_llm_name = os.getenv("HEDGE_LLM")
+    if not backup_llm_name or role not in os.getenv("HEDGED_ROLES", "").split(","):
+        return llm
+    return HedgedLLM(llm, create_llm(f"{role}-backup", cast(LLM_NAMES, backup_llm_name)))
+
+
 def before_all(context):
+    # With LLM_POOL_SLOTS, the roles share that many concurrent requests to the
+    # provider, and the conversation turns go before the analyser's
+    pool_slots = os.getenv("LLM_POOL_SLOTS")
+    context.llm_pool = (
+        RequestScheduler(slots=int(pool_slots), priorities=ROLE_PRIORITIES)
+        if pool_slots
+        else None
+    )
     llm = create_llm("llama3", "groq-llama3-70")
-    context.assistant_llm = llm
-    context.user_llm = llm
-    context.analyser_llm = llm
+    # The user and the analyser try a smaller model first
+    small_llm = create_llm("llama3-8", "groq-llama3-8")
+
+    def pooled(role: str, llm: BaseLLM) -> BaseLLM:
+        return ScheduledLLM(llm, context.llm_pool, role) if context.llm_pool else llm
+
+    context.assistant_llm = hedged("assistant", pooled("assistant", llm))
+    context.cascades = {
+        "user": CascadeLLM(
+            [pooled("user", small_llm), pooled("user", llm)], accept=non_empty_response
+        ),
+        "analyser": CascadeLLM(
+            [pooled("analyser", small_llm), pooled("analyser", llm)],
+            accept=valid_verdict,
+        ),
+    }
+    context.user_llm = hedged("user", context.cascades["user"])
+    context.analyser_llm = hedged("analyser", context.cascades["analyser"])
+    # The tool calls of an agent step run concurrently with PARALLEL_TOOL_CALLS=1
+    context.parallel_tool_calls = bool(os.getenv("PARALLEL_TOOL_CALLS"))
+    # The hotels found are reused until a reservation is made with TOOL_CACHE=1
+    context.tool_cache = bool(os.getenv("TOOL_CACHE"))
     context.date = date.today()
     context.hotels = []
+    # Disabled unless TRACE_SINK is set
+    context.tracer = tracer_from_env()
+    # Disabled unless VERDICT_CACHE is set to the path of the cache's database
+    context.verdict_cache = verdict_cache_from_env()
+
+
+@fixture
+def profiled(context, name: str):
+    with profile_from_env(name):
+        yield
+
+
+def before_scenario(context, scenario):
+    # Profiles each scenario when PROFILE_DIR is set
+    use_fixture(profiled, context, scenario.name)
+
+
+def after_all(context):
+    context.tracer.close()
+    for role, cascade in context.cascades.items():
+        print(f"Cascade, {role}: {cascade.escalation_rate():.0%} escalated")
+    if context.llm_pool:
+        for role, stats in context.llm_pool.role_stats.items():
+            print(f"LLM pool, {role}: {stats}")
+    if context.verdict_cache is not None:
+        print(f"Verdict cache: {context.verdict_cache.stats}")
+        context.verdict_cache.close()
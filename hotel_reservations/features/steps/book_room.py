@@ -4,11 +4,16 @@ from unittest.mock import Mock
 import behave
 from hamcrest import assert_that, greater_than
 
+from agents_behave.cascade_llm import CascadeLLM, confident_verdict
 from agents_behave.conversation_analyser import ConversationAnalyser
 from agents_behave.conversation_runner import ConversationRunner
+from agents_behave.hedged_llm import HedgedLLM
 from agents_behave.test_user import TestUser
+from agents_behave.tracing import TracingCallbackHandler
+from agents_behave.transcript import Transcript
 from hotel_reservations.assistant import HotelReservationsAssistant
 from hotel_reservations.core import Hotel, find_hotels, make_reservation
+from hotel_reservations.tool_cache import ToolCache
 
 
 def format_date(date: str):
@@ -17,9 +22,12 @@ def format_date(date: str):
 
 @behave.given("A user with the following persona")
 def step_impl(context):  # noqa F811 # type: ignore
+    context.transcript = Transcript()
     context.llm_user = TestUser(
         llm=context.user_llm,
         persona=context.text,
+        transcript=context.transcript,
+        callbacks=[TracingCallbackHandler(context.tracer)],
     )
 
 
@@ -51,6 +59,10 @@ def step_impl(context, stop_word):  # noqa F811 # type: ignore
         make_reservation=make_reservation_mock,
         find_hotels=find_hotels_mock,
         current_date=current_date_mock,
+        transcript=context.transcript,
+        callbacks=[TracingCallbackHandler(context.tracer)],
+        parallel_tool_calls=context.parallel_tool_calls,
+        tool_cache=ToolCache() if context.tool_cache else None,
     )
     context.make_reservation_mock = make_reservation_mock
     context.find_hotels_mock = find_hotels_mock
@@ -63,6 +75,8 @@ def step_impl(context, stop_word):  # noqa F811 # type: ignore
         assistant=assistant_chat_wrapper,
         user=context.llm_user,
         stop_condition=lambda state: state.last_assistant_message_contains(stop_word),
+        transcript=context.transcript,
+        tracer=context.tracer,
     )
 
     context.conversation_state = context.conversation.start()
@@ -97,7 +111,15 @@ def step_impl(context):  # noqa F811 # type: ignore
 def step_impl(context, minimum_acceptable_score):  # noqa F811 # type: ignore
     criteria = context.text.split("\n")
     criteria = [c.strip() for c in criteria if c.strip()]
-    conversationAnalyzer = ConversationAnalyser(llm=context.analyser_llm)
+    analyser_llm = context.analyser_llm
+    # HEDGED_ROLES can put the analyser's cascade behind a hedge
+    if isinstance(analyser_llm, (CascadeLLM, HedgedLLM)):
+        analyser_llm = analyser_llm.with_accept(
+            confident_verdict(int(minimum_acceptable_score))
+        )
+    conversationAnalyzer = ConversationAnalyser(
+        llm=analyser_llm, cache=context.verdict_cache
+    )
     chat_history = context.conversation_state.chat_history
     response = conversationAnalyzer.analyse(
         chat_history=chat_history, criteria=criteria
@@ -1,3 +1,5 @@
+import asyncio
+from dataclasses import dataclass
 from datetime import date
 from typing import Any
 
@@ -6,16 +8,26 @@ from langchain.agents.format_scratchpad import format_log_to_str
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.pydantic_v1 import BaseModel, Field
 from langchain.tools.render import render_text_description_and_args
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.language_models.base import BaseLanguageModel
-from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import (
+    Runnable,
+    RunnableConfig,
+    RunnableLambda,
+    RunnablePassthrough,
+)
 from langchain_core.tools import tool
 
 from agents_behave.base_llm import BaseLLM
+from agents_behave.profiling import phase
+from agents_behave.transcript import Transcript, TranscriptView
 from hotel_reservations.core import FindHotels, MakeReservation
 from hotel_reservations.function_call_agent_output_parser import (
     FunctionCallAgentOutputParser,
+    JsonModeAgentOutputParser,
+    ParseStats,
 )
+from hotel_reservations.tool_cache import ToolCache
 
 
 class MakeReservationInput(BaseModel):
@@ -32,6 +44,24 @@ class FindHotelsInput(BaseModel):
     location: str = Field(description="The location of the hotel.", default="")
 
 
+@dataclass
+class StepStats:
+    turns: int = 0
+    steps: int = 0
+    wasted_steps: int = 0
+    """Steps that didn't run a tool because the model's output couldn't be parsed."""
+
+    def record(self, intermediate_steps: list):
+        self.turns += 1
+        self.steps += len(intermediate_steps) + 1
+        self.wasted_steps += sum(
+            1 for action, _ in intermediate_steps if action.tool == "_Exception"
+        )
+
+    def steps_per_turn(self) -> float:
+        return self.steps / self.turns if self.turns else 0.0
+
+
 class HotelReservationsAssistant:
     def __init__(
         self,
@@ -40,20 +70,44 @@ class HotelReservationsAssistant:
         find_hotels: FindHotels,
         current_date=lambda: date.today(),
         verbose=False,
+        parallel_tool_calls=False,
+        transcript: Transcript | None = None,
+        callbacks: list[BaseCallbackHandler] | None = None,
+        json_mode: bool = False,
+        tool_cache: ToolCache | None = None,
     ):
+        self.llm = llm
         self.make_reservation = make_reservation
         self.find_hotels = find_hotels
         self.current_date = current_date
         self.verbose = verbose
-
-        self.chat_history: list[BaseMessage] = []
+        self.parallel_tool_calls = parallel_tool_calls
+        self.callbacks = callbacks or []
+        # Only used by models without function calling, when their provider can
+        # constrain them to answer in JSON
+        self.json_mode = json_mode
+        # Memoizes find_hotels for this conversation, until a reservation is made
+        self.tool_cache = tool_cache
+
+        # With a shared transcript, the conversation runner adds the messages
+        self.owns_transcript = transcript is None
+        self.transcript = transcript if transcript is not None else Transcript()
+        self.output_parser_stats: ParseStats | None = None
+        self.step_stats = StepStats()
         self.agent = self.build_agent(llm)
 
+    @property
+    def chat_history(self) -> TranscriptView:
+        return self.transcript.view("assistant")
+
     def build_agent(self, llm: BaseLLM):
         tools = self.build_tools()
         agent: Any
+        json_mode_llm = llm.json_mode() if self.json_mode else None
         if llm.supports_function_calling():
             agent = self.build_agent_with_function_calling(llm.llm, tools)
+        elif json_mode_llm is not None:
+            agent = self.build_agent_with_json_mode(json_mode_llm, tools)
         else:
             agent = self.build_agent_without_function_calling(llm.llm, tools)
 
@@ -97,22 +151,92 @@ class HotelReservationsAssistant:
         )
 
         llm_with_stop = llm.bind(stop=["\nObservation"])
+        output_parser = FunctionCallAgentOutputParser.for_tools(tools)
+        self.output_parser_stats = output_parser.stats
+
+        def stream_until_action(prompt_value, config: RunnableConfig):
+            chunks = llm_with_stop.stream(prompt_value, config)
+            try:
+                return output_parser.parse_stream(str(chunk.content) for chunk in chunks)
+            finally:
+                # Stops the generation now, rather than when the stream is collected
+                chunks.close()
 
         return (
             RunnablePassthrough.assign(
                 agent_scratchpad=lambda x: format_log_to_str(x["intermediate_steps"])
             )
             | prompt
-            | llm_with_stop
-            | FunctionCallAgentOutputParser()
+            | RunnableLambda(stream_until_action)
+        )
+
+    def build_agent_with_json_mode(self, llm: Runnable, tools: list):
+        prompt = ChatPromptTemplate.from_messages(
+            [
+                ("system", SYSTEM_PROMPT_JSON_MODE),
+                MessagesPlaceholder(variable_name="chat_history"),
+            ]
+        )
+        prompt = prompt.partial(
+            tool_description_with_args=render_text_description_and_args(tools),
+            tool_names=", ".join([t.name for t in tools]),
+            current_date=self.current_date().strftime("%Y-%m-%d"),
+        )
+
+        output_parser = JsonModeAgentOutputParser.for_tools(tools)
+        self.output_parser_stats = output_parser.stats
+
+        return (
+            RunnablePassthrough.assign(
+                agent_scratchpad=lambda x: format_log_to_str(
+                    x["intermediate_steps"], llm_prefix=""
+                )
+            )
+            | prompt
+            | llm
+            | output_parser
         )
 
     def chat(self, query: str):
-        self.chat_history.append(HumanMessage(content=query))
-        response = self.agent.invoke({"chat_history": self.chat_history})
-        self.chat_history.append(AIMessage(content=response["output"]))
+        if self.owns_transcript:
+            self.transcript.append("user", query)
+        if self.tool_cache:
+            self.tool_cache.new_turn()
+        inputs = {"chat_history": self.transcript.messages("assistant")}
+        config: RunnableConfig = {"callbacks": self.callbacks}
+        if self.parallel_tool_calls:
+            # The async executor runs all the tool calls of a step concurrently,
+            # before asking the model for the next step.
+            response = asyncio.run(self.agent.ainvoke(inputs, config))
+        else:
+            response = self.agent.invoke(inputs, config)
+        self.step_stats.record(response["intermediate_steps"])
+        if self.owns_transcript:
+            self.transcript.append("assistant", response["output"])
         return response
 
+    def fork(
+        self,
+        make_reservation: MakeReservation | None = None,
+        find_hotels: FindHotels | None = None,
+        transcript: Transcript | None = None,
+    ) -> "HotelReservationsAssistant":
+        assistant = HotelReservationsAssistant(
+            llm=self.llm,
+            make_reservation=make_reservation or self.make_reservation,
+            find_hotels=find_hotels or self.find_hotels,
+            current_date=self.current_date,
+            verbose=self.verbose,
+            parallel_tool_calls=self.parallel_tool_calls,
+            transcript=transcript,
+            callbacks=self.callbacks,
+            json_mode=self.json_mode,
+            tool_cache=self.tool_cache.fork() if self.tool_cache else None,
+        )
+        if transcript is None:
+            assistant.transcript = self.transcript.fork()
+        return assistant
+
     def build_tools(self):
         @tool(args_schema=MakeReservationInput)
         def make_reservation_tool(
@@ -120,18 +244,30 @@ class HotelReservationsAssistant:
         ):
             """Useful to make an hotel reservation"""
 
-            return self.make_reservation(
-                hotel_name,
-                guest_name,
-                checkin_date,
-                checkout_date,
-                guests,
-            )
+            with phase("tool"):
+                reservation = self.make_reservation(
+                    hotel_name,
+                    guest_name,
+                    checkin_date,
+                    checkout_date,
+                    guests,
+                )
+            if self.tool_cache:
+                # The hotels' availability has changed
+                self.tool_cache.invalidate()
+            return reservation
 
         @tool(args_schema=FindHotelsInput)
         def find_hotels_tool(location: str):
             """Useful to find hotels by location."""
-            return self.find_hotels(location)
+            with phase("tool"):
+                if not self.tool_cache:
+                    return self.find_hotels(location)
+                return self.tool_cache.call(
+                    "find_hotels_tool",
+                    FindHotelsInput(location=location),
+                    lambda: self.find_hotels(location),
+                )
 
         tools: list = [make_reservation_tool, find_hotels_tool]
         return tools
@@ -183,6 +319,26 @@ If you need to ask for more information, you can ask the user for it. Do not ret
 {agent_scratchpad}
 """  # noqa E501
 
+SYSTEM_PROMPT_JSON_MODE = """You are a helpful assistant that can make room reservations.
+You should keep a conversation with the user and help them make a reservation. Ask for all the information needed to make a reservation.
+
+You have access to the following tools:
+
+{tool_description_with_args}
+
+You MUST always answer with a single JSON object with the following keys:
+- "thought": what you should do next
+- "action": the name of the tool to use, one of {tool_names}, or "Final Answer" to answer the user
+- "action_input": the input of the tool, in the right format for the tool, or your answer to the user when the action is "Final Answer"
+
+If you need more information, ask the user for it with a "Final Answer".
+After you use a tool, you get its result as an Observation.
+
+Today is {current_date}.
+
+{agent_scratchpad}
+"""  # noqa E501
+
 HUMAN_PROMPT = "Question: {input}"
 
 SCRATCHPAD_PROMPT = "{agent_scratchpad}"
@@ -0,0 +1,163 @@
+import argparse
+import statistics
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Sequence, cast
+
+from dotenv import load_dotenv
+
+from agents_behave.results_store import ResultsWriter
+from agents_behave.scenario_matrix import Scenario
+from hotel_reservations.llms import LLM_FACTORIES, LLM_NAMES
+from hotel_reservations.suite import booking_scenarios, run_booking_scenario
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def run_benchmark(
+    llm_names: Sequence[LLM_NAMES],
+    scenarios: list[Scenario],
+    repeat: int = 1,
+    max_workers: int = 8,
+    writer: ResultsWriter | None = None,
+    json_mode: bool = False,
+) -> list[dict[str, Any]]:
+    """Runs every scenario with every LLM, concurrently."""
+
+    def run(job: tuple[LLM_NAMES, Scenario]) -> dict[str, Any]:
+        llm_name, scenario = job
+        started = time.perf_counter()
+        try:
+            result = run_booking_scenario(
+                scenario, llm_name, writer=writer, json_mode=json_mode
+            )
+        except Exception:
+            # A model that errors (rate limits, bad tool calls, ...) loses the run
+            traceback.print_exc()
+            return {
+                "llm_name": llm_name,
+                "scenario_id": scenario.id,
+                "error": True,
+                "passed": False,
+                "duration_seconds": time.perf_counter() - started,
+            }
+        return {"scenario_id": scenario.id, "error": False, **result}
+
+    # Interleaved, so every model makes progress and no provider gets all the load
+    jobs = [
+        (llm_name, scenario)
+        for _ in range(repeat)
+        for scenario in scenarios
+        for llm_name in llm_names
+    ]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(run, jobs))
+
+
+def percentile(values: list[float], p: float) -> float | None:
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[round(p) - 1]
+
+
+def leaderboard(runs: list[dict[str, Any]]) -> "pd.DataFrame":
+    import pandas as pd
+
+    rows = []
+    for llm_name in dict.fromkeys(run["llm_name"] for run in runs):
+        model_runs = [run for run in runs if run["llm_name"] == llm_name]
+        completed = [run for run in model_runs if not run["error"]]
+        passed = [run for run in completed if run["passed"]]
+        latencies = [
+            seconds for run in completed for seconds in run["assistant_turn_seconds"]
+        ]
+        tokens = sum(run["tokens"] for run in completed)
+        duration = sum(run["duration_seconds"] for run in completed)
+        rows.append(
+            {
+                "llm_name": llm_name,
+                "runs": len(model_runs),
+                "errors": len(model_runs) - len(completed),
+                "pass_rate": len(passed) / len(model_runs),
+                "score": mean([run["score"] for run in completed]),
+                "turns_to_completion": mean([run["iterations"] for run in passed]),
+                "tokens": mean([run["tokens"] for run in completed]),
+                "steps_per_turn": mean([run["steps_per_turn"] for run in completed]),
+                "wasted_steps": mean([run["wasted_steps"] for run in completed]),
+                "p50_turn_seconds": percentile(latencies, 50),
+                "p95_turn_seconds": percentile(latencies, 95),
+                "tokens_per_second": tokens / duration if duration else None,
+            }
+        )
+    columns = ["pass_rate", "p50_turn_seconds"]
+    return (
+        pd.DataFrame(rows)
+        .sort_values(columns, ascending=[False, True])
+        .reset_index(drop=True)
+    )
+
+
+def mean(values: list[float]) -> float | None:
+    return statistics.fmean(values) if values else None
+
+
+def main():
+    load_dotenv(override=True)
+
+    parser = argparse.ArgumentParser(
+        description="Run the booking scenarios with several LLMs and rank them"
+    )
+    parser.add_argument(
+        "--llm",
+        nargs="+",
+        # Only the LLMs that have a factory, e.g. not together-mixtral
+        choices=list(LLM_FACTORIES),
+        default=list(LLM_FACTORIES),
+    )
+    parser.add_argument(
+        "--scenarios",
+        type=int,
+        help="Only run this many scenarios of the booking matrix",
+    )
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument(
+        "--json-mode",
+        action="store_true",
+        help="Constrain the assistants without function calling to answer in JSON",
+    )
+    parser.add_argument("--output", help="Also write the leaderboard to a CSV file")
+    parser.add_argument(
+        "--results-store",
+        help="Directory of a Parquet dataset where every conversation is written",
+    )
+    args = parser.parse_args()
+
+    # The matrix is in a fixed order, so the subset is the same for every model
+    scenarios = booking_scenarios()[: args.scenarios]
+    writer = ResultsWriter(args.results_store) if args.results_store else None
+    try:
+        runs = run_benchmark(
+            cast(list[LLM_NAMES], args.llm),
+            scenarios,
+            repeat=args.repeat,
+            max_workers=args.workers,
+            writer=writer,
+            json_mode=args.json_mode,
+        )
+    finally:
+        if writer:
+            writer.close()
+
+    board = leaderboard(runs)
+    print(board.to_string(index=False, float_format="{:.2f}".format))
+    if args.output:
+        board.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import argparse
+import json
+import os
+import time
+from typing import Any, Sequence, cast
+
+from dotenv import load_dotenv
+
+from agents_behave.scenario_matrix import Scenario
+from agents_behave.work_queue import Broker, FailedJob, SQLiteBroker, Worker
+from hotel_reservations.benchmark import leaderboard
+from hotel_reservations.llms import LLM_FACTORIES, LLM_NAMES
+from hotel_reservations.suite import booking_scenarios, run_booking_scenario
+
+
+def job_id(scenario: Scenario, llm_name: str, run: int) -> str:
+    return f"{scenario.id}/{llm_name}/{run}"
+
+
+def enqueue_booking_jobs(
+    broker: Broker,
+    scenarios: list[Scenario],
+    llm_names: Sequence[LLM_NAMES],
+    repeat: int = 1,
+) -> int:
+    """Enqueues every scenario with every LLM, skipping the jobs already enqueued."""
+    return sum(
+        broker.enqueue(
+            job_id(scenario, llm_name, run),
+            {"scenario_id": scenario.id, "llm_name": llm_name, "run": run},
+        )
+        for run in range(repeat)
+        for scenario in scenarios
+        for llm_name in llm_names
+    )
+
+
+def booking_job_handler(json_mode: bool = False):
+    scenarios = {scenario.id: scenario for scenario in booking_scenarios()}
+
+    def handle(payload: dict[str, Any]) -> dict[str, Any]:
+        scenario = scenarios[payload["scenario_id"]]
+        result = run_booking_scenario(
+            scenario, payload["llm_name"], json_mode=json_mode
+        )
+        return {"scenario_id": scenario.id, "run": payload["run"], **result}
+
+    return handle
+
+
+def wait_for_jobs(broker: Broker, poll_interval: float = 10.0):
+    while True:
+        status = broker.status()
+        print(
+            f"{status.done} done, {status.leased} running, {status.queued} queued, "
+            f"{status.failed} failed"
+        )
+        if status.finished:
+            return
+        time.sleep(poll_interval)
+
+
+def write_results(
+    results: dict[str, dict[str, Any]], failures: list[FailedJob], path: str
+) -> list[dict[str, Any]]:
+    # Rewritten from the queue every time, which has a single result per job
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    runs = [{"job_id": job, "error": False, **result} for job, result in results.items()]
+    # A model that keeps erroring loses the run, as in the benchmark
+    runs += [
+        {"job_id": job.id, **job.payload, "error": True, "passed": False}
+        for job in failures
+    ]
+    with open(path, "w") as f:
+        for run in runs:
+            f.write(json.dumps(run, default=str) + "\n")
+    return runs
+
+
+def main():
+    load_dotenv(override=True)
+
+    parser = argparse.ArgumentParser(
+        description="Run the booking scenarios on several machines, through a queue"
+    )
+    parser.add_argument(
+        "--queue",
+        default="results/queue.db",
+        help="The SQLite database of the queue, on a local disk or a filesystem whose "
+        "locks work across machines (not NFS or SMB)",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="Add the jobs of a run to the queue")
+    # Only the LLMs that have a factory, e.g. not together-mixtral
+    enqueue.add_argument("--llm", nargs="+", choices=list(LLM_FACTORIES), required=True)
+    enqueue.add_argument("--scenarios", type=int)
+    enqueue.add_argument("--repeat", type=int, default=1)
+
+    worker = commands.add_parser("worker", help="Run jobs until the queue is empty")
+    worker.add_argument("--json-mode", action="store_true")
+    worker.add_argument(
+        "--visibility-timeout",
+        type=float,
+        default=300.0,
+        help="Seconds after which the job of a worker that stopped responding is "
+        "given to another worker",
+    )
+    worker.add_argument(
+        "--forever", action="store_true", help="Keep waiting for new jobs"
+    )
+
+    collect = commands.add_parser(
+        "collect", help="Wait for the jobs to finish and rank the LLMs"
+    )
+    collect.add_argument("--results", default="results/distributed.jsonl")
+    args = parser.parse_args()
+
+    broker = SQLiteBroker(args.queue)
+    try:
+        if args.command == "enqueue":
+            scenarios = booking_scenarios()[: args.scenarios]
+            added = enqueue_booking_jobs(
+                broker, scenarios, cast(list[LLM_NAMES], args.llm), args.repeat
+            )
+            print(f"Enqueued {added} jobs")
+        elif args.command == "worker":
+            queue_worker = Worker(
+                broker,
+                booking_job_handler(args.json_mode),
+                visibility_timeout=args.visibility_timeout,
+            )
+            queue_worker.run(until_empty=not args.forever)
+            print(
+                f"{queue_worker.worker_id}: {queue_worker.completed} completed, "
+                f"{queue_worker.failed} failed, {queue_worker.duplicates} duplicates"
+            )
+        else:
+            wait_for_jobs(broker)
+            failures = broker.failures()
+            for job in failures:
+                error = (job.error or "").strip().splitlines()
+                print(f"{job.id} failed {job.attempts} times: {error[-1] if error else ''}")
+            runs = write_results(broker.results(), failures, args.results)
+            if runs:
+                board = leaderboard(runs)
+                print(board.to_string(index=False, float_format="{:.2f}".format))
+    finally:
+        broker.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,224 @@
 import json
-import re
-from typing import Union
+from collections import Counter
+from typing import Any, Iterable, Union
 
 from langchain.agents.agent import AgentOutputParser
 from langchain.agents.chat.prompt import FORMAT_INSTRUCTIONS
+from langchain.pydantic_v1 import Field, ValidationError
 from langchain_core.agents import AgentAction, AgentFinish
 from langchain_core.exceptions import OutputParserException
+from langchain_core.tools import BaseTool
+
+from agents_behave.json_extraction import loads_tolerant
 
 FINAL_ANSWER_ACTION = "Final Answer:"
+FINAL_ANSWER = "Final Answer"
+FENCE = "```"
+
+
+class FencedBlockExtractor:
+    """Finds the first fenced block in a text that arrives in chunks.
+
+    Each chunk is scanned once, keeping only the last characters of the previous
+    chunk in case a fence is split between two chunks.
+    """
+
+    def __init__(self):
+        self.chunks: list[str] = []
+        self.block_parts: list[str] = []
+        self.carry = ""
+        self.in_block = False
+        self.complete = False
+
+    @property
+    def text(self) -> str:
+        return "".join(self.chunks)
+
+    @property
+    def block(self) -> str | None:
+        if not self.complete:
+            return None
+        block = "".join(self.block_parts)
+        return block.removeprefix("json").strip()
+
+    def feed(self, chunk: str) -> bool:
+        self.chunks.append(chunk)
+        if not self.complete:
+            self.scan(chunk)
+        return self.complete
+
+    def scan(self, chunk: str):
+        window = self.carry + chunk
+        index = window.find(FENCE)
+        if index == -1:
+            split = max(len(window) - (len(FENCE) - 1), 0)
+            if self.in_block:
+                self.block_parts.append(window[:split])
+            self.carry = window[split:]
+            return
+
+        self.carry = ""
+        if self.in_block:
+            self.block_parts.append(window[:index])
+            self.complete = True
+        else:
+            self.in_block = True
+            self.scan(window[index + len(FENCE):])
+
+
+def looks_like_tool_call(block: str) -> bool:
+    return block.startswith("{") and '"action' in block
+
+
+class ParseStats:
+    def __init__(self):
+        self.counts: Counter[str] = Counter()
+
+    def record(self, outcome: str):
+        self.counts[outcome] += 1
+
+    def failures(self) -> int:
+        return sum(
+            count
+            for outcome, count in self.counts.items()
+            if outcome not in ("action", "final_answer")
+        )
+
+
+class ToolCallParseError(OutputParserException):
+    def __init__(self, kind: str, reason: str, llm_output: str):
+        super().__init__(
+            f"{kind}: {reason}",
+            observation=f"Could not use the tool: {reason}",
+            llm_output=llm_output,
+            send_to_llm=True,
+        )
+        self.kind = kind
 
 
 class FunctionCallAgentOutputParser(AgentOutputParser):
-    pattern = re.compile(r"^.*?`{3}(?:json)?\n?(.*?)`{3}.*?$", re.DOTALL)
-    """Regex pattern to parse the output."""
+    args_schemas: dict[str, Any] = {}
+    """The args_schema of each tool, by tool name. Actions are not validated if empty."""
+    stats: ParseStats = Field(default_factory=ParseStats)
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @classmethod
+    def for_tools(cls, tools: list[BaseTool]) -> "FunctionCallAgentOutputParser":
+        return cls(args_schemas={t.name: t.args_schema for t in tools})
 
     def get_format_instructions(self) -> str:
         return FORMAT_INSTRUCTIONS
 
     def parse(self, text: str) -> Union[AgentAction, AgentFinish]:
+        extractor = FencedBlockExtractor()
+        extractor.feed(text)
+        return self.parse_extracted(extractor)
+
+    def parse_stream(self, chunks: Iterable[str]) -> Union[AgentAction, AgentFinish]:
+        # Stops consuming the stream, and so the generation, as soon as the
+        # first fenced block is complete.
+        extractor = FencedBlockExtractor()
+        for chunk in chunks:
+            if extractor.feed(chunk):
+                break
+        close = getattr(chunks, "close", None)
+        if close:
+            close()
+        return self.parse_extracted(extractor)
+
+    def parse_extracted(
+        self, extractor: FencedBlockExtractor
+    ) -> Union[AgentAction, AgentFinish]:
+        text = extractor.text
         includes_answer = FINAL_ANSWER_ACTION in text
+        block = extractor.block
+        # Other fenced blocks (code, a table, ...) are part of a final answer
+        if block is None or not looks_like_tool_call(block):
+            return self.finish(text)
+
+        try:
+            response = json.loads(block)
+        except json.JSONDecodeError as e:
+            if includes_answer:
+                return self.finish(text)
+            raise self.failure("invalid_json", f"the action is not valid JSON ({e})", text)
+
+        if not isinstance(response, dict) or "action" not in response:
+            if includes_answer:
+                return self.finish(text)
+            raise self.failure("missing_action", "the JSON blob has no `action` key", text)
+        if includes_answer:
+            raise self.failure(
+                "action_and_final_answer",
+                "the output has both a final answer and an action",
+                text,
+            )
+
+        tool_name = response["action"]
+        tool_input = response.get("action_input", {})
+        self.validate(tool_name, tool_input, text)
+        self.stats.record("action")
+        return AgentAction(tool_name, tool_input, text)
+
+    def validate(self, tool_name: str, tool_input: Any, text: str):
+        if not self.args_schemas:
+            return
+        if tool_name not in self.args_schemas:
+            raise self.failure(
+                "unknown_tool",
+                f"`{tool_name}` is not one of {', '.join(self.args_schemas)}",
+                text,
+            )
+        args_schema = self.args_schemas[tool_name]
+        if args_schema is None or not isinstance(tool_input, dict):
+            return
         try:
-            found = self.pattern.search(text)
-            if not found:
-                # Fast fail to parse Final Answer.
-                raise ValueError("action not found")
-            action = found.group(1)
-            response = json.loads(action.strip())
-            includes_action = "action" in response
-            if includes_answer and includes_action:
-                raise OutputParserException(
-                    "Parsing LLM output produced a final answer "
-                    f"and a parse-able action: {text}"
-                )
-            return AgentAction(
-                response["action"], response.get("action_input", {}), text
+            args_schema.parse_obj(tool_input)
+        except ValidationError as e:
+            raise self.failure(
+                "invalid_arguments", f"invalid input for `{tool_name}`: {e}", text
             )
 
-        except Exception:
-            # if not includes_answer:
-            #     raise OutputParserException(f"Could not parse LLM output: {text}")
-            output = text.split(FINAL_ANSWER_ACTION)[-1].strip()
+    def finish(self, text: str) -> AgentFinish:
+        self.stats.record("final_answer")
+        output = text.split(FINAL_ANSWER_ACTION)[-1].strip()
+        return AgentFinish({"output": output}, text)
+
+    def failure(self, kind: str, reason: str, text: str) -> ToolCallParseError:
+        self.stats.record(kind)
+        return ToolCallParseError(kind, reason, text)
+
+
+class JsonModeAgentOutputParser(FunctionCallAgentOutputParser):
+    """Parses the JSON object of a model that is constrained to answer in JSON.
+
+    The object has an `action`, either a tool name or "Final Answer", and its
+    `action_input`. A constrained model can still pick a wrong tool or give
+    invalid arguments, those are reported like in the text format.
+    """
+
+    def parse(self, text: str) -> Union[AgentAction, AgentFinish]:
+        try:
+            response = loads_tolerant(text)
+        except json.JSONDecodeError as e:
+            raise self.failure("invalid_json", f"the answer is not valid JSON ({e})", text)
+        if not isinstance(response, dict) or "action" not in response:
+            raise self.failure("missing_action", "the JSON object has no `action` key", text)
+
+        tool_name = response["action"]
+        if tool_name == FINAL_ANSWER:
+            self.stats.record("final_answer")
+            output = response.get("action_input", "")
+            if not isinstance(output, str):
+                output = json.dumps(output)
             return AgentFinish({"output": output}, text)
+        tool_input = response.get("action_input", {})
+        self.validate(tool_name, tool_input, text)
+        self.stats.record("action")
+        return AgentAction(tool_name, tool_input, text)
+
+    def parse_stream(self, chunks: Iterable[str]) -> Union[AgentAction, AgentFinish]:
+        # The object is only complete at the end of the answer
+        return self.parse("".join(chunks))
@@ -1,11 +1,12 @@
 import os
-from typing import Literal, Optional
+from importlib.metadata import entry_points
+from typing import TYPE_CHECKING, Callable, Literal
 
-from langchain_community.chat_models import ChatOllama
-from langchain_groq import ChatGroq
-from langchain_openai import ChatOpenAI
+from agents_behave.base_llm import BaseLLM, LLMConfig, ModelPrice
 
-from agents_behave.base_llm import BaseLLM, LLMConfig
+if TYPE_CHECKING:
+    # The scheduler's chat model imports LangChain, only needed for local models
+    from agents_behave.request_scheduler import RequestScheduler
 
 LLM_NAMES = Literal[
     "openai-gpt-4o",
@@ -20,6 +21,15 @@ LLM_NAMES = Literal[
     "fireworks-firefunctions",
 ]
 
+LLMFactory = Callable[[LLMConfig], BaseLLM]
+
+# The response format of the OpenAI compatible APIs that only generates valid JSON
+JSON_OBJECT = {"type": "json_object"}
+
+# Other packages can provide LLMs by exposing an LLMFactory under this entry point
+# group, named after the LLM.
+LLM_ENTRY_POINT_GROUP = "hotel_reservations.llms"
+
 
 def create_llm(name: str, llm_name: LLM_NAMES) -> BaseLLM:
     return LLMManager.create_llm(
@@ -36,6 +46,8 @@ class OpenAILLM(BaseLLM):
         self,
         llm_config: LLMConfig,
     ):
+        from langchain_openai import ChatOpenAI
+
         llm_config = LLMConfig(model="gpt-3.5-turbo") | llm_config
         llm = ChatOpenAI(
             model=llm_config.model or "",
@@ -44,12 +56,17 @@ class OpenAILLM(BaseLLM):
 
         super().__init__(llm_config, llm)
 
+    def json_mode(self):
+        return self.llm.bind(response_format=JSON_OBJECT)
+
 
 class GroqLLM(BaseLLM):
     def __init__(
         self,
         llm_config: LLMConfig,
     ):
+        from langchain_groq import ChatGroq
+
         llm_config = LLMConfig(model="llama3-70b-8192") | llm_config
         llm = ChatGroq(
             model=llm_config.model or "",
@@ -58,37 +75,83 @@ class GroqLLM(BaseLLM):
 
         super().__init__(llm_config, llm)
 
+    def json_mode(self):
+        return self.llm.bind(response_format=JSON_OBJECT)
+
 
 class OllamaLLM(BaseLLM):
     def __init__(
         self,
         llm_config: LLMConfig,
     ):
-        llm_config = LLMConfig(model="llama3") | llm_config
+        from langchain_community.chat_models import ChatOllama
+
+        from agents_behave.request_scheduler import ScheduledChatModel
+
+        llm_config = LLMConfig(model="llama3", base_url=OLLAMA_BASE_URL) | llm_config
         llm = ChatOllama(
             model=llm_config.model or "",
+            base_url=llm_config.base_url or OLLAMA_BASE_URL,
             temperature=0.0,
         )
+        self.scheduler = ollama_scheduler(llm.base_url, llm.model)
 
-        super().__init__(llm_config, llm)
+        super().__init__(
+            llm_config,
+            ScheduledChatModel(
+                model=llm, scheduler=self.scheduler, role=role_of(llm_config.name)
+            ),
+        )
 
+    def json_mode(self):
+        return self.llm.bind(format="json")
 
-class ChatOpenRouter(ChatOpenAI):
-    def __init__(
-        self,
-        model: str,
-        openai_api_key: Optional[str] = None,
-        openai_api_base: str = "https://openrouter.ai/api/v1",
-        **kwargs,
-    ):
-        openai_api_key = openai_api_key or os.getenv("OPENROUTER_API_KEY")
-        super().__init__(
-            openai_api_base=openai_api_base,  # type: ignore
-            openai_api_key=openai_api_key,  # type: ignore
-            model_name=model,  # type: ignore
-            # streaming=False,
-            **kwargs,
+
+OLLAMA_BASE_URL = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+# Same variable as the Ollama server, to match the number of requests it generates
+# in parallel
+OLLAMA_NUM_PARALLEL = int(os.getenv("OLLAMA_NUM_PARALLEL", "1"))
+
+# The turns of the conversations go before the analysis of finished ones
+ROLE_PRIORITIES = {"assistant": 0, "user": 0, "analyser": 1}
+
+
+def role_of(name: str | None) -> str:
+    # From the names the LLMs are created with, e.g. "Assistant" or
+    # "ConversationAnalyser"
+    name = (name or "default").lower()
+    return "analyser" if "analyser" in name else name
+
+
+_ollama_schedulers: dict[tuple[str, str], "RequestScheduler"] = {}
+
+
+def ollama_scheduler(base_url: str, model: str) -> "RequestScheduler":
+    # All the conversations share the server's slots, whatever their role
+    key = (base_url, model)
+    if key not in _ollama_schedulers:
+        from agents_behave.request_scheduler import RequestScheduler
+
+        def keep_alive():
+            import httpx
+
+            # A request without a prompt loads the model and resets its keep alive
+            httpx.post(
+                f"{base_url}/api/generate",
+                json={"model": model, "keep_alive": "5m"},
+                timeout=60,
+            )
+
+        _ollama_schedulers[key] = RequestScheduler(
+            slots=OLLAMA_NUM_PARALLEL,
+            keep_alive=keep_alive,
+            priorities=ROLE_PRIORITIES,
         )
+    return _ollama_schedulers[key]
+
+
+def local_schedulers() -> dict[tuple[str, str], "RequestScheduler"]:
+    return dict(_ollama_schedulers)
 
 
 class BaseChatOpenAI(BaseLLM):
@@ -96,6 +159,8 @@ class BaseChatOpenAI(BaseLLM):
         self,
         llm_config: LLMConfig,
     ):
+        from langchain_openai import ChatOpenAI
+
         llm = ChatOpenAI(
             model=llm_config.model or "",
             temperature=0.0,
@@ -104,6 +169,9 @@ class BaseChatOpenAI(BaseLLM):
         )
         super().__init__(llm_config, llm=llm)
 
+    def json_mode(self):
+        return self.llm.bind(response_format=JSON_OBJECT)
+
 
 class OpenRouterLLM(BaseChatOpenAI):
     def __init__(
@@ -137,53 +205,79 @@ class FireworksLLM(BaseChatOpenAI):
         super().__init__(llm_config)
 
 
+LLM_FACTORIES: dict[str, LLMFactory] = {
+    "openai-gpt-3.5": lambda llm_config: OpenAILLM(
+        llm_config.with_model("gpt-3.5-turbo").has_function_calling_support()
+    ),
+    "openai-gpt-4": lambda llm_config: OpenAILLM(
+        llm_config.with_model("gpt-4-turbo-preview").has_function_calling_support()
+    ),
+    "openai-gpt-4o": lambda llm_config: OpenAILLM(
+        llm_config.with_model("gpt-4o").has_function_calling_support()
+    ),
+    "groq-llama3-70": lambda llm_config: GroqLLM(
+        llm_config.with_model("llama3-70b-8192").has_function_calling_support()
+    ),
+    "groq-llama3-8": lambda llm_config: GroqLLM(
+        llm_config.with_model("llama3-8b-8192").has_function_calling_support()
+    ),
+    "ollama-llama3-8": lambda llm_config: OllamaLLM(llm_config.with_model("llama3")),
+    "openrouter-mixtral": lambda llm_config: OpenRouterLLM(
+        llm_config.with_model("mistralai/mixtral-8x7b-instruct")
+    ),
+    "openrouter-wizardlm2": lambda llm_config: OpenRouterLLM(
+        llm_config.with_model("microsoft/wizardlm-2-8x22b").has_function_calling_support()
+    ),
+    "fireworks-firefunctions": lambda llm_config: FireworksLLM(
+        llm_config.with_model(
+            "accounts/fireworks/models/firefunction-v1"
+        ).has_function_calling_support()
+    ),
+}
+
+# List prices in dollars per million tokens, to estimate the cost of a run. Local
+# models (Ollama) are free.
+MODEL_PRICES = {
+    "gpt-3.5-turbo": ModelPrice(prompt=0.5, completion=1.5),
+    "gpt-4-turbo-preview": ModelPrice(prompt=10.0, completion=30.0),
+    "gpt-4o": ModelPrice(prompt=5.0, completion=15.0),
+    "llama3-70b-8192": ModelPrice(prompt=0.59, completion=0.79),
+    "llama3-8b-8192": ModelPrice(prompt=0.05, completion=0.08),
+    "mistralai/mixtral-8x7b-instruct": ModelPrice(prompt=0.24, completion=0.24),
+    "microsoft/wizardlm-2-8x22b": ModelPrice(prompt=0.65, completion=0.65),
+    "accounts/fireworks/models/firefunction-v1": ModelPrice(prompt=0.5, completion=0.5),
+}
+
+
 class LLMManager:
+    @staticmethod
+    def register_llm(llm_name: str, factory: LLMFactory):
+        LLM_FACTORIES[llm_name] = factory
+
+    @staticmethod
+    def get_factory(llm_name: str) -> LLMFactory | None:
+        if llm_name not in LLM_FACTORIES:
+            # Plugins are only imported when one of their LLMs is requested
+            for entry_point in entry_points(group=LLM_ENTRY_POINT_GROUP, name=llm_name):
+                LLM_FACTORIES[llm_name] = entry_point.load()
+        return LLM_FACTORIES.get(llm_name)
+
     @staticmethod
     def create_llm(
         llm_name: LLM_NAMES, llm_config: LLMConfig = LLMConfig.default()
     ) -> BaseLLM:
         llm_config = llm_config.with_llm_name(llm_name)
-        if llm_name == "openai-gpt-3.5":
-            return OpenAILLM(
-                llm_config.with_model("gpt-3.5-turbo").has_function_calling_support()
-            )
-        elif llm_name == "openai-gpt-4":
-            return OpenAILLM(
-                llm_config.with_model(
-                    "gpt-4-turbo-preview"
-                ).has_function_calling_support()
-            )
-        elif llm_name == "openai-gpt-4o":
-            return OpenAILLM(
-                llm_config.with_model(
-                    "gpt-4o"
-                ).has_function_calling_support()
-            )
-        elif llm_name == "groq-llama3-70":
-            return GroqLLM(
-                llm_config.with_model("llama3-70b-8192").has_function_calling_support()
+        factory = LLMManager.get_factory(llm_name)
+        if factory is None:
+            raise ValueError(
+                f"Unknown LLM type: {llm_name} (Available: {', '.join(LLM_FACTORIES)})"
             )
-        elif llm_name == "groq-llama3-8":
-            return GroqLLM(
-                llm_config.with_model("llama3-8b-8192").has_function_calling_support()
-            )
-        elif llm_name == "ollama-llama3-8":
-            return OllamaLLM(llm_config.with_model("llama3"))
-        elif llm_name == "openrouter-mixtral":
-            return OpenRouterLLM(
-                llm_config.with_model("mistralai/mixtral-8x7b-instruct")
-            )
-        elif llm_name == "openrouter-wizardlm2":
-            return OpenRouterLLM(
-                llm_config.with_model(
-                    "microsoft/wizardlm-2-8x22b"
-                ).has_function_calling_support()
-            )
-        elif llm_name == "fireworks-firefunctions":
-            return FireworksLLM(
-                llm_config.with_model(
-                    "accounts/fireworks/models/firefunction-v1"
-                ).has_function_calling_support()
-            )
-        else:
-            raise ValueError(f"Unknown LLM type: {llm_name} (Available: {LLM_NAMES})")
+        llm = factory(llm_config)
+        # PROMPT_GUARD=warn logs the prompts close to the model's context window,
+        # PROMPT_GUARD=trim also drops their oldest messages
+        guard = os.getenv("PROMPT_GUARD")
+        if guard:
+            from agents_behave.token_estimator import GuardedLLM
+
+            return GuardedLLM(llm, trim=guard == "trim")
+        return llm
@@ -0,0 +1,637 @@
+import argparse
+import logging
+import os
+import time
+from dataclasses import asdict
+from datetime import date
+from typing import Any, cast
+from unittest.mock import Mock
+
+from dotenv import load_dotenv
+
+from agents_behave.base_llm import BaseLLM, LLMConfig
+from agents_behave.budget import Budget, BudgetedLLM, BudgetExceeded, BudgetGovernor
+from agents_behave.cascade_llm import (
+    AnsweredBy,
+    CascadeLLM,
+    confident_verdict,
+    non_empty_response,
+)
+from agents_behave.checkpoint import CheckpointLog
+from agents_behave.conversation_analyser import ConversationAnalyser
+from agents_behave.conversation_runner import (
+    ConversationRunner,
+    ConversationRunnerState,
+)
+from agents_behave.flakiness import SequentialPassRateTest
+from agents_behave.replay import (
+    LLMRecorder,
+    Recording,
+    ReplayDivergedError,
+    ReplayLLM,
+    ReplayUser,
+    check_replay,
+    recorded_mock_calls,
+)
+from agents_behave.results_store import ResultsWriter
+from agents_behave.scenario_matrix import (
+    Scenario,
+    ScenarioResults,
+    expand_matrix,
+    run_scenarios,
+    shard,
+)
+from agents_behave.scenario_scheduler import DurationHistory, ScenarioScheduler
+from agents_behave.test_user import TestUser, User
+from agents_behave.token_estimator import all_estimate_stats
+from agents_behave.token_usage import TokenUsageHandler
+from agents_behave.tracing import Tracer, TracingCallbackHandler, tracer_from_env
+from agents_behave.transcript import Transcript
+from agents_behave.verdict_cache import VerdictCache
+from hotel_reservations.assistant import HotelReservationsAssistant
+from hotel_reservations.core import Hotel, find_hotels, make_reservation
+from hotel_reservations.llms import (
+    LLM_NAMES,
+    MODEL_PRICES,
+    LLMManager,
+    local_schedulers,
+)
+from hotel_reservations.tool_cache import ToolCache
+
+logger = logging.getLogger(__name__)
+
+PERSONA_TEMPLATE = """
+    My name is {guest_name}. {temperament}
+    I want to book a room in an hotel in {location}, starting in {stay[checkin_date]} and ending in {stay[checkout_date]}.
+    It will be for {guests} guests.
+    My budget is ${budget} per night.
+"""  # noqa E501
+
+HOTELS = {
+    "London": [
+        Hotel("123", "Kensington Hotel", "London", 300),
+        Hotel("789", "Notting Hill Hotel", "London", 400),
+    ],
+    "Paris": [
+        Hotel("456", "Relais Hotel", "Paris", 700),
+        Hotel("654", "Amiral Hotel", "Paris", 800),
+    ],
+}
+
+DIMENSIONS = {
+    "guest_name": ["John Smith"],
+    "temperament": [
+        "I'm happy to answer any question.",
+        "I don't like answering questions and I'm very rude.",
+    ],
+    "location": list(HOTELS),
+    "stay": [
+        {"checkin_date": "2024-02-09", "checkout_date": "2024-02-11"},
+        {"checkin_date": "2024-03-01", "checkout_date": "2024-03-05"},
+    ],
+    "guests": [1, 3],
+    "budget": [350, 750],
+}
+
+CRITERIA = [
+    "Get the price per night for the reservation and ask the user if it is ok",
+    "Ask for all the information needed to make a reservation",
+    "Be very polite and helpful",
+    "There is no need to ask the user for anything else, like contact information, payment method, etc.",  # noqa E501
+]
+
+MINIMUM_ACCEPTABLE_SCORE = 6
+MAX_ITERATIONS = 10
+ROLES = ("assistant", "user", "analyser")
+# The roles that try a smaller model first, with --small-llm
+CASCADE_ACCEPTS = {
+    "user": non_empty_response,
+    "analyser": confident_verdict(MINIMUM_ACCEPTABLE_SCORE),
+}
+# Shared by all the conversations, to report the escalation rate of each role
+CASCADE_ANSWERS = {role: AnsweredBy() for role in CASCADE_ACCEPTS}
+
+
+def booking_scenarios() -> list[Scenario]:
+    return expand_matrix(PERSONA_TEMPLATE, DIMENSIONS)
+
+
+def expected_hotel(parameters: dict[str, Any]) -> Hotel | None:
+    affordable = [
+        hotel
+        for hotel in HOTELS[parameters["location"]]
+        if hotel.price_per_night <= parameters["budget"]
+    ]
+    return min(affordable, key=lambda h: h.price_per_night, default=None)
+
+
+def create_llm(name: str, llm_name: LLM_NAMES) -> BaseLLM:
+    return LLMManager.create_llm(
+        llm_name=llm_name,
+        llm_config=LLMConfig(
+            name=name,
+            temperature=0.0,
+        ),
+    )
+
+
+def passes(assertion) -> bool:
+    try:
+        assertion()
+        return True
+    except AssertionError:
+        return False
+
+
+def run_booking_scenario(
+    scenario: Scenario,
+    llm_name: LLM_NAMES,
+    checkpoint_dir: str | None = None,
+    writer: ResultsWriter | None = None,
+    tracer: Tracer | None = None,
+    json_mode: bool = False,
+    parallel_tool_calls: bool = False,
+    tool_cache: bool = False,
+    record_dir: str | None = None,
+    replay: Recording | None = None,
+    verdict_cache: VerdictCache | None = None,
+    governor: BudgetGovernor | None = None,
+    cheaper_llm_name: LLM_NAMES | None = None,
+    small_llm_name: LLM_NAMES | None = None,
+) -> dict[str, Any]:
+    """Runs a booking conversation and analyses it.
+
+    With `record_dir`, the answers of the LLMs and the steps of the assistant are
+    recorded. With a `replay`, the recorded answers are used instead of calling the
+    LLMs, and ReplayDivergedError is raised if the code does something else.
+    With a `governor`, the LLMs are budgeted, falling back to `cheaper_llm_name`
+    when the budget runs low. With `tool_cache`, the results of find_hotels are
+    reused until a reservation is made. With `small_llm_name`, the user and the
+    analyser try that LLM first, and escalate the answers it gets wrong.
+    """
+    started = time.perf_counter()
+    parameters = scenario.parameters
+    location = parameters["location"]
+    make_reservation_mock = Mock(make_reservation, return_value=True)
+    find_hotels_mock = Mock(find_hotels, return_value=HOTELS[location])
+    mocks = {"make_reservation": make_reservation_mock, "find_hotels": find_hotels_mock}
+    transcript = Transcript()
+    token_usage = {role: TokenUsageHandler() for role in ROLES}
+    recorders = {role: LLMRecorder() for role in ROLES} if record_dir else {}
+    tracer = tracer if tracer is not None else Tracer()
+    replay_llms: dict[str, ReplayLLM] = {}
+
+    def llm_for(role: str, name: str) -> BaseLLM:
+        if replay is not None:
+            replay_llms[role] = replay.replay_llm(
+                role, replay.settings["supports_function_calling"][role]
+            )
+            return replay_llms[role]
+        llm = create_llm(name, llm_name)
+        if small_llm_name and role in CASCADE_ACCEPTS:
+            # Budgeted at the price of the bigger model
+            llm = CascadeLLM(
+                [create_llm(f"{name}-small", small_llm_name), llm],
+                accept=CASCADE_ACCEPTS[role],
+                answered_by=CASCADE_ANSWERS[role],
+            )
+        if governor is None:
+            return llm
+        cheaper_llm = (
+            create_llm(f"{name}-cheaper", cheaper_llm_name) if cheaper_llm_name else None
+        )
+        return BudgetedLLM(llm, governor, cheaper_llm)
+
+    def callbacks_for(role: str, tracing: bool = True) -> list:
+        callbacks: list = [token_usage[role]]
+        if tracing:
+            callbacks.append(TracingCallbackHandler(tracer))
+        if role in recorders:
+            callbacks.append(recorders[role])
+        return callbacks
+
+    assistant_llm = llm_for("assistant", "Assistant")
+    if replay is not None:
+        json_mode = replay.settings["json_mode"]
+        tool_cache = replay.settings.get("tool_cache", False)
+    assistant = HotelReservationsAssistant(
+        llm=assistant_llm,
+        make_reservation=make_reservation_mock,
+        find_hotels=find_hotels_mock,
+        transcript=transcript,
+        callbacks=callbacks_for("assistant"),
+        json_mode=json_mode,
+        parallel_tool_calls=parallel_tool_calls,
+        tool_cache=ToolCache() if tool_cache else None,
+    )
+    if json_mode and assistant_llm.json_mode() is None:
+        logger.warning(
+            "Without a JSON mode for %s (and for the cheaper LLM of a budget), the "
+            "assistant uses the ReAct agent",
+            llm_name,
+        )
+    user_llm = llm_for("user", "User")
+    llm_user: User
+    replay_user: ReplayUser | None = None
+    if replay is None:
+        llm_user = TestUser(
+            llm=user_llm,
+            persona=scenario.persona,
+            transcript=transcript,
+            callbacks=callbacks_for("user"),
+        )
+    else:
+        llm_user = replay_user = replay.replay_user()
+
+    checkpoint = (
+        CheckpointLog(os.path.join(checkpoint_dir, f"{scenario.id}.jsonl"), mocks)
+        if checkpoint_dir
+        else None
+    )
+    conversation = ConversationRunner(
+        user=llm_user,
+        assistant=assistant.chat,
+        stop_condition=lambda state: state.last_assistant_message_contains("bye"),
+        transcript=transcript,
+        checkpoint=checkpoint,
+        tracer=tracer,
+    )
+    conversation_state = conversation.start(max_iterations=MAX_ITERATIONS)
+
+    hotel = expected_hotel(parameters)
+    if hotel:
+        reservation_ok = passes(
+            lambda: make_reservation_mock.assert_called_once_with(
+                hotel.name,
+                parameters["guest_name"],
+                date.fromisoformat(parameters["stay"]["checkin_date"]),
+                date.fromisoformat(parameters["stay"]["checkout_date"]),
+                parameters["guests"],
+            )
+        )
+    else:
+        reservation_ok = passes(make_reservation_mock.assert_not_called)
+    find_hotels_ok = passes(lambda: find_hotels_mock.assert_called_once_with(location))
+
+    analyser_llm = llm_for("analyser", "ConversationAnalyser")
+    analyser = ConversationAnalyser(
+        llm=analyser_llm,
+        callbacks=callbacks_for("analyser", tracing=False),
+        cache=verdict_cache,
+    )
+    verdict = analyser.analyse(
+        chat_history=conversation_state.chat_history, criteria=CRITERIA
+    )
+    score = int(verdict["score"])
+    if replay is not None and replay_user is not None:
+        # The user's answers are replayed as messages, not from its LLM
+        replay_llms.pop("user")
+        check_replay(
+            replay,
+            mocks,
+            conversation_state.turn_steps,
+            conversation_state.iterations_count,
+            replay_llms,
+            replay_user,
+        )
+
+    result = {
+        "llm_name": llm_name,
+        "parameters": parameters,
+        "iterations": conversation_state.iterations_count,
+        "find_hotels_ok": find_hotels_ok,
+        "reservation_ok": reservation_ok,
+        "score": score,
+        "feedback": verdict["feedback"],
+        "passed": find_hotels_ok
+        and reservation_ok
+        and score > MINIMUM_ACCEPTABLE_SCORE,
+        "tokens": sum(handler.usage.total_tokens for handler in token_usage.values()),
+        "duration_seconds": time.perf_counter() - started,
+        "steps_per_turn": assistant.step_stats.steps_per_turn(),
+        "wasted_steps": assistant.step_stats.wasted_steps,
+        "assistant_turn_seconds": [
+            timing.assistant_seconds for timing in conversation_state.turn_timings
+        ],
+    }
+    if writer:
+        write_results(writer, scenario, result, conversation_state, token_usage)
+    if record_dir:
+        llms = {"assistant": assistant_llm, "user": user_llm, "analyser": analyser_llm}
+        Recording(
+            settings={
+                "llm_name": llm_name,
+                "scenario_id": scenario.id,
+                "json_mode": json_mode and assistant_llm.json_mode() is not None,
+                "tool_cache": tool_cache,
+                "supports_function_calling": {
+                    role: llm.supports_function_calling() for role, llm in llms.items()
+                },
+            },
+            user_messages=[
+                content
+                for speaker, content in zip(transcript.speakers, transcript.contents)
+                if speaker == "user"
+            ],
+            llm_outputs={role: recorder.outputs for role, recorder in recorders.items()},
+            intermediate_steps=conversation_state.turn_steps,
+            mock_calls=recorded_mock_calls(mocks),
+            iterations_count=conversation_state.iterations_count,
+        ).save(os.path.join(record_dir, f"{scenario.id}.json"))
+    return result
+
+
+def run_budgeted_booking_scenario(
+    scenario: Scenario,
+    llm_name: LLM_NAMES,
+    governor: BudgetGovernor,
+    **kwargs: Any,
+) -> dict[str, Any]:
+    """Runs a booking scenario, stopping it when its budget or the suite's runs out."""
+    with governor.conversation(scenario.id) as spend:
+        try:
+            result = run_booking_scenario(scenario, llm_name, governor=governor, **kwargs)
+        except BudgetExceeded as e:
+            spend.status = "aborted"
+            result = {
+                "llm_name": llm_name,
+                "parameters": scenario.parameters,
+                "passed": False,
+                "aborted": str(e),
+            }
+    result["spend"] = {
+        "status": spend.status,
+        "tokens": spend.tokens,
+        "cost": spend.cost,
+        "seconds": spend.seconds,
+    }
+    return result
+
+
+def write_results(
+    writer: ResultsWriter,
+    scenario: Scenario,
+    result: dict[str, Any],
+    state: ConversationRunnerState,
+    token_usage: dict[str, TokenUsageHandler],
+):
+    tokens = {}
+    for role, handler in token_usage.items():
+        tokens[f"{role}_prompt_tokens"] = handler.usage.prompt_tokens
+        tokens[f"{role}_completion_tokens"] = handler.usage.completion_tokens
+    writer.write(
+        "conversations",
+        {
+            "scenario_id": scenario.id,
+            **result,
+            **tokens,
+            "transcript": [
+                [speaker, content]
+                for speaker, content in zip(
+                    state.transcript.speakers, state.transcript.contents
+                )
+            ],
+        },
+    )
+    for timing in state.turn_timings:
+        writer.write(
+            "turns",
+            {
+                "scenario_id": scenario.id,
+                "llm_name": result["llm_name"],
+                **asdict(timing),
+            },
+        )
+
+
+def run_repeated_booking_scenario(
+    scenario: Scenario,
+    llm_name: LLM_NAMES,
+    test: SequentialPassRateTest,
+    writer: ResultsWriter | None = None,
+    tracer: Tracer | None = None,
+) -> dict[str, Any]:
+    report = test.run(
+        lambda: run_booking_scenario(
+            scenario, llm_name, writer=writer, tracer=tracer
+        )["passed"]
+    )
+    return {
+        "llm_name": llm_name,
+        "parameters": scenario.parameters,
+        **asdict(report),
+        "pass_rate": report.pass_rate,
+        "passed": report.verdict == "pass",
+    }
+
+
+def replay_booking_scenarios(
+    scenarios: list[Scenario], recording_dir: str
+) -> dict[str, dict[str, Any]]:
+    """Replays the recorded conversations of the scenarios, without calling LLMs."""
+    results = {}
+    for scenario in scenarios:
+        path = os.path.join(recording_dir, f"{scenario.id}.json")
+        if not os.path.exists(path):
+            continue
+        recording = Recording.load(path)
+        try:
+            result = run_booking_scenario(
+                scenario, recording.settings["llm_name"], replay=recording
+            )
+            result["diverged"] = None
+        except ReplayDivergedError as e:
+            result = {"passed": False, "diverged": str(e)}
+        results[scenario.id] = result
+        if result["diverged"]:
+            outcome = f"diverged, {result['diverged']}"
+        else:
+            outcome = "passed" if result["passed"] else "failed"
+        print(f"{scenario.id}: {outcome}")
+    return results
+
+
+def budget_governor(args: argparse.Namespace) -> BudgetGovernor | None:
+    def seconds(minutes: float | None) -> float | None:
+        return minutes * 60 if minutes else None
+
+    conversation_budget = Budget(
+        max_tokens=args.max_conversation_tokens,
+        max_seconds=seconds(args.max_conversation_minutes),
+    )
+    suite_budget = Budget(
+        max_cost=args.max_suite_cost, max_seconds=seconds(args.max_suite_minutes)
+    )
+    if conversation_budget == Budget() and suite_budget == Budget():
+        return None
+    return BudgetGovernor(suite_budget, conversation_budget, prices=MODEL_PRICES)
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    index, count = value.split("/")
+    return int(index), int(count)
+
+
+def main():
+    load_dotenv(override=True)
+
+    parser = argparse.ArgumentParser(description="Run the hotel booking matrix")
+    parser.add_argument("--llm", default="groq-llama3-70")
+    parser.add_argument("--shard", type=parse_shard, default=(0, 1), help="i/N")
+    parser.add_argument("--results", default="results/booking.jsonl")
+    parser.add_argument(
+        "--repeat",
+        action="store_true",
+        help="Repeat each scenario until its pass rate is decisively above or below "
+        "--required-pass-rate",
+    )
+    parser.add_argument("--required-pass-rate", type=float, default=0.8)
+    parser.add_argument("--max-runs", type=int, default=30)
+    parser.add_argument(
+        "--parallel-tool-calls",
+        action="store_true",
+        help="Run all the tool calls of an agent step concurrently",
+    )
+    parser.add_argument(
+        "--tool-cache",
+        action="store_true",
+        help="Reuse the hotels found in a conversation until a reservation is made",
+    )
+    parser.add_argument(
+        "--checkpoints",
+        help="Directory where each conversation is checkpointed after every turn, "
+        "to resume interrupted conversations (ignored with --repeat)",
+    )
+    parser.add_argument(
+        "--results-store",
+        help="Directory of a Parquet dataset where every conversation and its "
+        "turn timings, token counts and score are also written",
+    )
+    parser.add_argument(
+        "--record",
+        help="Directory where the LLM answers and the assistant steps of each "
+        "conversation are recorded, to replay them later (ignored with --repeat)",
+    )
+    parser.add_argument(
+        "--replay",
+        help="Directory of recorded conversations to replay against the current "
+        "code, without calling the LLMs",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Run this many scenarios at a time, the longest expected ones first",
+    )
+    parser.add_argument(
+        "--durations",
+        default="results/durations.json",
+        help="Where the duration of each scenario is kept, to schedule the next runs",
+    )
+    parser.add_argument(
+        "--max-conversation-tokens",
+        type=int,
+        help="Abort a conversation after this many tokens, for all its roles",
+    )
+    parser.add_argument("--max-conversation-minutes", type=float)
+    parser.add_argument(
+        "--max-suite-cost",
+        type=float,
+        help="Abort the remaining conversations once the run has cost this many dollars",
+    )
+    parser.add_argument("--max-suite-minutes", type=float)
+    parser.add_argument(
+        "--cheaper-llm",
+        help="The LLM to switch to when a budget is almost exhausted",
+    )
+    parser.add_argument(
+        "--small-llm",
+        help="An LLM that the user and the analyser try first, escalating its empty "
+        "answers and its scores close to the minimum acceptable score",
+    )
+    parser.add_argument(
+        "--verdict-cache",
+        help="SQLite database where the analyser's verdicts are cached, so resumed "
+        "or rerun conversations are not analysed again",
+    )
+    args = parser.parse_args()
+
+    llm_name = cast(LLM_NAMES, args.llm)
+    shard_index, shard_count = args.shard
+    scenarios = shard(booking_scenarios(), shard_index, shard_count)
+    if args.replay:
+        results = replay_booking_scenarios(scenarios, args.replay)
+        passed = sum(1 for r in results.values() if r["passed"])
+        print(f"Replayed {len(results)} conversations: {passed} passed")
+        return
+    writer = ResultsWriter(args.results_store) if args.results_store else None
+    tracer = tracer_from_env()
+    verdict_cache = VerdictCache(args.verdict_cache) if args.verdict_cache else None
+    governor = budget_governor(args)
+    scheduler = (
+        ScenarioScheduler(DurationHistory(args.durations), workers=args.workers)
+        if args.workers > 1
+        else None
+    )
+    try:
+        if args.repeat:
+            test = SequentialPassRateTest(
+                required_pass_rate=args.required_pass_rate, max_runs=args.max_runs
+            )
+            results = run_scenarios(
+                scenarios,
+                lambda scenario: run_repeated_booking_scenario(
+                    scenario, llm_name, test, writer, tracer
+                ),
+                ScenarioResults(args.results),
+                scheduler,
+            )
+        else:
+            options: dict[str, Any] = {
+                "checkpoint_dir": args.checkpoints,
+                "writer": writer,
+                "tracer": tracer,
+                "record_dir": args.record,
+                "parallel_tool_calls": args.parallel_tool_calls,
+                "tool_cache": args.tool_cache,
+                "verdict_cache": verdict_cache,
+                "cheaper_llm_name": args.cheaper_llm,
+                "small_llm_name": args.small_llm,
+            }
+            results = run_scenarios(
+                scenarios,
+                lambda scenario: (
+                    run_budgeted_booking_scenario(scenario, llm_name, governor, **options)
+                    if governor
+                    else run_booking_scenario(scenario, llm_name, **options)
+                ),
+                ScenarioResults(args.results),
+                scheduler,
+            )
+    finally:
+        if writer:
+            writer.close()
+        tracer.close()
+        if verdict_cache is not None:
+            print(f"Verdict cache: {verdict_cache.stats}")
+            verdict_cache.close()
+    passed = sum(1 for r in results.values() if r["passed"])
+    print(f"Shard {shard_index}/{shard_count}: {passed}/{len(results)} passed")
+    if scheduler:
+        print(f"Scheduler: {scheduler.stats}")
+    if args.small_llm:
+        for role, answered_by in CASCADE_ANSWERS.items():
+            print(f"Cascade, {role}: {answered_by.escalation_rate():.0%} escalated")
+    if governor:
+        for spend in governor.report():
+            print(spend)
+    for model, stats in all_estimate_stats().items():
+        print(f"Prompt sizes of {model}: {stats}, actual/estimated {stats.ratio()}")
+    for (base_url, model), request_scheduler in local_schedulers().items():
+        print(f"{model} at {base_url}: {request_scheduler.stats}")
+        for role, stats in request_scheduler.role_stats.items():
+            print(f"  {role}: {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from langchain.pydantic_v1 import BaseModel
+
+CACHED_NOTE = "(This is the same result as before, the data hasn't changed.)"
+REUSE_NOTE = (
+    "You already called {tool_name} with these arguments in this step, "
+    "use the result you got then."
+)
+
+
+@dataclass
+class CacheEntry:
+    result: Any
+    stored_at: float
+    turn: int
+
+
+@dataclass
+class ToolCacheStats:
+    hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    invalidations: int = 0
+
+
+class ToolCache:
+    """Memoizes the results of read-only tools during a conversation.
+
+    Results are keyed on the tool's validated arguments and kept for `ttl`
+    seconds, or until `invalidate()` is called after a tool that changes the data.
+    With `note_cached`, the agent is told that a result is cached: the first time
+    in a turn the result comes with a note, the next times only the note is
+    returned, since the result is already in the agent's scratchpad.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 300.0,
+        note_cached: bool = False,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl = ttl
+        self.note_cached = note_cached
+        self.clock = clock
+        self.entries: dict[tuple[str, str], CacheEntry] = {}
+        self.turn = 0
+        self.stats = ToolCacheStats()
+        self.lock = threading.Lock()
+
+    def call(self, tool_name: str, args: BaseModel, function: Callable[[], Any]) -> Any:
+        key = (tool_name, args.json(sort_keys=True))
+        with self.lock:
+            now = self.clock()
+            entry = self.entries.get(key)
+            if entry and now - entry.stored_at < self.ttl:
+                self.stats.hits += 1
+                if not self.note_cached:
+                    return entry.result
+                if entry.turn == self.turn:
+                    return REUSE_NOTE.format(tool_name=tool_name)
+                entry.turn = self.turn
+                return f"{CACHED_NOTE}\n{entry.result}"
+            if entry:
+                self.stats.expired += 1
+            self.stats.misses += 1
+
+        # Not locked, so slow tools can run in parallel
+        result = function()
+        with self.lock:
+            self.entries[key] = CacheEntry(result, self.clock(), self.turn)
+        return result
+
+    def new_turn(self):
+        with self.lock:
+            self.turn += 1
+
+    def invalidate(self):
+        with self.lock:
+            self.entries.clear()
+            self.stats.invalidations += 1
+
+    def fork(self) -> "ToolCache":
+        cache = ToolCache(self.ttl, self.note_cached, self.clock)
+        with self.lock:
+            cache.entries = dict(self.entries)
+            cache.turn = self.turn
+        return cache
@@ -0,0 +1,88 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# Each statement runs in a fresh interpreter, so that nothing is already imported
+TARGETS = {
+    "hotel_reservations.llms": "import hotel_reservations.llms",
+    "behave environment": "import features.environment",
+    "main.py": "import main",
+    "create groq-llama3-70": "from hotel_reservations.llms import create_llm; "
+    "create_llm('Assistant', 'groq-llama3-70')",
+}
+
+# Importing the LLMs must not import LangChain or the providers' SDKs, which are
+# only needed once an LLM is created
+HEAVY_MODULES = [
+    "langchain_core",
+    "langchain_openai",
+    "langchain_groq",
+    "langchain_community",
+]
+LIGHT_TARGETS = ["hotel_reservations.llms"]
+
+TIMER = """
+import sys
+import time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(*[module for module in {heavy_modules!r} if module in sys.modules])
+print(elapsed)
+"""
+
+
+def measure(statement: str, repeat: int) -> tuple[list[float], list[str]]:
+    """The import times, and the heavy modules that were imported."""
+    # Creating an LLM checks that there is a key, but it doesn't call the provider
+    env = {"GROQ_API_KEY": "not-used", **os.environ}
+    timings = []
+    heavy_modules: list[str] = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                TIMER.format(statement=statement, heavy_modules=HEAVY_MODULES),
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+            env=env,
+        ).stdout
+        *_, modules, elapsed = output.rstrip("\n").split("\n")
+        heavy_modules = modules.split()
+        timings.append(float(elapsed))
+    return timings, heavy_modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold start import times")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    regressions = []
+    for name, statement in TARGETS.items():
+        try:
+            timings, heavy_modules = measure(statement, args.repeat)
+        except subprocess.CalledProcessError as e:
+            error = e.stderr.strip().splitlines()
+            print(f"{name:<25} failed: {error[-1] if error else e}")
+            regressions.append(f"{name} failed")
+            continue
+        print(
+            f"{name:<25} median {statistics.median(timings):.3f}s"
+            f"  min {min(timings):.3f}s"
+        )
+        if name in LIGHT_TARGETS and heavy_modules:
+            regressions.append(f"{name} imports {', '.join(heavy_modules)}")
+    for regression in regressions:
+        print(regression)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,9 +4,15 @@ from unittest.mock import Mock
 
 from dotenv import load_dotenv
 
+from agents_behave.cascade_llm import (
+    CascadeLLM,
+    confident_verdict,
+    non_empty_response,
+)
 from agents_behave.conversation_analyser import ConversationAnalyser
 from agents_behave.conversation_runner import ConversationRunner
 from agents_behave.test_user import TestUser
+from agents_behave.transcript import Transcript
 from hotel_reservations.assistant import HotelReservationsAssistant
 from hotel_reservations.core import Hotel, find_hotels, make_reservation
 from hotel_reservations.llms import LLM_NAMES, BaseLLM, LLMConfig, LLMManager
@@ -24,10 +30,22 @@ def create_llm(name: str, llm_name: LLM_NAMES) -> BaseLLM:
     )
 
 
-def run(llm_name: LLM_NAMES):
+def run(llm_name: LLM_NAMES, small_llm_name: LLM_NAMES | None = None):
     assistant_llm = create_llm("Assistant", llm_name)
     user_llm = create_llm("User", llm_name)
     conversation_analyser_llm = create_llm("ConversationAnalyser", llm_name)
+    if small_llm_name:
+        user_llm = CascadeLLM(
+            [create_llm("User", small_llm_name), user_llm],
+            accept=non_empty_response,
+        )
+        conversation_analyser_llm = CascadeLLM(
+            [
+                create_llm("ConversationAnalyser", small_llm_name),
+                conversation_analyser_llm,
+            ],
+            accept=confident_verdict(minimum_acceptable_score=6),
+        )
 
     make_reservation_mock = Mock(make_reservation, return_value=True)
     find_hotels_return_value = [
@@ -35,10 +53,12 @@ def run(llm_name: LLM_NAMES):
         Hotel("124", name="Notting Hill Hotel", location="London", price_per_night=400),
     ]
     find_hotels_mock = Mock(find_hotels, return_value=find_hotels_return_value)
+    transcript = Transcript()
     assistant = HotelReservationsAssistant(
         llm=assistant_llm,
         make_reservation=make_reservation_mock,
         find_hotels=find_hotels_mock,
+        transcript=transcript,
     )
     persona = """
         My name is John Smith.
@@ -47,6 +67,7 @@ def run(llm_name: LLM_NAMES):
     llm_user = TestUser(
         llm=user_llm,
         persona=persona,
+        transcript=transcript,
     )
 
     def assistant_chat_wrapper(query: str):
@@ -58,6 +79,7 @@ def run(llm_name: LLM_NAMES):
         assistant=assistant_chat_wrapper,
         stop_condition=lambda state: "bye"
         in str(state.chat_history[-1].content).lower(),
+        transcript=transcript,
     )
 
     conversation_state = conversation.start()
@@ -87,4 +109,5 @@ def run(llm_name: LLM_NAMES):
 
 if __name__ == "__main__":
     llm_name = sys.argv[1] if len(sys.argv) > 1 else "openai-gpt-4o"
-    run(cast(LLM_NAMES, llm_name))
+    small_llm_name = sys.argv[2] if len(sys.argv) > 2 else None
+    run(cast(LLM_NAMES, llm_name), cast(LLM_NAMES | None, small_llm_name))
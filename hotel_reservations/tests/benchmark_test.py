@@ -0,0 +1,40 @@
+from hamcrest import assert_that, close_to, equal_to
+
+from hotel_reservations.benchmark import leaderboard
+
+
+def a_run(llm_name: str, passed: bool, **overrides):
+    return {
+        "llm_name": llm_name,
+        "error": False,
+        "passed": passed,
+        "score": 8 if passed else 4,
+        "iterations": 3,
+        "tokens": 1000,
+        "steps_per_turn": 1.5,
+        "wasted_steps": 0,
+        "duration_seconds": 10.0,
+        "assistant_turn_seconds": [1.0, 2.0, 3.0],
+        **overrides,
+    }
+
+
+def test_ranks_the_models_by_pass_rate_and_then_latency():
+    # Given
+    runs = [
+        a_run("slow", True, assistant_turn_seconds=[5.0]),
+        a_run("fast", True),
+        a_run("flaky", True),
+        a_run("flaky", False, error=True),
+    ]
+
+    # When
+    board = leaderboard(runs)
+
+    # Then
+    assert_that(board["llm_name"].tolist(), equal_to(["fast", "slow", "flaky"]))
+    flaky = board[board["llm_name"] == "flaky"].iloc[0]
+    assert_that(flaky["pass_rate"], equal_to(0.5))
+    assert_that(flaky["errors"], equal_to(1))
+    assert_that(flaky["p95_turn_seconds"], close_to(2.9, 0.01))
+    assert_that(flaky["tokens_per_second"], equal_to(100.0))
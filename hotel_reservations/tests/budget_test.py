@@ -0,0 +1,115 @@
+from typing import Any
+
+import pytest
+from hamcrest import assert_that, equal_to, has_entries, none
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from agents_behave.base_llm import BaseLLM, LLMConfig
+from agents_behave.budget import (
+    Budget,
+    BudgetedLLM,
+    BudgetExceeded,
+    BudgetGovernor,
+    ModelPrice,
+)
+from agents_behave.chat_model_wrapper import ChatModelWrapper
+from tests.helpers import JsonModeLLM
+
+
+class CountingChatModel(ChatModelWrapper):
+    answer: str
+    received: list = []
+
+    def call(self, messages: list[BaseMessage], stop, run_manager, **kwargs: Any):
+        self.received.append(len(messages))
+        return AIMessage(
+            content=self.answer,
+            response_metadata={
+                "token_usage": {"prompt_tokens": 30, "completion_tokens": 10}
+            },
+        )
+
+
+def fake_llm(model: str) -> BaseLLM:
+    return BaseLLM(
+        LLMConfig(model=model), CountingChatModel(answer=model, received=[])
+    )
+
+
+def json_mode_llm(model: str) -> BaseLLM:
+    return JsonModeLLM(
+        LLMConfig(model=model), CountingChatModel(answer=model, received=[])
+    )
+
+
+MESSAGES = [SystemMessage(content="Be nice")] + [
+    HumanMessage(content=f"Message {i}") for i in range(10)
+]
+
+
+def test_switches_to_the_cheaper_model_and_then_aborts():
+    # Given
+    governor = BudgetGovernor(
+        conversation_budget=Budget(max_tokens=100),
+        prices={"big": ModelPrice(prompt=10, completion=30)},
+    )
+    cheaper_llm = fake_llm("small")
+    llm = BudgetedLLM(fake_llm("big"), governor, cheaper_llm, degraded_history=4)
+
+    # When
+    with governor.conversation("scenario") as spend:
+        answers = [llm.llm.invoke(MESSAGES).content for _ in range(3)]
+        with pytest.raises(BudgetExceeded):
+            llm.llm.invoke(MESSAGES)
+        spend.status = "aborted"
+
+    # Then
+    assert_that(answers, equal_to(["big", "big", "small"]))
+    assert_that(cheaper_llm.llm.received, equal_to([5]))
+    assert_that(
+        governor.report()[0],
+        has_entries(
+            {
+                "name": "scenario",
+                "status": "aborted",
+                "tokens": 120,
+                "cost": 0.0012,
+                "calls": 3,
+            }
+        ),
+    )
+
+
+def test_the_suite_budget_is_shared_by_all_conversations():
+    # Given
+    governor = BudgetGovernor(suite_budget=Budget(max_tokens=40))
+    llm = BudgetedLLM(fake_llm("big"), governor)
+    with governor.conversation("first"):
+        llm.llm.invoke(MESSAGES)
+
+    # When / Then
+    with governor.conversation("second"), pytest.raises(BudgetExceeded) as e:
+        llm.llm.invoke(MESSAGES)
+    assert_that(e.value.scope, equal_to("suite"))
+
+
+def test_the_json_mode_switches_to_the_cheaper_model():
+    # Given
+    governor = BudgetGovernor(conversation_budget=Budget(max_tokens=100))
+    llm = BudgetedLLM(json_mode_llm("big"), governor, json_mode_llm("small"))
+    json_mode = llm.json_mode()
+    assert json_mode is not None
+
+    # When
+    with governor.conversation("scenario"):
+        answers = [json_mode.invoke(MESSAGES).content for _ in range(3)]
+
+    # Then
+    assert_that(answers, equal_to(["big", "big", "small"]))
+
+
+def test_there_is_no_json_mode_without_one_for_the_cheaper_model():
+    governor = BudgetGovernor()
+    llm = BudgetedLLM(json_mode_llm("big"), governor, fake_llm("small"))
+    assert_that(llm.json_mode(), none())
+    assert_that(BudgetedLLM(json_mode_llm("big"), governor).json_mode() is not None, equal_to(True))
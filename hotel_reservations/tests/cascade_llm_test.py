@@ -0,0 +1,119 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from hamcrest import assert_that, equal_to
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage
+
+from agents_behave.base_llm import BaseLLM, LLMConfig
+from agents_behave.cascade_llm import (
+    CascadeLLM,
+    confident_verdict,
+    non_empty_response,
+    valid_verdict,
+)
+
+
+class LLMRunsHandler(BaseCallbackHandler):
+    def __init__(self):
+        self.runs = []
+
+    def on_chat_model_start(
+        self, serialized, messages, *, run_id, parent_run_id=None, **kwargs
+    ):
+        self.runs.append((run_id, parent_run_id))
+
+
+def fake_llm(*responses: str) -> BaseLLM:
+    return BaseLLM(LLMConfig(), FakeListChatModel(responses=list(responses)))
+
+
+def test_escalates_the_answers_that_are_not_accepted():
+    # Given
+    cascade = CascadeLLM([fake_llm(" ", "Hello"), fake_llm("Hi")], accept=non_empty_response)
+
+    # When
+    escalated = cascade.llm.invoke("Say hello")
+    accepted = cascade.llm.invoke("Say hello")
+
+    # Then
+    assert_that([escalated.content, accepted.content], equal_to(["Hi", "Hello"]))
+    assert_that(dict(cascade.answered_by), equal_to({0: 1, 1: 1}))
+    assert_that(cascade.escalation_rate(), equal_to(0.5))
+
+
+def test_the_wrapped_models_report_to_the_callbacks_when_called_asynchronously():
+    # Given
+    cascade = CascadeLLM([fake_llm(""), fake_llm("Hi")], accept=non_empty_response)
+    handler = LLMRunsHandler()
+
+    # When
+    asyncio.run(cascade.llm.ainvoke("Say hello", {"callbacks": [handler]}))
+
+    # Then
+    (cascade_run, _), *model_runs = handler.runs
+    assert_that([parent for _, parent in model_runs], equal_to([cascade_run] * 2))
+
+
+def test_a_cascade_with_another_accept_check_counts_the_same_answers():
+    # Given
+    cascade = CascadeLLM([fake_llm("Hi"), fake_llm("Hello")], accept=non_empty_response)
+    stricter = cascade.with_accept(lambda message: False)
+
+    # When
+    cascade.llm.invoke("Say hello")
+    stricter.llm.invoke("Say hello")
+
+    # Then
+    assert_that(dict(cascade.answered_by), equal_to({0: 1, 1: 1}))
+    assert_that(cascade.escalation_rate(), equal_to(0.5))
+
+
+def test_counts_the_answers_of_concurrent_calls():
+    # Given
+    cascade = CascadeLLM([fake_llm(""), fake_llm("Hi")], accept=non_empty_response)
+
+    # When
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda _: cascade.llm.invoke("Say hello"), range(200)))
+
+    # Then
+    assert_that(dict(cascade.answered_by), equal_to({1: 200}))
+
+
+def test_non_empty_response():
+    assert_that(non_empty_response(AIMessage(content="Hi")), equal_to(True))
+    assert_that(non_empty_response(AIMessage(content=" \n")), equal_to(False))
+
+
+def test_valid_verdict():
+    assert_that(
+        valid_verdict(AIMessage(content='Verdict: {"score": 7, "feedback": "Good"}')),
+        equal_to(True),
+    )
+    assert_that(
+        valid_verdict(
+            AIMessage(
+                content="",
+                tool_calls=[
+                    {"name": "Verdict", "args": {"score": 7, "feedback": "Good"}, "id": "1"}
+                ],
+            )
+        ),
+        equal_to(True),
+    )
+    assert_that(valid_verdict(AIMessage(content='{"score": 7}')), equal_to(False))
+
+
+def test_confident_verdict_escalates_scores_close_to_the_threshold():
+    accept = confident_verdict(minimum_acceptable_score=6)
+
+    def verdict(score: int) -> AIMessage:
+        return AIMessage(content=f'{{"score": {score}, "feedback": "Good"}}')
+
+    assert_that(
+        [accept(verdict(score)) for score in [4, 5, 6, 7, 8]],
+        equal_to([True, False, False, False, True]),
+    )
+    assert_that(accept(AIMessage(content="I can't tell")), equal_to(False))
@@ -0,0 +1,95 @@
+from unittest.mock import Mock, call
+
+from hamcrest import assert_that, equal_to, has_length
+from langchain_core.agents import AgentAction
+
+from agents_behave.checkpoint import CheckpointLog
+from agents_behave.conversation_runner import ConversationRunner
+from agents_behave.transcript import Transcript
+from tests.helpers import ScriptedUser
+
+
+class BookingAssistant:
+    def __init__(self, find_hotels: Mock):
+        self.find_hotels = find_hotels
+        self.calls = 0
+
+    def __call__(self, query: str) -> dict:
+        self.calls += 1
+        hotels = self.find_hotels(query)
+        action = AgentAction("find_hotels_tool", {"location": query}, "")
+        return {"output": f"Found {hotels}", "intermediate_steps": [(action, hotels)]}
+
+
+def conversation(path: str, user_messages: list[str]) -> ConversationRunner:
+    find_hotels = Mock(return_value=["Kensington Hotel"])
+    transcript = Transcript()
+    return ConversationRunner(
+        user=ScriptedUser(user_messages),
+        assistant=BookingAssistant(find_hotels),
+        stop_condition=lambda state: state.iterations_count >= 2,
+        transcript=transcript,
+        checkpoint=CheckpointLog(path, {"find_hotels": find_hotels}),
+    )
+
+
+def test_restores_an_interrupted_conversation(tmp_path):
+    # Given
+    path = str(tmp_path / "conversation.jsonl")
+    conversation(path, ["London", "Paris"]).start(max_iterations=1)
+
+    # When
+    resumed = conversation(path, ["bye"])
+    state = resumed.start()
+
+    # Then
+    assert_that(resumed.assistant.calls, equal_to(1))
+    assert_that(
+        resumed.assistant.find_hotels.call_args_list,
+        equal_to([call("London"), call("Paris")]),
+    )
+    assert_that(state.iterations_count, equal_to(2))
+    assert_that(
+        [str(message.content) for message in state.chat_history],
+        equal_to(
+            ["London", "Found ['Kensington Hotel']", "Paris", "Found ['Kensington Hotel']", "bye"]
+        ),
+    )
+    assert_that(
+        [steps[0]["tool_input"] for steps in state.turn_steps],
+        equal_to([{"location": "London"}, {"location": "Paris"}]),
+    )
+    assert_that(state.turn_timings, has_length(2))
+
+
+def test_ignores_a_truncated_last_line(tmp_path):
+    # Given
+    path = str(tmp_path / "conversation.jsonl")
+    conversation(path, ["London", "Paris"]).start(max_iterations=1)
+    with open(path, "a") as f:
+        f.write('{"messages": [["user", "Par')
+
+    # When
+    checkpoint = CheckpointLog(path).load()
+
+    # Then
+    assert checkpoint is not None
+    assert_that(checkpoint.iterations_count, equal_to(1))
+    assert_that(checkpoint.entries, has_length(3))
+    assert_that(checkpoint.turn_steps, has_length(1))
+
+
+def test_a_finished_conversation_is_not_run_again(tmp_path):
+    # Given
+    path = str(tmp_path / "conversation.jsonl")
+    conversation(path, ["London", "Paris", "bye"]).start()
+
+    # When
+    resumed = conversation(path, [])
+    state = resumed.start()
+
+    # Then
+    assert_that(resumed.assistant.calls, equal_to(0))
+    assert_that(state.iterations_count, equal_to(2))
+    assert_that(state.turn_steps, has_length(2))
+    assert_that(resumed.assistant.find_hotels.call_count, equal_to(2))
@@ -0,0 +1,85 @@
+from hamcrest import assert_that, contains_string, equal_to
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agents_behave.base_llm import BaseLLM, LLMConfig
+from agents_behave.conversation_analyser import ConversationAnalyser
+from agents_behave.json_extraction import extract_json_objects
+from tests.helpers import FakeToolCallingModel
+
+CHAT_HISTORY = [HumanMessage(content="Hi"), AIMessage(content="Hello, bye")]
+
+
+def analyser_answering(*responses: str) -> ConversationAnalyser:
+    llm = BaseLLM(LLMConfig(), FakeListChatModel(responses=list(responses)))
+    return ConversationAnalyser(llm=llm)
+
+
+def test_extracts_json_objects_surrounded_by_prose():
+    text = 'Here it is:\n```json\n{"score": 8\n "feedback": "Good {job}",}\n```\nThanks'
+
+    objects = extract_json_objects(text)
+
+    assert_that(objects, equal_to([{"score": 8, "feedback": "Good {job}"}]))
+
+
+def test_finds_the_verdict_in_an_answer_with_prose():
+    # Given
+    analyser = analyser_answering(
+        'The assistant did well. {"score": 8, "feedback": "Polite"} Anything else?'
+    )
+
+    # When
+    verdict = analyser.analyse(CHAT_HISTORY, criteria=["Be polite"])
+
+    # Then
+    assert_that(verdict, equal_to({"score": 8, "feedback": "Polite"}))
+    assert_that(analyser.parse_stats["parsed"], equal_to(1))
+
+
+def test_asks_the_model_to_repair_an_invalid_verdict():
+    # Given
+    analyser = analyser_answering(
+        "I'd give it an 8, it was polite.",
+        '{"score": 8, "feedback": "It was polite"}',
+    )
+
+    # When
+    verdict = analyser.analyse(CHAT_HISTORY, criteria=["Be polite"])
+
+    # Then
+    assert_that(verdict["score"], equal_to(8))
+    assert_that(analyser.parse_stats["repaired"], equal_to(1))
+
+
+def test_repairs_the_arguments_of_an_invalid_verdict_tool_call():
+    # Given
+    model = FakeToolCallingModel(
+        responses=[
+            AIMessage(
+                content="",
+                invalid_tool_calls=[
+                    {
+                        "name": "Verdict",
+                        "args": '{"score": 8, "feedback": "It was polite"',
+                        "id": "1",
+                        "error": None,
+                    }
+                ],
+            ),
+            AIMessage(content='{"score": 8, "feedback": "It was polite"}'),
+        ]
+    )
+    llm = BaseLLM(LLMConfig(supports_function_calling=True), model)
+    analyser = ConversationAnalyser(llm=llm)
+
+    # When
+    verdict = analyser.analyse(CHAT_HISTORY, criteria=["Be polite"])
+
+    # Then
+    assert_that(verdict, equal_to({"score": 8, "feedback": "It was polite"}))
+    assert_that(
+        str(model.prompts[-1][0].content),
+        contains_string('{"score": 8, "feedback": "It was polite"'),
+    )
+    assert_that(analyser.parse_stats["repaired"], equal_to(1))
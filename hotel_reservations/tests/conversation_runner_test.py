@@ -0,0 +1,69 @@
+from hamcrest import assert_that, contains_exactly, equal_to
+
+from agents_behave.console_user import ConsoleUser
+from agents_behave.conversation_runner import ConversationRunner, run_branches
+from tests.helpers import ScriptedUser
+
+
+class EchoAssistant:
+    def __init__(self):
+        self.calls: list[str] = []
+
+    def __call__(self, query: str) -> str:
+        self.calls.append(query)
+        return f"echo {query}"
+
+
+def test_forked_branches_reuse_the_shared_prefix():
+    # Given
+    prefix_assistant = EchoAssistant()
+    conversation = ConversationRunner(
+        user=ScriptedUser(["hi", "London", "polite", "bye"]),
+        assistant=prefix_assistant,
+        stop_condition=lambda state: state.iterations_count >= 3,
+    )
+    conversation.start(max_iterations=1)
+
+    # When
+    polite_assistant = EchoAssistant()
+    rough_assistant = EchoAssistant()
+    polite = conversation.fork(assistant=polite_assistant)
+    rough = conversation.fork(
+        assistant=rough_assistant,
+        user=ScriptedUser(["hi", "London", "rough", "whatever", "bye"]),
+    )
+    rough.user.turn = 2
+    polite_state, rough_state = run_branches([polite, rough])
+
+    # Then
+    assert_that(prefix_assistant.calls, contains_exactly("hi"))
+    assert_that(polite_assistant.calls, contains_exactly("London", "polite"))
+    assert_that(rough_assistant.calls, contains_exactly("London", "rough"))
+    assert_that(
+        [m.content for m in polite_state.chat_history],
+        contains_exactly(
+            "hi", "echo hi", "London", "echo London", "polite", "echo polite", "bye"
+        ),
+    )
+    assert_that(rough_state.iterations_count, equal_to(3))
+    assert_that(len(conversation.state.chat_history), equal_to(3))
+
+
+def test_console_conversations_can_be_forked(monkeypatch):
+    # Given
+    answers = iter(["hi", "London", "bye"])
+    monkeypatch.setattr("builtins.input", lambda prompt: next(answers))
+    conversation = ConversationRunner(
+        user=ConsoleUser(),
+        assistant=EchoAssistant(),
+        stop_condition=lambda state: state.iterations_count >= 2,
+    )
+    conversation.start(max_iterations=1)
+
+    # When
+    branch = conversation.fork(assistant=EchoAssistant())
+    state = branch.resume()
+
+    # Then
+    assert_that(state.iterations_count, equal_to(2))
+    assert_that(state.last_message().content, equal_to("bye"))
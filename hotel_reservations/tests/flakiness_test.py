@@ -0,0 +1,48 @@
+import random
+from itertools import cycle
+
+from hamcrest import assert_that, equal_to, less_than
+
+from agents_behave.flakiness import SequentialPassRateTest
+
+
+def test_stops_early_when_the_scenario_always_passes():
+    test = SequentialPassRateTest(required_pass_rate=0.7, max_runs=30)
+
+    report = test.run(lambda: True)
+
+    assert_that(report.verdict, equal_to("pass"))
+    assert_that(report.runs, less_than(30))
+
+
+def test_stops_early_when_the_scenario_mostly_fails():
+    outcomes = cycle([False, False, False, True])
+    test = SequentialPassRateTest(required_pass_rate=0.8, max_runs=30)
+
+    report = test.run(lambda: next(outcomes))
+
+    assert_that(report.verdict, equal_to("fail"))
+    assert_that(report.runs, less_than(30))
+
+
+def test_is_inconclusive_when_the_pass_rate_is_close_to_the_threshold():
+    outcomes = cycle([True, True, True, True, False])
+    test = SequentialPassRateTest(required_pass_rate=0.8, max_runs=10)
+
+    report = test.run(lambda: next(outcomes))
+
+    assert_that(report.verdict, equal_to("inconclusive"))
+    assert_that(report.runs, equal_to(10))
+
+
+def test_rarely_gives_a_verdict_when_the_pass_rate_is_the_threshold():
+    outcomes = random.Random(42)
+    test = SequentialPassRateTest(required_pass_rate=0.8, max_runs=30)
+
+    reports = [test.run(lambda: outcomes.random() < 0.8) for _ in range(500)]
+
+    # Stopping at the first decisive run doesn't inflate the 5% error rate
+    fails = sum(report.verdict == "fail" for report in reports)
+    passes = sum(report.verdict == "pass" for report in reports)
+    assert_that(fails / len(reports), less_than(0.05))
+    assert_that(passes / len(reports), less_than(0.05))
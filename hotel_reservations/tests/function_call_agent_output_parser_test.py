@@ -0,0 +1,109 @@
+import pytest
+from hamcrest import assert_that, equal_to, instance_of
+from langchain_core.agents import AgentAction, AgentFinish
+
+from hotel_reservations.assistant import FindHotelsInput, MakeReservationInput
+from hotel_reservations.function_call_agent_output_parser import (
+    FencedBlockExtractor,
+    FunctionCallAgentOutputParser,
+    ToolCallParseError,
+)
+
+ACTION = """Thought: I need to find the hotels
+```json
+{"action": "find_hotels_tool", "action_input": {"location": "London"}}
+```"""
+
+
+def parser() -> FunctionCallAgentOutputParser:
+    return FunctionCallAgentOutputParser(
+        args_schemas={
+            "find_hotels_tool": FindHotelsInput,
+            "make_reservation_tool": MakeReservationInput,
+        }
+    )
+
+
+def test_finds_a_fence_split_across_chunks():
+    # Given
+    extractor = FencedBlockExtractor()
+
+    # When
+    complete = [extractor.feed(chunk) for chunk in ["a `", "`", "`js", "on\n{}\n`", "``", " b"]]
+
+    # Then
+    assert_that(complete, equal_to([False, False, False, False, True, True]))
+    assert_that(extractor.block, equal_to("{}"))
+
+
+def test_parse_stream_stops_at_the_closing_fence():
+    # Given
+    consumed = []
+
+    def chunks():
+        for chunk in [ACTION[:40], ACTION[40:], "\nObservation: made up", " and more"]:
+            consumed.append(chunk)
+            yield chunk
+
+    # When
+    action = parser().parse_stream(chunks())
+
+    # Then
+    assert_that(action, instance_of(AgentAction))
+    assert_that(action.tool_input, equal_to({"location": "London"}))
+    assert_that(len(consumed), equal_to(2))
+
+
+def test_a_fenced_block_that_is_not_a_tool_call_is_a_final_answer():
+    # Given
+    text = "Here is your booking:\n```\nKensington Hotel, 2 guests\n```"
+
+    # When
+    finish = parser().parse(text)
+
+    # Then
+    assert_that(finish, instance_of(AgentFinish))
+    assert_that(finish.return_values["output"], equal_to(text))
+
+
+@pytest.mark.parametrize(
+    "text, kind",
+    [
+        ('```\n{"action": "find_hotels_tool",\n```', "invalid_json"),
+        ('```\n{"action_input": {"location": "London"}}\n```', "missing_action"),
+        (f"{ACTION}\nFinal Answer: the Kensington", "action_and_final_answer"),
+        ('```\n{"action": "cancel_tool", "action_input": {}}\n```', "unknown_tool"),
+        (
+            '```\n{"action": "make_reservation_tool", '
+            '"action_input": {"hotel_name": "Kensington", "guests": "two"}}\n```',
+            "invalid_arguments",
+        ),
+    ],
+)
+def test_reports_why_a_tool_call_could_not_be_parsed(text, kind):
+    # Given
+    output_parser = parser()
+
+    # When
+    with pytest.raises(ToolCallParseError) as error:
+        output_parser.parse(text)
+
+    # Then
+    assert_that(error.value.kind, equal_to(kind))
+    assert_that(output_parser.stats.counts[kind], equal_to(1))
+
+
+def test_validates_the_arguments_against_the_tool_schema():
+    # Given
+    text = (
+        '```\n{"action": "make_reservation_tool", "action_input": '
+        '{"hotel_name": "Kensington", "guest_name": "Pedro", '
+        '"checkin_date": "2024-06-01", "checkout_date": "2024-06-03", "guests": 2}}\n```'
+    )
+
+    # When
+    action = parser().parse(text)
+
+    # Then
+    assert_that(action, instance_of(AgentAction))
+    assert_that(action.tool, equal_to("make_reservation_tool"))
@@ -0,0 +1,170 @@
+import asyncio
+import time
+from typing import Any
+
+from hamcrest import (
+    assert_that,
+    equal_to,
+    greater_than_or_equal_to,
+    has_key,
+    is_not,
+)
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from agents_behave.base_llm import BaseLLM, LLMConfig
+from agents_behave.cascade_llm import CascadeLLM, non_empty_response
+from agents_behave.hedged_llm import HedgedLLM, _latencies, provider_name
+
+
+class SlowChatModel(BaseChatModel):
+    answer: str
+    delay: float = 0.0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        self.calls += 1
+        time.sleep(self.delay)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.answer))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.answer))])
+
+
+class AlternatingChatModel(SlowChatModel):
+    """Fast and slow in turn."""
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        delay = self.delay if self.calls % 2 else 0.0
+        self.calls += 1
+        await asyncio.sleep(delay)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.answer))])
+
+
+class LLMRunsHandler(BaseCallbackHandler):
+    def __init__(self):
+        self.runs = []
+
+    def on_chat_model_start(
+        self, serialized, messages, *, run_id, parent_run_id=None, **kwargs
+    ):
+        self.runs.append((run_id, parent_run_id))
+
+
+def slow_llm(llm_name: str, answer: str, delay: float = 0.0) -> BaseLLM:
+    return BaseLLM(LLMConfig(llm_name=llm_name), SlowChatModel(answer=answer, delay=delay))
+
+
+def test_the_primary_answers_when_it_is_fast():
+    # Given
+    backup = slow_llm("test-backup", "backup")
+    hedged = HedgedLLM(slow_llm("test-fast", "primary"), backup, default_delay=1.0)
+
+    # When
+    message = hedged.llm.invoke("Hi")
+
+    # Then
+    assert_that(message.content, equal_to("primary"))
+    assert_that(backup.llm.calls, equal_to(0))
+
+
+def test_the_backup_answers_when_the_primary_is_slow():
+    # Given
+    primary = slow_llm("test-slow", "primary", delay=1.0)
+    hedged = HedgedLLM(primary, slow_llm("test-backup", "backup"), default_delay=0.05)
+
+    # When
+    started = time.perf_counter()
+    message = hedged.llm.invoke("Hi")
+
+    # Then
+    assert_that(message.content, equal_to("backup"))
+    assert_that(time.perf_counter() - started < 0.5, equal_to(True))
+
+
+def test_a_cascaded_primary_that_loses_is_cancelled_before_it_escalates():
+    # Given
+    rejected = slow_llm("test-small", "", delay=0.2)
+    escalation = slow_llm("test-big", "big")
+    cascade = CascadeLLM([rejected, escalation], accept=non_empty_response)
+    hedged = HedgedLLM(cascade, slow_llm("test-backup", "backup"), default_delay=0.05)
+
+    # When
+    message = hedged.llm.invoke("Hi")
+    time.sleep(0.3)
+
+    # Then
+    assert_that(message.content, equal_to("backup"))
+    assert_that(escalation.llm.calls, equal_to(0))
+
+
+def test_the_hedged_models_report_to_the_callbacks():
+    # Given
+    hedged = HedgedLLM(
+        slow_llm("test-slow", "primary", delay=0.2),
+        slow_llm("test-backup", "backup"),
+        default_delay=0.05,
+    )
+    handler = LLMRunsHandler()
+
+    # When
+    hedged.llm.invoke("Hi", {"callbacks": [handler]})
+
+    # Then
+    (hedge_run, _), *model_runs = handler.runs
+    assert_that([parent for _, parent in model_runs], equal_to([hedge_run] * 2))
+
+
+def test_cascade_latencies_are_kept_apart_from_their_last_model():
+    # Given
+    cascade = CascadeLLM(
+        [slow_llm("test-small", "small"), slow_llm("test-big", "big")],
+        accept=non_empty_response,
+    )
+    hedged = HedgedLLM(cascade, slow_llm("test-backup", "backup"), default_delay=1.0)
+
+    # When
+    hedged.llm.invoke("Hi")
+
+    # Then
+    assert_that(provider_name(cascade), equal_to("cascade:test-small,test-big"))
+    assert_that(_latencies, has_key("cascade:test-small,test-big"))
+    assert_that(_latencies, is_not(has_key("test-big")))
+
+
+def test_the_accept_check_of_a_cascaded_primary_can_be_replaced():
+    # Given
+    cascade = CascadeLLM([slow_llm("test-small", "small")], accept=non_empty_response)
+    hedged = HedgedLLM(cascade, slow_llm("test-backup", "backup"))
+
+    # When
+    stricter = hedged.with_accept(lambda message: False)
+
+    # Then
+    assert_that(stricter.primary.accept("small"), equal_to(False))
+    assert_that(stricter.backup, equal_to(hedged.backup))
+
+
+def test_the_primaries_that_lose_the_race_keep_the_hedge_delay_up():
+    # Given
+    primary = BaseLLM(
+        LLMConfig(llm_name="test-alternating"),
+        AlternatingChatModel(answer="primary", delay=1.0),
+    )
+    hedged = HedgedLLM(primary, slow_llm("test-backup", "backup"), default_delay=0.1)
+    hedged.llm.min_samples = 4
+
+    # When
+    answers = [hedged.llm.invoke("Hi").content for _ in range(8)]
+
+    # Then
+    assert_that(answers, equal_to(["primary", "backup"] * 4))
+    assert_that(hedged.llm.hedge_delay(), greater_than_or_equal_to(0.1))
@@ -0,0 +1,43 @@
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+
+from agents_behave.base_llm import BaseLLM
+from agents_behave.test_user import User
+from agents_behave.transcript import Transcript
+
+
+class ScriptedUser(User):
+    def __init__(self, messages: list[str]):
+        self.messages = messages
+        self.turn = 0
+
+    def start(self) -> str:
+        return self.next_message()
+
+    def chat(self, llm_response: str) -> str:
+        return self.next_message()
+
+    def fork(self, transcript: Transcript | None = None) -> "ScriptedUser":
+        user = ScriptedUser(self.messages)
+        user.turn = self.turn
+        return user
+
+    def next_message(self) -> str:
+        message = self.messages[self.turn]
+        self.turn += 1
+        return message
+
+
+class JsonModeLLM(BaseLLM):
+    def json_mode(self):
+        return self.llm
+
+
+class FakeToolCallingModel(FakeMessagesListChatModel):
+    prompts: list = []
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.prompts.append(messages)
+        return super()._generate(messages, stop, run_manager, **kwargs)
@@ -7,6 +7,7 @@ from hamcrest import assert_that, greater_than
 from agents_behave.base_llm import LLMConfig
 from agents_behave.conversation_analyser import ConversationAnalyser
 from agents_behave.conversation_runner import ConversationRunner
+from agents_behave.profiling import profile_from_env
 from agents_behave.test_user import TestUser
 from hotel_reservations.assistant import HotelReservationsAssistant
 from hotel_reservations.core import Hotel, find_hotels, make_reservation
@@ -28,6 +29,12 @@ def create_llm(name: str, llm_name: LLM_NAMES) -> BaseLLM:
 
 
 def test_book_a_room_with_a_budget():
+    # Profiled when PROFILE_DIR is set
+    with profile_from_env("test_book_a_room_with_a_budget"):
+        book_a_room_with_a_budget()
+
+
+def book_a_room_with_a_budget():
     # Given
     assistant_llm = create_llm("Assistant", "fireworks-firefunctions")
     user_llm = create_llm("User", "openrouter-mixtral")
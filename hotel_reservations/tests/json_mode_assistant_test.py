@@ -0,0 +1,61 @@
+from unittest.mock import Mock
+
+import pytest
+from hamcrest import assert_that, equal_to
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from agents_behave.base_llm import BaseLLM, LLMConfig
+from agents_behave.cascade_llm import CascadeLLM, non_empty_response
+from agents_behave.hedged_llm import HedgedLLM
+from agents_behave.request_scheduler import RequestScheduler, ScheduledLLM
+from hotel_reservations.assistant import HotelReservationsAssistant
+from hotel_reservations.core import Hotel, find_hotels, make_reservation
+from tests.helpers import JsonModeLLM
+
+
+def json_mode_llm(llm_name: str = "json") -> JsonModeLLM:
+    return JsonModeLLM(
+        LLMConfig(llm_name=llm_name),
+        FakeListChatModel(
+            responses=[
+                '{"thought": "", "action": "search_hotels"}',
+                '{"action": "find_hotels_tool", "action_input": {"location": "London"}}',
+                '{"action": "Final Answer", "action_input": "The Kensington is $300"}',
+            ]
+        ),
+    )
+
+
+@pytest.mark.parametrize(
+    "wrap",
+    [
+        lambda llm: llm,
+        lambda llm: ScheduledLLM(llm, RequestScheduler(slots=1), "assistant"),
+        lambda llm: CascadeLLM([llm, json_mode_llm("json-big")], accept=non_empty_response),
+        lambda llm: HedgedLLM(llm, json_mode_llm("json-backup"), default_delay=10.0),
+    ],
+    ids=["json_mode_llm", "scheduled", "cascade", "hedged"],
+)
+def test_uses_the_tools_with_a_model_constrained_to_answer_in_json(wrap):
+    # Given
+    llm: BaseLLM = wrap(json_mode_llm())
+    find_hotels_mock = Mock(
+        find_hotels, return_value=[Hotel("123", "Kensington Hotel", "London", 300)]
+    )
+    assistant = HotelReservationsAssistant(
+        llm=llm,
+        make_reservation=Mock(make_reservation),
+        find_hotels=find_hotels_mock,
+        json_mode=True,
+    )
+
+    # When
+    response = assistant.chat("Find me an hotel in London")
+
+    # Then
+    assert_that(response["output"], equal_to("The Kensington is $300"))
+    find_hotels_mock.assert_called_once_with("London")
+    assert assistant.output_parser_stats
+    assert_that(assistant.output_parser_stats.failures(), equal_to(1))
+    assert_that(assistant.step_stats.wasted_steps, equal_to(1))
+    assert_that(assistant.step_stats.steps, equal_to(3))
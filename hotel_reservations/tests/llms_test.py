@@ -0,0 +1,77 @@
+import os
+import subprocess
+import sys
+
+from hamcrest import assert_that, empty, equal_to, has_entries, is_, same_instance
+
+from agents_behave.base_llm import BaseLLM, LLMConfig
+from hotel_reservations import llms
+from hotel_reservations.llms import LLMManager
+from import_benchmark import HEAVY_MODULES
+
+
+def fake_factory(llm_config: LLMConfig) -> BaseLLM:
+    return BaseLLM(llm_config.with_model("fake"), None)  # type: ignore
+
+
+class FakeEntryPoint:
+    def __init__(self, factory):
+        self.factory = factory
+
+    def load(self):
+        return self.factory
+
+
+def test_creates_registered_llms(monkeypatch):
+    # Given
+    monkeypatch.setattr(llms, "LLM_FACTORIES", dict(llms.LLM_FACTORIES))
+    monkeypatch.delenv("PROMPT_GUARD", raising=False)
+    LLMManager.register_llm("fake-llm", fake_factory)
+
+    # When
+    llm = LLMManager.create_llm("fake-llm", LLMConfig(name="Assistant"))  # type: ignore
+
+    # Then
+    assert_that(llm.llm_config.llm_name, equal_to("fake-llm"))
+    assert_that(llm.llm_config.model, equal_to("fake"))
+
+
+def test_looks_up_unknown_llms_in_the_entry_points(monkeypatch):
+    # Given
+    monkeypatch.setattr(llms, "LLM_FACTORIES", dict(llms.LLM_FACTORIES))
+    lookups = []
+
+    def entry_points(**selection):
+        lookups.append(selection)
+        return [FakeEntryPoint(fake_factory)]
+
+    monkeypatch.setattr(llms, "entry_points", entry_points)
+
+    # When
+    factory = LLMManager.get_factory("plugin-llm")
+    LLMManager.get_factory("plugin-llm")
+
+    # Then
+    assert_that(factory, is_(same_instance(fake_factory)))
+    # The plugin is only loaded once
+    assert_that(lookups, equal_to([{"group": llms.LLM_ENTRY_POINT_GROUP, "name": "plugin-llm"}]))
+    assert_that(llms.LLM_FACTORIES, has_entries({"plugin-llm": fake_factory}))
+
+
+def test_importing_the_llms_does_not_import_langchain_or_the_provider_sdks():
+    # Given
+    statement = (
+        "import sys, hotel_reservations.llms; "
+        f"print(*[m for m in {HEAVY_MODULES!r} if m in sys.modules])"
+    )
+
+    # Other tests load the .env, which can leave a PYTHONPATH that does not resolve
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+
+    # When
+    output = subprocess.run(
+        [sys.executable, "-c", statement], capture_output=True, text=True, check=True, env=env
+    ).stdout
+
+    # Then
+    assert_that(output.split(), is_(empty()))
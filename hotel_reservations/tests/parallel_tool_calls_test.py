@@ -0,0 +1,53 @@
+import threading
+from unittest.mock import Mock
+
+from hamcrest import assert_that, contains_inanyorder, equal_to
+from langchain_core.messages import AIMessage
+
+from agents_behave.base_llm import BaseLLM, LLMConfig
+from hotel_reservations.assistant import HotelReservationsAssistant
+from hotel_reservations.core import Hotel, find_hotels, make_reservation
+from tests.helpers import FakeToolCallingModel
+
+
+def test_runs_the_tool_calls_of_a_step_concurrently():
+    # Given
+    llm = BaseLLM(
+        LLMConfig(supports_function_calling=True),
+        FakeToolCallingModel(
+            responses=[
+                AIMessage(
+                    content="",
+                    tool_calls=[
+                        {"name": "find_hotels_tool", "args": {"location": "London"}, "id": "1"},
+                        {"name": "find_hotels_tool", "args": {"location": "Paris"}, "id": "2"},
+                    ],
+                ),
+                AIMessage(content="There are hotels in London and Paris"),
+            ]
+        ),
+    )
+    # Each call waits for the other one, so they only finish if they run together
+    both_running = threading.Barrier(2, timeout=5)
+
+    def find_hotels_together(location):
+        both_running.wait()
+        return [Hotel("123", f"{location} Hotel", location, 300)]
+
+    find_hotels_mock = Mock(find_hotels, side_effect=find_hotels_together)
+    assistant = HotelReservationsAssistant(
+        llm=llm,
+        make_reservation=Mock(make_reservation),
+        find_hotels=find_hotels_mock,
+        parallel_tool_calls=True,
+    )
+
+    # When
+    response = assistant.chat("Find me an hotel in London or in Paris")
+
+    # Then
+    assert_that(response["output"], equal_to("There are hotels in London and Paris"))
+    assert_that(
+        [call.args for call in find_hotels_mock.call_args_list],
+        contains_inanyorder(("London",), ("Paris",)),
+    )
@@ -0,0 +1,31 @@
+import time
+
+from hamcrest import assert_that, close_to, greater_than, has_item, starts_with
+
+from agents_behave.profiling import Profiler, phase
+
+
+def spin(seconds: float):
+    started = time.thread_time()
+    while time.thread_time() - started < seconds:
+        pass
+
+
+def test_attributes_cpu_and_wait_time_to_the_innermost_phase():
+    # Given
+    profiler = Profiler(interval=0.001)
+
+    # When
+    with profiler.profile():
+        with phase("assistant"):
+            time.sleep(0.2)
+            with phase("tool"):
+                spin(0.2)
+
+    # Then
+    assistant, tool = profiler.phases["assistant"], profiler.phases["tool"]
+    assert_that(assistant.wait, close_to(0.2, 0.05))
+    assert_that(assistant.cpu, close_to(0.0, 0.05))
+    assert_that(tool.cpu, close_to(0.2, 0.05))
+    assert_that(tool.samples, greater_than(0))
+    assert_that(profiler.folded(), has_item(starts_with("tool;")))
@@ -0,0 +1,163 @@
+from unittest.mock import Mock
+
+import pytest
+from hamcrest import assert_that, equal_to
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from agents_behave.base_llm import BaseLLM, LLMConfig
+from agents_behave.conversation_runner import ConversationRunner
+from agents_behave.replay import (
+    LLMRecorder,
+    Recording,
+    ReplayDivergedError,
+    ReplayUser,
+    check_replay,
+    recorded_mock_calls,
+)
+from agents_behave.test_user import User
+from agents_behave.transcript import Transcript
+from hotel_reservations.assistant import HotelReservationsAssistant
+from hotel_reservations.core import Hotel, find_hotels, make_reservation
+
+ACTION = """Thought: I need the hotels in London
+Action:
+```
+{"action": "find_hotels_tool", "action_input": {"location": "London"}}
+```
+Observation: this is never used"""
+
+
+def run_conversation(llm: BaseLLM, user: User, recorder: LLMRecorder | None = None):
+    mocks = {
+        "find_hotels": Mock(
+            find_hotels, return_value=[Hotel("123", "Kensington Hotel", "London", 300)]
+        ),
+        "make_reservation": Mock(make_reservation, return_value=True),
+    }
+    transcript = Transcript()
+    assistant = HotelReservationsAssistant(
+        llm=llm,
+        make_reservation=mocks["make_reservation"],
+        find_hotels=mocks["find_hotels"],
+        transcript=transcript,
+        callbacks=[recorder] if recorder else [],
+    )
+    state = ConversationRunner(
+        user=user,
+        assistant=assistant.chat,
+        stop_condition=lambda state: state.iterations_count >= 1,
+        transcript=transcript,
+    ).start()
+    return state, mocks
+
+
+def record(tmp_path) -> Recording:
+    recorder = LLMRecorder()
+    llm = BaseLLM(
+        LLMConfig(),
+        FakeListChatModel(
+            responses=[ACTION, "Final Answer: The Kensington Hotel is $300 a night"]
+        ),
+    )
+    user = Recording(user_messages=["Find me an hotel in London", "bye"]).replay_user()
+    state, mocks = run_conversation(llm, user, recorder)
+    path = str(tmp_path / "conversation.json")
+    Recording(
+        user_messages=["Find me an hotel in London", "bye"],
+        llm_outputs={"assistant": recorder.outputs},
+        intermediate_steps=state.turn_steps,
+        mock_calls=recorded_mock_calls(mocks),
+        iterations_count=state.iterations_count,
+    ).save(path)
+    return Recording.load(path)
+
+
+def test_replays_a_recorded_conversation_without_the_llm(tmp_path):
+    # Given
+    recording = record(tmp_path)
+
+    llm = recording.replay_llm("assistant", False)
+    user = recording.replay_user()
+
+    # When
+    state, mocks = run_conversation(llm, user)
+
+    # Then
+    check_replay(
+        recording, mocks, state.turn_steps, state.iterations_count, {"assistant": llm}, user
+    )
+    mocks["find_hotels"].assert_called_once_with("London")
+    assert_that(state.turn_steps[0][0]["tool"], equal_to("find_hotels_tool"))
+    assert_that(
+        state.last_assistant_message().content,
+        equal_to("The Kensington Hotel is $300 a night"),
+    )
+    # The stream was closed after the action, so the rest was never generated
+    recorded_action = recording.llm_outputs["assistant"][0]["data"]["content"]
+    assert_that(recorded_action, equal_to(ACTION.split("\nObservation")[0]))
+
+
+def test_fails_when_the_replay_makes_other_calls(tmp_path):
+    # Given
+    recording = record(tmp_path)
+    recording.mock_calls["find_hotels"] = [[["Paris"], {}]]
+    llm = recording.replay_llm("assistant", False)
+    user = recording.replay_user()
+
+    # When
+    state, mocks = run_conversation(llm, user)
+
+    # Then
+    with pytest.raises(ReplayDivergedError, match="find_hotels was called"):
+        check_replay(
+            recording, mocks, state.turn_steps, state.iterations_count, {"assistant": llm}, user
+        )
+
+
+@pytest.mark.parametrize(
+    "change, error",
+    [
+        (lambda recording: setattr(recording, "iterations_count", 2), "iterations"),
+        (lambda recording: recording.intermediate_steps.append([]), "turns"),
+        (
+            lambda recording: recording.llm_outputs["assistant"].append(
+                recording.llm_outputs["assistant"][-1]
+            ),
+            "answers of the assistant were not used",
+        ),
+        (
+            lambda recording: recording.user_messages.append("Thanks"),
+            "user messages were not used",
+        ),
+    ],
+    ids=["iterations", "turns", "llm_outputs", "user_messages"],
+)
+def test_fails_when_the_replay_is_shorter_than_the_recording(tmp_path, change, error):
+    # Given
+    recording = record(tmp_path)
+    change(recording)
+    llm = recording.replay_llm("assistant", False)
+    user = recording.replay_user()
+
+    # When
+    state, mocks = run_conversation(llm, user)
+
+    # Then
+    with pytest.raises(ReplayDivergedError, match=error):
+        check_replay(
+            recording, mocks, state.turn_steps, state.iterations_count, {"assistant": llm}, user
+        )
+
+
+def test_a_forked_replay_user_replays_the_rest_of_the_messages_on_its_own():
+    # Given
+    user = ReplayUser(["Hi", "A room in Paris", "Thanks"])
+    user.start()
+
+    # When
+    fork = user.fork()
+
+    # Then
+    assert_that(fork.chat("Where?"), equal_to("A room in Paris"))
+    assert_that(fork.chat("Done"), equal_to("Thanks"))
+    assert_that(user.chat("Where?"), equal_to("A room in Paris"))
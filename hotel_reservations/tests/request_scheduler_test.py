@@ -0,0 +1,57 @@
+import threading
+import time
+
+from hamcrest import assert_that, equal_to, has_entries, has_properties
+
+from agents_behave.request_scheduler import RequestScheduler
+
+
+def queue_requests(
+    scheduler: RequestScheduler, roles: list[str], pause: float = 0.0
+) -> list[str]:
+    """Queues a request per role behind a busy slot, and returns the order they ran."""
+    order = []
+    threads = []
+    with scheduler.slot("assistant"):
+        for role in roles:
+            thread = threading.Thread(
+                target=scheduler.run, args=(lambda r=role: order.append(r), role)
+            )
+            thread.start()
+            threads.append(thread)
+            while len(scheduler.waiting) < len(threads):
+                time.sleep(0.001)
+            time.sleep(pause)
+    for thread in threads:
+        thread.join()
+    return order
+
+
+def test_conversation_turns_go_before_the_analyser():
+    # Given
+    scheduler = RequestScheduler(slots=1, priorities={"analyser": 1}, aging=30.0)
+
+    # When
+    order = queue_requests(scheduler, ["analyser", "user", "assistant"])
+
+    # Then
+    assert_that(order, equal_to(["user", "assistant", "analyser"]))
+    assert_that(
+        scheduler.role_stats,
+        has_entries(
+            analyser=has_properties(requests=1),
+            assistant=has_properties(requests=2),
+            user=has_properties(requests=1),
+        ),
+    )
+
+
+def test_waiting_requests_age_past_a_lower_priority():
+    # Given
+    scheduler = RequestScheduler(slots=1, priorities={"analyser": 1}, aging=0.05)
+
+    # When
+    order = queue_requests(scheduler, ["analyser", "assistant"], pause=0.1)
+
+    # Then
+    assert_that(order, equal_to(["analyser", "assistant"]))
@@ -0,0 +1,32 @@
+from hamcrest import assert_that, equal_to
+
+from agents_behave.results_store import ResultsStore, ResultsWriter
+
+
+def test_aggregates_the_pass_rate_of_all_the_runs(tmp_path):
+    # Given
+    for passed in [[True, False], [True, True]]:
+        with ResultsWriter(str(tmp_path), batch_size=1) as writer:
+            for p in passed:
+                writer.write("conversations", {"llm_name": "llm", "passed": p})
+
+    # When
+    pass_rates = ResultsStore(str(tmp_path)).pass_rates()
+
+    # Then
+    assert_that(pass_rates["runs"].tolist(), equal_to([4]))
+    assert_that(pass_rates["pass_rate"].tolist(), equal_to([0.75]))
+
+
+def test_computes_latency_percentiles(tmp_path):
+    # Given
+    with ResultsWriter(str(tmp_path)) as writer:
+        for seconds in range(1, 101):
+            writer.write("turns", {"llm_name": "llm", "assistant_seconds": seconds})
+
+    # When
+    latencies = ResultsStore(str(tmp_path)).latency_percentiles()
+
+    # Then
+    assert_that(latencies.columns.tolist(), equal_to(["llm_name", "p50", "p95"]))
+    assert_that(latencies["p50"].tolist(), equal_to([50.5]))
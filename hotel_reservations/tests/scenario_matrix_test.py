@@ -0,0 +1,40 @@
+from hamcrest import assert_that, contains_inanyorder, equal_to, has_length
+
+from agents_behave.scenario_matrix import (
+    ScenarioResults,
+    expand_matrix,
+    run_scenarios,
+    shard,
+)
+
+
+def test_shards_partition_the_matrix():
+    scenarios = expand_matrix(
+        "I want {guests} rooms in {location}",
+        {"location": ["London", "Paris", "Lisbon"], "guests": [1, 2, 3, 4]},
+    )
+
+    shards = [shard(scenarios, i, 3) for i in range(3)]
+
+    assert_that(scenarios, has_length(12))
+    assert_that(
+        [s.id for shard_scenarios in shards for s in shard_scenarios],
+        contains_inanyorder(*[s.id for s in scenarios]),
+    )
+    assert_that(scenarios[0].persona, equal_to("I want 1 rooms in London"))
+
+
+def test_resumes_from_partial_results(tmp_path):
+    scenarios = expand_matrix("{n}", {"n": [1, 2, 3]})
+    results = ScenarioResults(str(tmp_path / "results.jsonl"))
+    results.append(scenarios[0], {"passed": True})
+    runs = []
+
+    def run(scenario):
+        runs.append(scenario.parameters["n"])
+        return {"passed": False}
+
+    all_results = run_scenarios(scenarios, run, results)
+
+    assert_that(runs, equal_to([2, 3]))
+    assert_that([r["passed"] for r in all_results.values()], equal_to([True, False, False]))
@@ -0,0 +1,53 @@
+import threading
+import time
+
+from hamcrest import assert_that, contains_inanyorder, equal_to, greater_than
+
+from agents_behave.scenario_matrix import ScenarioResults, expand_matrix, run_scenarios
+from agents_behave.scenario_scheduler import DurationHistory, ScenarioScheduler
+
+
+def test_spreads_the_longest_scenarios_first_across_workers(tmp_path):
+    # Given
+    scenarios = expand_matrix("{n}", {"n": [1, 2, 3, 4, 5]})
+    history = DurationHistory(str(tmp_path / "durations.json"))
+    for scenario, seconds in zip(scenarios, [1, 2, 3, 4, 5]):
+        history.record(scenario.id, seconds)
+
+    # When
+    queues = ScenarioScheduler(history, workers=2).plan(scenarios)
+
+    # Then
+    assert_that(
+        [[s.parameters["n"] for s in queue] for queue in queues],
+        equal_to([[5, 2, 1], [4, 3]]),
+    )
+
+
+def test_idle_workers_steal_scenarios_and_durations_are_kept(tmp_path):
+    # Given
+    scenarios = expand_matrix("{n}", {"n": [1, 2, 3, 4]})
+    path = str(tmp_path / "durations.json")
+    history = DurationHistory(path)
+    # The first scenario is expected to be short, but it's the slowest
+    history.record(scenarios[0].id, 0.001)
+    scheduler = ScenarioScheduler(history, workers=2)
+    first_started = threading.Event()
+
+    def run(scenario):
+        if scenario.parameters["n"] == 1:
+            first_started.set()
+            time.sleep(0.2)
+        else:
+            first_started.wait()
+        return {"passed": True, "tokens": 10}
+
+    # When
+    results = run_scenarios(
+        scenarios, run, ScenarioResults(str(tmp_path / "results.jsonl")), scheduler
+    )
+
+    # Then
+    assert_that(list(results), contains_inanyorder(*[s.id for s in scenarios]))
+    assert_that(scheduler.stats.steals, greater_than(0))
+    assert_that(DurationHistory(path).entries[scenarios[0].id].runs, equal_to(2))
@@ -0,0 +1,52 @@
+from typing import Any
+
+from hamcrest import assert_that, close_to, equal_to
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from agents_behave.base_llm import BaseLLM, LLMConfig
+from agents_behave.chat_model_wrapper import ChatModelWrapper
+from agents_behave.token_estimator import GuardedLLM, TokenEstimator, estimate_stats
+
+
+class ReportingChatModel(ChatModelWrapper):
+    received: list = []
+
+    def call(self, messages: list[BaseMessage], stop, run_manager, **kwargs: Any):
+        self.received.append(messages)
+        prompt_tokens = TokenEstimator().count_messages(messages)
+        return AIMessage(
+            content="ok",
+            response_metadata={
+                "token_usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 1}
+            },
+        )
+
+
+def test_estimates_the_tokens_of_messages_from_their_characters():
+    estimator = TokenEstimator(chars_per_token=4.0)
+
+    tokens = estimator.count_messages([HumanMessage(content="x" * 400)])
+
+    assert_that(tokens, equal_to(4 + 101))
+
+
+def test_trims_the_oldest_messages_of_a_prompt_too_long_for_the_context_window():
+    # Given
+    model = ReportingChatModel(received=[])
+    llm = GuardedLLM(BaseLLM(LLMConfig(model="tiny-test-model"), model), trim=True)
+    llm.llm.context_window = 1024 + 100
+    messages = [SystemMessage(content="Be nice")] + [
+        HumanMessage(content="y" * 70) for _ in range(10)
+    ]
+
+    # When
+    llm.llm.invoke(messages)
+
+    # Then
+    sent = model.received[0]
+    assert_that(sent[0], equal_to(messages[0]))
+    assert_that(len(sent), equal_to(4))
+    stats = estimate_stats("tiny-test-model")
+    assert_that(stats.warnings, equal_to(1))
+    assert_that(stats.trimmed, equal_to(1))
+    assert_that(stats.ratio() or 0, close_to(1.0, 0.01))
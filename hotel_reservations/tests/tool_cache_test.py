@@ -0,0 +1,77 @@
+from unittest.mock import Mock
+
+from hamcrest import assert_that, equal_to, starts_with
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from agents_behave.base_llm import LLMConfig
+from hotel_reservations.assistant import FindHotelsInput, HotelReservationsAssistant
+from hotel_reservations.core import Hotel, find_hotels, make_reservation
+from hotel_reservations.tool_cache import CACHED_NOTE, ToolCache
+from tests.helpers import JsonModeLLM
+
+FIND_HOTELS = '{"action": "find_hotels_tool", "action_input": {"location": "London"}}'
+MAKE_RESERVATION = """{"action": "make_reservation_tool", "action_input": {
+    "hotel_name": "Kensington Hotel", "guest_name": "John Smith",
+    "checkin_date": "2024-02-09", "checkout_date": "2024-02-11", "guests": 3}}"""
+
+
+def answer(text: str) -> str:
+    return f'{{"action": "Final Answer", "action_input": "{text}"}}'
+
+
+def test_finds_hotels_once_until_a_reservation_is_made():
+    # Given
+    llm = JsonModeLLM(
+        LLMConfig(),
+        FakeListChatModel(
+            responses=[
+                FIND_HOTELS,
+                answer("The Kensington is $300"),
+                FIND_HOTELS,
+                MAKE_RESERVATION,
+                answer("Booked"),
+                FIND_HOTELS,
+                answer("The Kensington is $300"),
+            ]
+        ),
+    )
+    find_hotels_mock = Mock(
+        find_hotels, return_value=[Hotel("123", "Kensington Hotel", "London", 300)]
+    )
+    assistant = HotelReservationsAssistant(
+        llm=llm,
+        make_reservation=Mock(make_reservation, return_value=True),
+        find_hotels=find_hotels_mock,
+        json_mode=True,
+        tool_cache=ToolCache(note_cached=True),
+    )
+
+    # When
+    assistant.chat("Find me an hotel in London")
+    response = assistant.chat("Book the Kensington")
+    assistant.chat("Find me another one")
+
+    # Then
+    assert_that(find_hotels_mock.call_count, equal_to(2))
+    _, observation = response["intermediate_steps"][0]
+    assert_that(observation, starts_with(CACHED_NOTE))
+
+
+def test_expires_the_results_after_the_ttl():
+    # Given
+    now = [0.0]
+    cache = ToolCache(ttl=60, clock=lambda: now[0])
+    find_hotels_mock = Mock(find_hotels, return_value=[])
+
+    # When
+    for seconds in [0, 30, 90]:
+        now[0] = seconds
+        cache.call(
+            "find_hotels_tool",
+            FindHotelsInput(location="Paris"),
+            lambda: find_hotels_mock("Paris"),
+        )
+
+    # Then
+    assert_that(find_hotels_mock.call_count, equal_to(2))
+    assert_that(cache.stats.expired, equal_to(1))
@@ -0,0 +1,58 @@
+import time
+
+import pytest
+from hamcrest import assert_that, equal_to
+
+from agents_behave.tracing import Span, Tracer
+
+
+class ListSink:
+    def __init__(self):
+        self.spans: list[Span] = []
+
+    def export(self, spans: list[Span]):
+        self.spans.extend(spans)
+
+    def close(self):
+        pass
+
+
+def test_exports_the_spans_of_a_trace_with_their_parents():
+    # Given
+    sink = ListSink()
+    tracer = Tracer(sink)
+
+    # When
+    with tracer.trace("turn") as turn:
+        with tracer.span("assistant") as assistant:
+            with tracer.span("tool"):
+                pass
+    tracer.close()
+
+    # Then
+    assert turn and assistant
+    parents = {span.name: span.parent_id for span in sink.spans}
+    assert_that(
+        parents,
+        equal_to({"turn": None, "assistant": turn.span_id, "tool": assistant.span_id}),
+    )
+
+
+def test_keeps_the_slow_and_failed_traces_that_were_not_sampled():
+    # Given
+    sink = ListSink()
+    tracer = Tracer(sink, sample_rate=0.0, slow_threshold=0.05)
+
+    # When
+    with tracer.trace("fast"):
+        pass
+    with tracer.trace("slow"):
+        time.sleep(0.06)
+    with pytest.raises(ValueError):
+        with tracer.trace("failed"):
+            raise ValueError()
+    tracer.close()
+
+    # Then
+    assert_that([span.name for span in sink.spans], equal_to(["slow", "failed"]))
+    assert_that(tracer.stats.sampled_out_traces, equal_to(1))
@@ -0,0 +1,102 @@
+import itertools
+
+from hamcrest import assert_that, equal_to, none
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agents_behave.base_llm import BaseLLM, LLMConfig
+from agents_behave.cascade_llm import CascadeLLM, confident_verdict
+from agents_behave.conversation_analyser import ConversationAnalyser
+from agents_behave.hedged_llm import HedgedLLM
+from agents_behave.verdict_cache import VerdictCache, verdict_key
+
+CHAT_HISTORY = [HumanMessage(content="Hi"), AIMessage(content="Hello, bye")]
+
+
+def test_reuses_the_verdict_of_a_conversation_already_analysed(tmp_path):
+    # Given
+    path = str(tmp_path / "verdicts.db")
+    llm = BaseLLM(
+        LLMConfig(llm_name="fake"),
+        FakeListChatModel(
+            responses=['{"score": 8, "feedback": "Polite"}', "Only called once"]
+        ),
+    )
+    ConversationAnalyser(llm=llm, cache=VerdictCache(path)).analyse(
+        CHAT_HISTORY, criteria=["Be polite"]
+    )
+
+    # When
+    cache = VerdictCache(path)
+    verdict = ConversationAnalyser(llm=llm, cache=cache).analyse(
+        [HumanMessage(content="Hi "), AIMessage(content="Hello,\nbye")],
+        criteria=["  Be polite"],
+    )
+
+    # Then
+    assert_that(verdict, equal_to({"score": 8, "feedback": "Polite"}))
+    assert_that(cache.stats.hits, equal_to(1))
+
+
+def fake_llm(llm_name: str, *responses: str) -> BaseLLM:
+    return BaseLLM(LLMConfig(llm_name=llm_name), FakeListChatModel(responses=list(responses)))
+
+
+def test_a_cascade_with_a_new_threshold_reuses_the_verdicts_of_its_models(tmp_path):
+    # Given
+    cache = VerdictCache(str(tmp_path / "verdicts.db"))
+    small = fake_llm("small", '{"score": 7, "feedback": "Polite"}', "Not called again")
+    big = fake_llm("big", '{"score": 9, "feedback": "Very polite"}', "Not called again")
+
+    def analyse(minimum_acceptable_score: int) -> dict:
+        cascade = CascadeLLM([small, big], accept=confident_verdict(minimum_acceptable_score))
+        return ConversationAnalyser(llm=cascade, cache=cache).analyse(
+            CHAT_HISTORY, ["Be polite"]
+        )
+
+    # Escalated, since 7 is close to 6
+    analyse(6)
+
+    # When
+    accepted = analyse(3)
+    escalated = analyse(7)
+
+    # Then
+    assert_that(accepted, equal_to({"score": 7, "feedback": "Polite"}))
+    assert_that(escalated, equal_to({"score": 9, "feedback": "Very polite"}))
+    assert_that((cache.stats.hits, cache.stats.misses), equal_to((3, 2)))
+    assert_that(len(cache), equal_to(2))
+
+
+def test_does_not_cache_the_verdicts_of_a_hedge(tmp_path):
+    # Given
+    cache = VerdictCache(str(tmp_path / "verdicts.db"))
+    verdict = '{"score": 9, "feedback": "Polite"}'
+    llm = HedgedLLM(fake_llm("primary", verdict), fake_llm("backup", verdict))
+
+    # When
+    ConversationAnalyser(llm=llm, cache=cache).analyse(CHAT_HISTORY, ["Be polite"])
+
+    # Then
+    assert_that(llm.model_id(), none())
+    assert_that(len(cache), equal_to(0))
+
+
+def test_evicts_the_least_recently_used_verdicts(tmp_path):
+    # Given
+    cache = VerdictCache(
+        str(tmp_path / "verdicts.db"), max_entries=2, clock=itertools.count().__next__
+    )
+    keys = [verdict_key(f"conversation {i}", [], "fake", "prompt") for i in range(3)]
+    cache.put(keys[0], {"score": 1})
+    cache.put(keys[1], {"score": 2})
+    cache.get(keys[0])
+
+    # When
+    cache.put(keys[2], {"score": 3})
+
+    # Then
+    assert_that(cache.get(keys[1]), none())
+    assert_that(cache.get(keys[0]), equal_to({"score": 1}))
+    assert_that(len(cache), equal_to(2))
+    assert_that(cache.stats.evictions, equal_to(1))
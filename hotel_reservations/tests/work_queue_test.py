@@ -0,0 +1,104 @@
+import json
+import time
+
+from hamcrest import assert_that, contains_string, equal_to, none
+
+from agents_behave.work_queue import SQLiteBroker, Worker
+from hotel_reservations.distributed import write_results
+
+
+def test_a_job_whose_lease_expired_is_redelivered_and_keeps_its_first_result(tmp_path):
+    # Given
+    broker = SQLiteBroker(str(tmp_path / "queue.db"))
+    broker.enqueue("job-1", {"n": 1})
+    slow_lease = broker.lease("slow-worker", visibility_timeout=0.01)
+    assert slow_lease
+    time.sleep(0.02)
+
+    # When
+    lease = broker.lease("other-worker", visibility_timeout=60)
+    assert lease
+    first = broker.complete(lease, {"passed": True})
+    duplicate = broker.complete(slow_lease, {"passed": False})
+
+    # Then
+    assert_that((first, duplicate), equal_to((True, False)))
+    assert_that(lease.attempts, equal_to(2))
+    assert_that(broker.results(), equal_to({"job-1": {"passed": True}}))
+    assert_that(broker.lease("other-worker", visibility_timeout=60), none())
+
+
+def test_workers_retry_failed_jobs_until_the_queue_is_empty(tmp_path):
+    # Given
+    broker = SQLiteBroker(str(tmp_path / "queue.db"), max_attempts=2)
+    for n in range(3):
+        assert broker.enqueue(f"job-{n}", {"n": n})
+    assert not broker.enqueue("job-0", {"n": 0})
+    attempts: dict[int, int] = {}
+
+    def handler(payload):
+        n = payload["n"]
+        attempts[n] = attempts.get(n, 0) + 1
+        if n == 1 and attempts[n] == 1:
+            raise RuntimeError("Rate limited")
+        if n == 2:
+            raise RuntimeError("Always fails")
+        return {"n": n}
+
+    worker = Worker(broker, handler, poll_interval=0.01)
+
+    # When
+    worker.run()
+
+    # Then
+    assert_that(broker.results(), equal_to({"job-0": {"n": 0}, "job-1": {"n": 1}}))
+    assert_that(attempts, equal_to({0: 1, 1: 2, 2: 2}))
+    assert_that(broker.status().failed, equal_to(1))
+    (failure,) = broker.failures()
+    assert_that((failure.id, failure.attempts), equal_to(("job-2", 2)))
+    assert_that(failure.error, contains_string("Always fails"))
+
+
+def test_a_job_whose_last_lease_expired_fails(tmp_path):
+    # Given
+    broker = SQLiteBroker(str(tmp_path / "queue.db"), max_attempts=2)
+    broker.enqueue("job-1", {"n": 1})
+    for _ in range(2):
+        assert broker.lease("dead-worker", visibility_timeout=0.01)
+        time.sleep(0.02)
+
+    # When
+    lease = broker.lease("other-worker", visibility_timeout=60)
+
+    # Then
+    assert_that(lease, none())
+    assert_that(broker.status().failed, equal_to(1))
+    assert_that(broker.status().finished, equal_to(True))
+    assert_that(broker.failures()[0].error, equal_to("The lease expired"))
+
+
+def test_failed_jobs_are_written_as_failed_runs(tmp_path):
+    # Given
+    broker = SQLiteBroker(str(tmp_path / "queue.db"), max_attempts=1)
+    broker.enqueue("job-0", {"scenario_id": "s0", "llm_name": "fake", "run": 0})
+    broker.enqueue("job-1", {"scenario_id": "s1", "llm_name": "fake", "run": 0})
+
+    def handler(payload):
+        if payload["scenario_id"] == "s1":
+            raise RuntimeError("Rate limited")
+        return {**payload, "passed": True}
+
+    Worker(broker, handler, poll_interval=0.01).run()
+    path = str(tmp_path / "results.jsonl")
+
+    # When
+    runs = write_results(broker.results(), broker.failures(), path)
+
+    # Then
+    assert_that(
+        [(run["job_id"], run["error"], run["passed"]) for run in runs],
+        equal_to([("job-0", False, True), ("job-1", True, False)]),
+    )
+    assert_that(runs[1]["llm_name"], equal_to("fake"))
+    with open(path) as f:
+        assert_that([json.loads(line) for line in f], equal_to(runs))